@@ -51,6 +51,7 @@ class PupilProfile(models.Model):
     guardian_name = models.CharField(max_length=200, blank=True, null=True)
     guardian_phone = models.CharField(max_length=15, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.user.full_name} - {self.pupil_class}"
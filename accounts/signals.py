@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from results.invalidation import invalidate_users
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_caches(sender, update_fields=None, **kwargs):
+    """Cached responses showing user names are stale (logins only touch last_login)"""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_users()
@@ -5,14 +5,14 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
 from .models import CustomUser, PupilProfile
 from .serializers import (
     UserSerializer, PupilProfileSerializer, LoginSerializer, 
     UserCreateSerializer, UserProfileSerializer
 )
 from .permissions import IsAdmin, IsAdminOrTeacher
+from backend.conditional import ConditionalGetMixin
+from backend.pagination import OptInCursorPagination
 
 @api_view(['POST'])
 @permission_classes([IsAdmin])
@@ -66,13 +66,15 @@ def admin_update_user_class(request):
         return Response({'error': 'Invalid pupil_class id'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for User CRUD operations
     Only accessible by Admin
     """
     serializer_class = UserSerializer
     permission_classes = [IsAdmin]
+    pagination_class = OptInCursorPagination
+    conditional_dependencies = ('pupil_profile', 'pupil_profile__pupil_class')
     filterset_fields = ['role', 'is_active']
     search_fields = ['username', 'full_name', 'email']
     ordering_fields = ['created_at', 'full_name']
@@ -89,6 +91,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         """Custom create to handle user creation with proper response"""
         import logging
+        from backend import topics
         from backend.realtime import broadcast_update
         logger = logging.getLogger(__name__)
         
@@ -107,7 +110,7 @@ class UserViewSet(viewsets.ModelViewSet):
             'username': user.username,
             'role': user.role,
             'full_name': user.full_name
-        })
+        }, topics=topics.admins())
         
         # Return the user with UserSerializer to include all fields
         output_serializer = UserSerializer(user)
@@ -160,7 +163,7 @@ class UserViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PupilProfileViewSet(viewsets.ModelViewSet):
+class PupilProfileViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for PupilProfile
     Teachers can view and edit pupils in their class
@@ -168,6 +171,7 @@ class PupilProfileViewSet(viewsets.ModelViewSet):
     """
     serializer_class = PupilProfileSerializer
     permission_classes = [IsAuthenticated]
+    conditional_dependencies = ('user', 'pupil_class')
     
     def get_queryset(self):
         user = self.request.user
@@ -182,9 +186,8 @@ class PupilProfileViewSet(viewsets.ModelViewSet):
             return base_queryset.all()
         elif user.role == 'teacher':
             # Teachers can only see pupils in their assigned classes
-            from classes.models import Class
-            teacher_classes = Class.objects.filter(assigned_teacher=user)
-            return base_queryset.filter(pupil_class__in=teacher_classes)
+            from backend import refdata
+            return base_queryset.filter(pupil_class_id__in=refdata.get_teacher_class_ids(user.id))
         elif user.role == 'pupil':
             # Pupils can only see their own profile
             return base_queryset.filter(user=user)
@@ -10,7 +10,6 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
@@ -19,10 +18,29 @@ django_asgi_app = get_asgi_application()
 
 # Import routing after Django is initialized
 from backend.routing import websocket_urlpatterns
+from backend.ws_auth import JWTAuthMiddleware
+from backend.outbox import outbox
+from results.release import scheduler as release_scheduler
 
-application = ProtocolTypeRouter({
+
+class BackgroundTasksMiddleware:
+    """
+    Start in-process background tasks (the result release scheduler and
+    the realtime outbox) on the server's event loop the first time it handles a connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        release_scheduler.ensure_started()
+        outbox.ensure_started()
+        return await self.app(scope, receive, send)
+
+
+application = BackgroundTasksMiddleware(ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddleware(
         URLRouter(websocket_urlpatterns)
     ),
-})
+}))
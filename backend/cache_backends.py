@@ -0,0 +1,289 @@
+"""
+SQLite-file cache backend shared by every worker on one host.
+
+``LocMemCache`` gives each gunicorn/daphne worker its own cache, so tag
+bumps and the reference-data generation made in one worker are invisible
+to the others. This backend keeps entries in a SQLite database on local
+disk (WAL mode, so readers never block each other) and needs no extra
+service. Eviction is LRU, bounded by both ``MAX_ENTRIES`` and
+``MAX_SIZE`` (bytes of pickled values). Triggers keep the running totals
+in a one-row ``cache_meta`` table, so the limits are checked without
+scanning. ``incr`` is atomic across processes, which ``cachetags`` and
+``refdata`` rely on.
+
+    CACHES = {'default': {
+        'BACKEND': 'backend.cache_backends.SQLiteCache',
+        'LOCATION': '/var/cache/app/cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 5000, 'MAX_SIZE': 64 * 1024 * 1024},
+    }}
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from backend import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed);
+CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_meta (id, entries, size) VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_meta SET entries = entries + 1, size = size + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_meta SET entries = entries - 1, size = size - OLD.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_resize AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_meta SET size = size - OLD.size + NEW.size WHERE id = 1;
+END;
+"""
+
+# Refresh an entry's LRU timestamp at most this often, so hot reads rarely write
+ACCESS_RESOLUTION = 1.0
+# Eviction trims to this fraction of the limits, so it does not run on every set
+CULL_TARGET = 0.9
+
+_MISSING = object()
+_backends = []
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _backends.append(self)
+
+    # Connections are per thread and per process (never shared across a fork)
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is not None and self._local.pid == os.getpid():
+            return db
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        self._local.db = db
+        self._local.pid = os.getpid()
+        return db
+
+    @contextmanager
+    def _write(self):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _expiry(self, timeout):
+        # Absolute expiry time, or None for never; timeout=0 gives a time already past
+        return self.get_backend_timeout(timeout)
+
+    def _load(self, db, key, now):
+        row = db.execute(
+            'SELECT value, expires, accessed FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return _MISSING
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            return _MISSING
+        if now - accessed >= ACCESS_RESOLUTION:
+            db.execute('UPDATE cache_entries SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def _store(self, db, key, value, timeout, now, only_new=False):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self._expiry(timeout)
+        if only_new:
+            existing = db.execute('SELECT expires FROM cache_entries WHERE key = ?', (key,)).fetchone()
+            if existing is not None and (existing[0] is None or existing[0] > now):
+                return False
+        db.execute(
+            'INSERT INTO cache_entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+            'expires = excluded.expires, accessed = excluded.accessed',
+            (key, payload, len(payload), expires, now),
+        )
+        return True
+
+    def _cull(self, db, now):
+        entries, size = db.execute('SELECT entries, size FROM cache_meta WHERE id = 1').fetchone()
+        if entries <= self._max_entries and size <= self.max_size:
+            return
+        evicted = db.execute(
+            'DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', (now,)
+        ).rowcount
+        target_entries = int(self._max_entries * CULL_TARGET)
+        target_size = int(self.max_size * CULL_TARGET)
+        while True:
+            entries, size = db.execute('SELECT entries, size FROM cache_meta WHERE id = 1').fetchone()
+            if entries <= target_entries and size <= target_size:
+                break
+            # Least recently used first: the whole entry overshoot, or 5% at a time for size
+            batch = max(entries - target_entries, entries // 20, 1)
+            removed = db.execute(
+                'DELETE FROM cache_entries WHERE key IN '
+                '(SELECT key FROM cache_entries ORDER BY accessed LIMIT ?)',
+                (batch,),
+            ).rowcount
+            evicted += removed
+            if not removed:
+                break
+        self._count('evictions', evicted)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as db:
+            added = self._store(db, key, value, timeout, now, only_new=True)
+            if added:
+                self._cull(db, now)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._load(self._connection(), key, time.time())
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        db = self._connection()
+        now = time.time()
+        for key in keys:
+            value = self._load(db, self.make_and_validate_key(key, version=version), now)
+            if value is not _MISSING:
+                found[key] = value
+        self._count('hits', len(found))
+        self._count('misses', len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as db:
+            self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self._write() as db:
+            for key, value in data.items():
+                self._store(db, self.make_and_validate_key(key, version=version), value, timeout, now)
+            self._cull(db, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as db:
+            return bool(db.execute(
+                'UPDATE cache_entries SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self._expiry(timeout), now, key, now),
+            ).rowcount)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as db:
+            return bool(db.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount)
+
+    def delete_many(self, keys, version=None):
+        with self._write() as db:
+            db.executemany(
+                'DELETE FROM cache_entries WHERE key = ?',
+                [(self.make_and_validate_key(key, version=version),) for key in keys],
+            )
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Atomic across workers: the read and the write share one IMMEDIATE transaction"""
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute('SELECT value, expires FROM cache_entries WHERE key = ?', (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache_entries SET value = ?, size = ?, accessed = ? WHERE key = ?',
+                (payload, len(payload), now, key),
+            )
+        return value
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM cache_entries')
+
+    def close(self, **kwargs):
+        # Connections are reused across requests; nothing to release per request
+        pass
+
+    def stats(self):
+        entries, size = self._connection().execute('SELECT entries, size FROM cache_meta WHERE id = 1').fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'location': self.path,
+                'entries': entries,
+                'size': size,
+                'max_entries': self._max_entries,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+            }
+
+
+def stats():
+    """Counters for every SQLiteCache in this worker (hits/misses/evictions are per worker)"""
+    return [backend.stats() for backend in _backends]
+
+
+metrics.register('cache', stats)
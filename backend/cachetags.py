@@ -0,0 +1,99 @@
+"""
+Tag-versioned caching on top of the Django cache.
+
+Cached values are stored under a key that embeds the current version of
+every tag they depend on, e.g. ``results:12:first:class:3``. Bumping a tag
+changes the version, so every entry built from it stops matching and is
+never read again (it simply ages out). Invalidation is therefore one
+``incr`` per tag, with no need to know which keys exist.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from backend import metrics
+
+VERSION_PREFIX = 'tagver:'
+DEFAULT_TIMEOUT = 60 * 60
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bumps': 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _seed():
+    # Millisecond seed so a restarted/evicted counter never reuses an old version
+    return int(time.time() * 1000)
+
+
+def tag_versions(tags):
+    """Current version of each tag, creating missing ones"""
+    keys = [VERSION_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _seed(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump_now(tags):
+    for tag in tags:
+        key = VERSION_PREFIX + tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _seed(), timeout=None)
+        _count('bumps')
+
+
+def bump(*tags):
+    """
+    Invalidate everything cached under any of ``tags``. Done immediately and
+    again after commit, so an entry rebuilt from the still-open transaction
+    is dropped too.
+    """
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return
+    _bump_now(tags)
+    transaction.on_commit(lambda: _bump_now(tags))
+
+
+def make_key(prefix, tags, parts=()):
+    versions = tag_versions(tags)
+    raw = '|'.join([prefix, *map(str, parts), *(f'{tag}={version}' for tag, version in zip(tags, versions))])
+    return f'tagged:{prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def get_or_build(prefix, tags, parts, builder, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for ``prefix``/``parts`` under ``tags``, building it on a miss"""
+    key = make_key(prefix, tags, parts)
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value
+    _count('misses')
+    value = builder()
+    cache.set(key, value, timeout=timeout)
+    return value
+
+
+def stats():
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return {
+            **_stats,
+            'hit_ratio': round(_stats['hits'] / lookups, 3) if lookups else None,
+        }
+
+
+metrics.register('cachetags', stats)
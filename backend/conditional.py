@@ -0,0 +1,97 @@
+"""
+Conditional GETs (ETag / Last-Modified) for DRF viewsets.
+
+The validator for a list or detail request is one aggregate over the same
+filtered queryset the view would serialize: ``Max(updated_at)`` and the
+row count, plus the same pair for every related table the serializer reads
+(``conditional_dependencies``). Hashed with the requesting user, the full
+URL and the renderer, that gives an ETag without serializing anything; a
+matching ``If-None-Match`` is answered with ``304 Not Modified``.
+
+``Last-Modified`` is sent for information only. A deleted row lowers the
+count but not ``Max(updated_at)``, so ``If-Modified-Since`` alone cannot be
+trusted to mean "unchanged" and 304s are decided on the ETag.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    Add to a viewset (before ``ModelViewSet``) to answer unchanged ``list``
+    and ``retrieve`` requests with 304. ``conditional_dependencies`` lists
+    the relations (e.g. ``'subject'``, ``'pupil__pupil_profile'``) whose
+    ``updated_at`` also shows up in the response.
+    """
+    conditional_field = 'updated_at'
+    conditional_dependencies = ()
+
+    def get_conditional_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def get_conditional_scope(self):
+        """Everything besides the rows that changes the response for this request"""
+        request = self.request
+        renderer = getattr(request, 'accepted_renderer', None)
+        return [
+            request.get_full_path(),
+            request.user.pk,
+            getattr(request.user, 'role', None),
+            getattr(renderer, 'format', None),
+        ]
+
+    def conditional_validators(self):
+        """``(etag, last_modified)`` for the current request, from one aggregate query"""
+        field = self.conditional_field
+        aggregates = {'count': Count('pk', distinct=True), 'latest': Max(field)}
+        for i, dependency in enumerate(self.conditional_dependencies):
+            aggregates[f'count_{i}'] = Count(dependency, distinct=True)
+            aggregates[f'latest_{i}'] = Max(f'{dependency}__{field}')
+        values = self.get_conditional_queryset().order_by().aggregate(**aggregates)
+
+        raw = '|'.join(map(str, [*self.get_conditional_scope(), *(values[key] for key in sorted(values))]))
+        etag = '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+        latest = max(
+            (value for key, value in values.items() if key.startswith('latest') and value is not None),
+            default=None,
+        )
+        return etag, latest
+
+    def _with_validators(self, response, etag, latest):
+        response['ETag'] = etag
+        if latest is not None:
+            response['Last-Modified'] = http_date(latest.timestamp())
+        # Per user, and always revalidated: never served from a shared cache
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def _conditional(self, request, respond):
+        if getattr(self, 'response_cached', False):
+            # Already validated by backend.response_cache
+            return respond()
+        etag, latest = self.conditional_validators()
+        conditional = get_conditional_response(request, etag=etag)
+        if conditional is not None:
+            # 304, or 412 for a failed If-Match
+            return self._with_validators(conditional, etag, latest)
+        response = respond()
+        if 200 <= response.status_code < 300:
+            self._with_validators(response, etag, latest)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(
+            request, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
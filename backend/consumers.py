@@ -1,50 +1,229 @@
+import asyncio
 import json
+import threading
+from collections import deque
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+
+from backend import eventlog, metrics
+from backend.topics import topics_for_user
+
+# Events that can change which class topics a connection belongs to
+RESUBSCRIBE_EVENTS = ('class_update',)
+# Close code for a client that cannot keep up with its updates
+SLOW_CLIENT_CLOSE_CODE = 4408
+# Recently sent seqs a connection remembers, to skip an event that reaches it through two topics
+SENT_SEQ_WINDOW = 256
+
+_lock = threading.Lock()
+_stats = {'sent': 0, 'dropped_clients': 0, 'queue_full': 0, 'send_timeouts': 0}
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def uses_layer_groups(channel_layer):
+    """
+    Whether updates travel through channel layer groups (Redis: every
+    worker's sockets) rather than straight to this process's sockets.
+    Exactly one of the two paths is used, so each socket gets an event once.
+    """
+    return channel_layer is not None and not isinstance(channel_layer, InMemoryChannelLayer)
+
+
+class RecentSeqs:
+    """
+    The last ``size`` seqs sent on one connection. Seqs from different
+    workers can arrive out of order, so repeats are matched exactly rather
+    than against a high-water mark, which would drop a late earlier event.
+    """
+
+    def __init__(self, size=SENT_SEQ_WINDOW):
+        self.order = deque(maxlen=size)
+        self.seen = set()
+
+    def __contains__(self, seq):
+        return seq in self.seen
+
+    def add(self, seq):
+        if len(self.order) == self.order.maxlen:
+            self.seen.discard(self.order[0])
+        self.order.append(seq)
+        self.seen.add(seq)
+
 
 class UpdateConsumer(AsyncWebsocketConsumer):
+    """
+    ``ws/updates/?token=<JWT access token>[&session=<id>][&since=<seq>]``:
+    joins the topics of the authenticated user (see backend/topics.py),
+    watching ``session`` or else the active session. Every update carries
+    its ``seq``; reconnecting with the last one seen as ``since`` replays
+    what was missed, or sends ``{"type": "resync"}`` when it cannot.
+
+    Outgoing updates go through a bounded per-connection queue drained by
+    the connection's own writer task, so publishing never waits on a
+    socket. A client whose queue fills up, or whose send takes longer than
+    ``REALTIME_SEND_TIMEOUT_SECONDS``, is disconnected.
+    """
     # Store all connected clients for in-memory broadcasting
     connected_clients = set()
-    
+    # topic -> connected clients subscribed to it
+    subscribers = {}
+
     async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            # Topics come from the user; an anonymous socket would get nothing
+            await self.close(code=4401)
+            return
+
+        self.topics = set()
+        self.dropped = False
+        self.outgoing = asyncio.Queue(maxsize=settings.REALTIME_SEND_QUEUE_SIZE)
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        session = query.get('session', [''])[0]
+        self.session_id = int(session) if session.isdigit() else None
+        since = query.get('since', [''])[0]
+        self.last_seq = 0
+        self.sent_seqs = RecentSeqs()
+        # Subscribe before looking up missed updates, so none fall in between
+        await self.resubscribe()
+
+        await self.accept()
+        if since.isdigit():
+            await self.resume(int(since))
+        self.writer = asyncio.ensure_future(self._write())
+
         # Add to in-memory set for direct broadcasting
         UpdateConsumer.connected_clients.add(self)
-        
-        # Also add to channel layer group (for Redis when available)
-        if self.channel_layer:
-            await self.channel_layer.group_add("updates", self.channel_name)
-        
-        await self.accept()
-        print(f"✅ WebSocket client connected. Total clients: {len(UpdateConsumer.connected_clients)}")
+        print(f"✅ WebSocket client connected ({user.role} {user.id}, {len(self.topics)} topics). Total clients: {len(UpdateConsumer.connected_clients)}")
 
     async def disconnect(self, close_code):
         # Remove from in-memory set
         UpdateConsumer.connected_clients.discard(self)
-        
-        # Also remove from channel layer group
-        if self.channel_layer:
-            await self.channel_layer.group_discard("updates", self.channel_name)
-        
+        await self.update_topics(set())
+        writer = getattr(self, 'writer', None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
         print(f"🔌 WebSocket client disconnected. Total clients: {len(UpdateConsumer.connected_clients)}")
 
+    async def resubscribe(self):
+        """Join the user's current topics (class assignments or the active session may have changed)"""
+        await self.update_topics(
+            await database_sync_to_async(topics_for_user)(self.scope['user'], self.session_id)
+        )
+
+    async def update_topics(self, topics):
+        layer_groups = uses_layer_groups(self.channel_layer)
+        for topic in getattr(self, 'topics', set()) - topics:
+            UpdateConsumer.subscribers.get(topic, set()).discard(self)
+            if not UpdateConsumer.subscribers.get(topic):
+                UpdateConsumer.subscribers.pop(topic, None)
+            if layer_groups:
+                await self.channel_layer.group_discard(topic, self.channel_name)
+        for topic in topics - getattr(self, 'topics', set()):
+            UpdateConsumer.subscribers.setdefault(topic, set()).add(self)
+            if layer_groups:
+                await self.channel_layer.group_add(topic, self.channel_name)
+        self.topics = topics
+
+    async def resume(self, since):
+        """Send the updates missed since ``since`` (or a resync signal) ahead of any live ones"""
+        events = await database_sync_to_async(eventlog.missed)(since, self.topics)
+        if events is None:
+            await self.send(text_data=eventlog.resync_message())
+            return
+        for seq, event_type, payload, _ in events:
+            await self.send(text_data=eventlog.encode(seq, event_type, payload))
+        self.last_seq = events[-1][0] if events else since
+
+    async def _write(self):
+        timeout = settings.REALTIME_SEND_TIMEOUT_SECONDS
+        while True:
+            batch = [await self.outgoing.get()]
+            while not self.outgoing.empty():
+                batch.append(self.outgoing.get_nowait())
+            resubscribe = False
+            try:
+                async with asyncio.timeout(timeout):
+                    for text, event_type, seq in batch:
+                        if seq is not None:
+                            if seq <= self.last_seq or seq in self.sent_seqs:
+                                # Already sent by resume(), or through another of this connection's topics
+                                continue
+                            self.sent_seqs.add(seq)
+                        await self.send(text_data=text)
+                        resubscribe = resubscribe or event_type in RESUBSCRIBE_EVENTS or (
+                            event_type == 'session_update' and self.session_id is None
+                        )
+            except TimeoutError:
+                _count('send_timeouts')
+                await self.drop()
+                return
+            _count('sent', len(batch))
+            if resubscribe:
+                await self.resubscribe()
+
+    def enqueue(self, text, event_type=None, seq=None):
+        """Queue an encoded update without waiting; a full queue drops the client"""
+        if self.dropped:
+            return False
+        try:
+            self.outgoing.put_nowait((text, event_type, seq))
+        except asyncio.QueueFull:
+            _count('queue_full')
+            asyncio.ensure_future(self.drop())
+            return False
+        return True
+
+    async def drop(self):
+        if self.dropped:
+            return
+        self.dropped = True
+        _count('dropped_clients')
+        UpdateConsumer.connected_clients.discard(self)
+        await self.update_topics(set())
+        print(f"🐢 Dropping slow WebSocket client ({self.outgoing.qsize()} updates queued)")
+        try:
+            await self.close(code=SLOW_CLIENT_CLOSE_CODE)
+        except Exception:
+            pass
+
     async def receive(self, text_data):
         # Echo received message (for testing)
         await self.send(text_data=json.dumps({"message": "Received", "data": text_data}))
 
     async def broadcast_update(self, event):
         """Called by channel layer when using Redis"""
-        await self.send(text_data=json.dumps(event["data"]))
-    
+        self.enqueue(event["text"], event.get("event"), event.get("seq"))
+
     @classmethod
-    async def broadcast_to_all(cls, message_data):
-        """Direct broadcast to all connected clients (works without Redis)"""
-        disconnected = []
-        for client in cls.connected_clients:
-            try:
-                await client.send(text_data=json.dumps(message_data))
-            except Exception as e:
-                print(f"❌ Failed to send to client: {e}")
-                disconnected.append(client)
-        
-        # Clean up disconnected clients
-        for client in disconnected:
-            cls.connected_clients.discard(client)
+    def broadcast_to_topics(cls, topics, text, event_type=None, seq=None):
+        """
+        Direct fan-out of an encoded update to this process's clients
+        subscribed to any of ``topics`` (works without Redis), queued per
+        client. Returns the number of clients the update was queued for.
+        """
+        clients = set()
+        for topic in topics:
+            clients.update(cls.subscribers.get(topic, ()))
+        return sum(client.enqueue(text, event_type, seq) for client in clients)
+
+
+def stats():
+    with _lock:
+        return {
+            **_stats,
+            'connected': len(UpdateConsumer.connected_clients),
+            'topics': len(UpdateConsumer.subscribers),
+        }
+
+
+metrics.register('websockets', stats)
@@ -0,0 +1,141 @@
+"""
+Sequenced realtime event log.
+
+Every published update gets the next number from one counter in the
+shared cache (atomic across workers), and is kept in a bounded in-process
+ring buffer and, with ``REALTIME_EVENT_LOG_PERSIST``, in the
+``RealtimeEvent`` table. A client reconnecting with ``?since=<seq>`` is
+sent just the updates for its topics that it missed. When those cannot
+all be found (older than the buffer/table, published by another worker
+without persistence, or more than ``REALTIME_REPLAY_LIMIT`` of them), it
+is told to ``resync`` and reloads its data instead.
+"""
+
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from backend import metrics
+
+SEQ_KEY = 'realtime:seq'
+
+_lock = threading.Lock()
+_buffer = deque(maxlen=settings.REALTIME_EVENT_BUFFER)
+_stats = {'recorded': 0, 'resumed': 0, 'replayed': 0, 'resyncs': 0}
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def _last_logged():
+    with _lock:
+        last = _buffer[-1][0] if _buffer else 0
+    if settings.REALTIME_EVENT_LOG_PERSIST:
+        from results.models import RealtimeEvent
+        last = max(last, RealtimeEvent.objects.aggregate(last=Max('seq'))['last'] or 0)
+    return last
+
+
+def _allocate(count):
+    try:
+        last = cache.incr(SEQ_KEY, count)
+    except ValueError:
+        # The counter is gone (cache cleared or entry evicted): carry on after the last logged event
+        cache.add(SEQ_KEY, _last_logged(), timeout=None)
+        last = cache.incr(SEQ_KEY, count)
+    return range(last - count + 1, last + 1)
+
+
+def latest_seq():
+    latest = cache.get(SEQ_KEY)
+    return latest if latest is not None else _last_logged()
+
+
+def record(messages):
+    """Number ``(event_type, payload, topics)`` messages and log them; returns ``(seq, event_type, payload, topics)``"""
+    if not messages:
+        return []
+    events = [(seq, event_type, payload, tuple(topics)) for seq, (event_type, payload, topics) in zip(
+        _allocate(len(messages)), messages
+    )]
+    with _lock:
+        _buffer.extend(events)
+        _stats['recorded'] += len(events)
+
+    if settings.REALTIME_EVENT_LOG_PERSIST:
+        from results.models import RealtimeEvent
+        RealtimeEvent.objects.bulk_create([
+            RealtimeEvent(seq=seq, event_type=event_type, payload=payload, topics=list(topics))
+            for seq, event_type, payload, topics in events
+        ])
+        RealtimeEvent.objects.filter(seq__lte=events[-1][0] - settings.REALTIME_EVENT_LOG_RETAIN).delete()
+    return events
+
+
+def encode(seq, event_type, payload):
+    return json.dumps({'type': event_type, 'payload': payload, 'seq': seq})
+
+
+def resync_message():
+    return json.dumps({'type': 'resync', 'payload': {'seq': latest_seq()}})
+
+
+def _complete(events, since, latest):
+    """Whether ``events`` is every seq from ``since + 1`` to ``latest``"""
+    return len(events) == latest - since and all(event[0] == since + i for i, event in enumerate(events, 1))
+
+
+def _persisted(since, latest):
+    from results.models import RealtimeEvent
+    return [
+        (seq, event_type, payload, tuple(topics))
+        for seq, event_type, payload, topics in RealtimeEvent.objects.filter(seq__gt=since, seq__lte=latest)
+        .order_by('seq').values_list('seq', 'event_type', 'payload', 'topics')
+    ]
+
+
+def missed(since, topics):
+    """
+    The logged events after ``since`` published to any of ``topics``, in
+    order, or ``None`` when the client must resync instead.
+    """
+    latest = latest_seq()
+    kept = settings.REALTIME_EVENT_LOG_RETAIN if settings.REALTIME_EVENT_LOG_PERSIST else settings.REALTIME_EVENT_BUFFER
+    if since > latest or latest - since > kept:
+        # Too old to still be logged, or the counter was reset (e.g. the cache was cleared)
+        _count('resyncs')
+        return None
+    with _lock:
+        events = [event for event in _buffer if since < event[0] <= latest]
+    if not _complete(events, since, latest) and settings.REALTIME_EVENT_LOG_PERSIST:
+        events = _persisted(since, latest)
+    if not _complete(events, since, latest):
+        _count('resyncs')
+        return None
+
+    relevant = [event for event in events if not topics.isdisjoint(event[3])]
+    if len(relevant) > settings.REALTIME_REPLAY_LIMIT:
+        _count('resyncs')
+        return None
+    _count('resumed')
+    _count('replayed', len(relevant))
+    return relevant
+
+
+def stats():
+    with _lock:
+        return {
+            **_stats,
+            'buffered': len(_buffer),
+            'oldest_buffered': _buffer[0][0] if _buffer else None,
+            'persist': settings.REALTIME_EVENT_LOG_PERSIST,
+        }
+
+
+metrics.register('event_log', stats)
@@ -0,0 +1,34 @@
+"""
+In-process performance counters.
+
+Modules that keep counters (caches, queues, ...) register a zero-argument
+provider returning a dict; ``GET /api/metrics/`` returns a snapshot of all
+of them for the worker that served the request.
+"""
+
+import os
+
+from django.views.decorators.cache import never_cache
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from accounts.permissions import IsAdmin
+
+_providers = {}
+
+
+def register(name, provider):
+    """Register (or replace) a metrics provider under ``name``"""
+    _providers[name] = provider
+
+
+def snapshot():
+    return {name: provider() for name, provider in sorted(_providers.items())}
+
+
+@never_cache
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def metrics_view(request):
+    """Admin-only: counters for this worker process"""
+    return Response({'pid': os.getpid(), 'metrics': snapshot()})
@@ -0,0 +1,198 @@
+"""
+Realtime outbox.
+
+``broadcast_update`` used to publish from the request thread, so every
+score save waited for the websocket fan-out. Now it only appends the event
+to this outbox (after the transaction commits). A background task on the
+ASGI server's event loop wakes up, lets ``REALTIME_OUTBOX_WINDOW_MS`` of
+events accumulate, coalesces them and publishes each resulting message
+once. A bulk upload's per-pupil ``summary_update`` events for one
+session/term therefore reach staff as a single message listing the pupils.
+
+Processes without a running outbox (gunicorn, management commands, tests)
+fall back to publishing synchronously, as before.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from backend import metrics
+from backend.topics import is_personal
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 1000
+
+
+def coalesce(events):
+    """
+    Merge a window of ``(event_type, payload, topics)`` events, keeping
+    first-seen order. Exact duplicates are dropped. ``summary_update``
+    'calculate' events for the same session/term and the same shared
+    topics become one message with ``pupil_ids`` and ``summary_ids``; each
+    pupil's own topic still gets just that pupil's event. A batch of one
+    is left as it was.
+    """
+    messages = []
+    seen = set()
+    batches = {}
+    for event_type, payload, topics in events:
+        if event_type == 'summary_update' and payload.get('action') == 'calculate':
+            shared = tuple(topic for topic in topics if not is_personal(topic))
+            key = (payload.get('session_id'), payload.get('term'), shared)
+            if key not in batches:
+                batches[key] = []
+                messages.append((event_type, key, None))
+            batches[key].append((payload, topics))
+            continue
+        marker = (event_type, json.dumps(payload, sort_keys=True, default=str), tuple(topics))
+        if marker not in seen:
+            seen.add(marker)
+            messages.append((event_type, payload, tuple(topics)))
+
+    merged = []
+    for event_type, payload, topics in messages:
+        if topics is not None:
+            merged.append((event_type, payload, topics))
+            continue
+        batch = batches[payload]
+        if len(batch) == 1:
+            merged.append((event_type, batch[0][0], tuple(batch[0][1])))
+            continue
+        session_id, term, shared = payload
+        if shared:
+            merged.append((event_type, {
+                'action': 'calculate',
+                'session_id': session_id,
+                'term': term,
+                'pupil_ids': list(dict.fromkeys(item.get('pupil_id') for item, _ in batch)),
+                'summary_ids': list(dict.fromkeys(item.get('summary_id') for item, _ in batch)),
+            }, shared))
+        for item, item_topics in batch:
+            personal = tuple(topic for topic in item_topics if is_personal(topic))
+            if personal:
+                merged.append((event_type, item, personal))
+    return merged
+
+
+class Outbox:
+    """
+    Started on the server's event loop by ``BackgroundTasksMiddleware``;
+    ``enqueue`` is thread-safe and never waits for the publish.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+        self._pending = deque()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.enqueued = 0
+        self.published = 0
+        self.messages = 0
+        self.group_sends = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.max_depth = 0
+
+    def ensure_started(self):
+        """Start the publisher on the running event loop (once per process)"""
+        if not getattr(settings, 'REALTIME_OUTBOX', True):
+            return
+        if self.running():
+            return
+        with self._lock:
+            if self.running():
+                return
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    def running(self):
+        return (
+            self._task is not None and not self._task.done()
+            and self._loop is not None and not self._loop.is_closed()
+        )
+
+    def enqueue(self, event_type, payload, topics):
+        if not self.running():
+            from backend.realtime import publish_now
+            with self._lock:
+                self.fallbacks += 1
+            publish_now([(event_type, payload, tuple(topics))])
+            return
+        with self._lock:
+            self._pending.append((time.monotonic(), event_type, payload, topics))
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._pending))
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        from backend.realtime import publish
+
+        logger.info("📮 Realtime outbox started")
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Let the rest of the burst (e.g. a bulk upload) arrive before publishing
+            await asyncio.sleep(settings.REALTIME_OUTBOX_WINDOW_MS / 1000)
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                continue
+
+            messages = coalesce([event for _, *event in batch])
+            try:
+                await publish(messages)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Realtime outbox publish failed: {e}")
+                with self._lock:
+                    self.failures += 1
+                continue
+
+            done = time.monotonic()
+            with self._lock:
+                self.batches += 1
+                self.published += len(batch)
+                self.messages += len(messages)
+                self.group_sends += sum(len(topics) for _, _, topics in messages)
+                self._latencies.extend(done - event[0] for event in batch)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            report = {
+                'running': self.running(),
+                'depth': len(self._pending),
+                'max_depth': self.max_depth,
+                'enqueued': self.enqueued,
+                'published': self.published,
+                'messages': self.messages,
+                'group_sends': self.group_sends,
+                'batches': self.batches,
+                'fallbacks': self.fallbacks,
+                'failures': self.failures,
+            }
+        if latencies:
+            report['latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'p95': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        return report
+
+
+outbox = Outbox()
+
+metrics.register('outbox', outbox.stats)
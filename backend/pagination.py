@@ -0,0 +1,157 @@
+"""
+Opt-in cursor (keyset) pagination.
+
+List endpoints keep the default page-number responses unless the client
+sends ``?cursor=`` (empty for the first page). Cursor pages seek on the
+whole ordering, e.g. ``WHERE (created_at, id) < (<last seen>)`` written
+out as ``created_at < x OR (created_at = x AND id < y)``, instead of
+``OFFSET n``, so deep pages cost the same as the first one (given an
+index on the ordering) and rows inserted meanwhile do not shift the
+window. ``?page_size=`` is honoured in both modes, up to ``MAX_PAGE_SIZE``.
+"""
+
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+from rest_framework.response import Response
+
+CURSOR_PARAM = 'cursor'
+DEFAULT_ORDERING = ('-created_at', '-id')
+MAX_PAGE_SIZE = 100
+
+
+def wants_cursor(request):
+    return CURSOR_PARAM in request.query_params
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over ``ordering`` (non-null columns, ending in a
+    unique one; ``id`` is appended otherwise). DRF's cursor seeks on the
+    first column only and steps over ties with an offset; here the cursor
+    holds the last row's value for every column and the next page is
+    everything after that tuple, so ties cost nothing and the offset stays 0.
+    """
+    cursor_query_param = CURSOR_PARAM
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+    def __init__(self, ordering=DEFAULT_ORDERING):
+        self.ordering = ordering
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not {'id', 'pk'} & {field.lstrip('-') for field in ordering}:
+            ordering += ('id',)
+        return ordering
+
+    def decode_cursor(self, request):
+        # ``?cursor=`` with no value asks for the first page
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        cursor = super().decode_cursor(request)
+        if cursor.position is not None:
+            try:
+                position = json.loads(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[field.lstrip('-')] if isinstance(instance, dict) else getattr(instance, field.lstrip('-'))
+            for field in ordering
+        ]
+        return json.dumps([str(value) for value in values], separators=(',', ':'))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # DRF's flow, with the first-column filter replaced by a seek on the whole ordering
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(seek_after(ordering, json.loads(current_position)))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+def seek_after(ordering, values):
+    """
+    ``Q`` for the rows after ``values`` in ``ordering``: a row-value
+    comparison spelled out column by column, so it works for mixed
+    directions, e.g. ``order > a OR (order = a AND id < b)`` for
+    ``('order', '-id')``.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination unless the request has ``?cursor=``; then keyset
+    pagination on the view's ``cursor_ordering`` (default ``-created_at, -id``).
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if wants_cursor(request):
+            self.keyset = KeysetPagination(getattr(view, 'cursor_ordering', DEFAULT_ORDERING))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+def paginate_action(request, queryset, serialize, ordering=DEFAULT_ORDERING):
+    """
+    Response for a custom list action: the plain list as before, or a
+    cursor page of it when the client sent ``?cursor=``.
+    """
+    if not wants_cursor(request):
+        return Response(serialize(queryset))
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(serialize(page))
@@ -1,53 +1,71 @@
 import logging
 import asyncio
 from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
+from django.db import transaction
+
+from backend import eventlog, topics as realtime_topics
+from backend.outbox import outbox
 
 logger = logging.getLogger(__name__)
 
-def broadcast_update(event_type, payload):
+def broadcast_update(event_type, payload, topics=None):
+    """
+    Broadcast update to the WebSocket clients subscribed to ``topics``
+    (see backend/topics.py; default: everyone).
+    Queued on the realtime outbox once the current transaction commits;
+    the outbox batches and coalesces events and publishes in the background.
+    """
+    topics = tuple(topics) if topics is not None else tuple(realtime_topics.everyone())
+    transaction.on_commit(lambda: outbox.enqueue(event_type, payload, topics))
+
+
+async def publish(messages):
     """
-    Broadcast update to all connected WebSocket clients.
-    Uses both channel layer (Redis when available) and direct broadcast (for InMemory).
+    Send ``(event_type, payload, topics)`` messages to the clients subscribed to their topics.
+    Each message is numbered and logged (backend/eventlog.py), encoded once, and
+    reaches each client once: through the channel layer when it spans processes
+    (Redis), else by direct fan-out (InMemory).
     """
-    message_data = {
-        "type": event_type,
-        "payload": payload,
-    }
-    
-    # Try channel layer first (works with Redis)
+    from backend.consumers import UpdateConsumer, uses_layer_groups
+
     channel_layer = get_channel_layer()
-    if channel_layer:
+    layer_groups = uses_layer_groups(channel_layer)
+    for seq, event_type, payload, topics in await database_sync_to_async(eventlog.record)(messages):
+        text = eventlog.encode(seq, event_type, payload)
+
+        if layer_groups:
+            try:
+                for topic in topics:
+                    await channel_layer.group_send(
+                        topic,
+                        {
+                            "type": "broadcast_update",
+                            "event": event_type,
+                            "seq": seq,
+                            "text": text,
+                        },
+                    )
+                logger.info(f"✅ Broadcast sent via channel layer: {event_type} -> {', '.join(topics)}")
+            except Exception as e:
+                logger.error(f"❌ Channel layer broadcast failed: {e}")
+            continue
+
+        # Direct broadcast for InMemory (Railway free tier without Redis)
         try:
-            async_to_sync(channel_layer.group_send)(
-                "updates",
-                {
-                    "type": "broadcast_update",
-                    "data": message_data,
-                },
-            )
-            logger.info(f"✅ Broadcast sent via channel layer: {event_type}")
+            sent = UpdateConsumer.broadcast_to_topics(topics, text, event_type, seq)
+            logger.info(f"✅ Direct broadcast queued for {sent} clients: {event_type}")
         except Exception as e:
-            logger.error(f"❌ Channel layer broadcast failed: {e}")
-    
-    # Also do direct broadcast for InMemory (Railway free tier without Redis)
+            logger.warning(f"⚠️  Direct broadcast failed: {e}")
+
+
+def publish_now(messages):
+    """Publish without the outbox (WSGI workers, management commands, tests)"""
     try:
-        from backend.consumers import UpdateConsumer
-        # Run async broadcast in the event loop
-        loop = None
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        if loop.is_running():
-            # If loop is already running, schedule the task
-            asyncio.ensure_future(UpdateConsumer.broadcast_to_all(message_data))
-        else:
-            # If loop is not running, run until complete
-            loop.run_until_complete(UpdateConsumer.broadcast_to_all(message_data))
-        
-        logger.info(f"✅ Direct broadcast sent to {len(UpdateConsumer.connected_clients)} clients: {event_type}")
-    except Exception as e:
-        logger.warning(f"⚠️  Direct broadcast failed (this is normal if no WebSocket clients connected): {e}")
+        asyncio.get_running_loop()
+    except RuntimeError:
+        async_to_sync(publish)(messages)
+    else:
+        # Called from async code in this thread: cannot block on the loop
+        asyncio.ensure_future(publish(messages))
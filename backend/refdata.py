@@ -0,0 +1,204 @@
+"""
+Process-local cache for reference data that is read on almost every
+request but changes only a few times a term: the active AcademicSession,
+the teacher -> classes, subject -> class and class -> level maps and the
+grading scales.
+
+Each worker keeps its own copy. A generation counter stored in the shared
+Django cache is bumped (after commit) by model signals whenever one of the
+underlying rows changes; a worker that sees a new generation drops its
+copy and reloads lazily, so all workers converge on the same data.
+
+The shared counter is read once at the start of each request and otherwise
+at most every ``REFDATA_CHECK_SECONDS`` (websockets, background tasks);
+lookups in between are served from the local copy without a round trip.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import transaction
+
+from backend import metrics
+
+GENERATION_KEY = 'refdata:generation'
+
+
+class ReferenceDataCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._data = {}
+        # time.monotonic() of the last read of the shared generation
+        self._checked_at = 0.0
+        self.checks = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _current_generation(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            # Millisecond seed so a restarted/evicted counter never reuses an old generation
+            cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+
+    def _generation_for_read(self):
+        """The shared generation, re-read only if the last check is older than REFDATA_CHECK_SECONDS"""
+        now = time.monotonic()
+        with self._lock:
+            if self._generation is not None and now - self._checked_at < settings.REFDATA_CHECK_SECONDS:
+                return self._generation
+        generation = self._current_generation()
+        with self._lock:
+            self._checked_at = now
+            self.checks += 1
+        return generation
+
+    def expire(self):
+        """Re-read the shared generation on the next lookup"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def get(self, name, loader):
+        generation = self._generation_for_read()
+        with self._lock:
+            if generation is None or self._generation != generation:
+                self._data = {}
+                self._generation = generation
+            if name in self._data:
+                self.hits += 1
+                return self._data[name]
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            if generation is not None and self._generation == generation:
+                self._data[name] = value
+        return value
+
+    def invalidate(self):
+        """Drop this worker's copy and bump the shared generation for all others"""
+        with self._lock:
+            self._data = {}
+            self._generation = None
+            self.invalidations += 1
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'generation_checks': self.checks,
+            'invalidations': self.invalidations,
+            'generation': self._generation,
+            'entries': len(self._data),
+        }
+
+
+_cache = ReferenceDataCache()
+
+
+def _check_generation_per_request(sender, **kwargs):
+    # Writes made by other workers are visible from the next request on
+    _cache.expire()
+
+
+request_started.connect(_check_generation_per_request, dispatch_uid='refdata_check_generation')
+
+
+def _load_active_session():
+    from results.models import AcademicSession
+    return AcademicSession.objects.filter(is_active=True).first()
+
+
+def _load_teacher_classes():
+    from classes.models import Class
+    teacher_classes = {}
+    for class_id, teacher_id in Class.objects.filter(
+        assigned_teacher__isnull=False
+    ).values_list('id', 'assigned_teacher_id'):
+        teacher_classes.setdefault(teacher_id, []).append(class_id)
+    return {teacher_id: tuple(class_ids) for teacher_id, class_ids in teacher_classes.items()}
+
+
+def _load_subject_classes():
+    from classes.models import Subject
+    return dict(Subject.objects.values_list('id', 'assigned_class_id'))
+
+
+def _load_class_levels():
+    from classes.models import Class
+    return dict(Class.objects.values_list('id', 'level'))
+
+
+def _load_grading_scales():
+    from results.models import GradingScale
+    return {scale.level: scale.boundaries() for scale in GradingScale.objects.all()}
+
+
+def get_active_session():
+    """The active AcademicSession (or None). Treat the returned instance as read-only."""
+    return _cache.get('active_session', _load_active_session)
+
+
+def get_release_state():
+    """``(active session id, results hidden)``, for keys that must change on lock, unlock and release"""
+    active_session = get_active_session()
+    if active_session is None:
+        return (None, False)
+    return (active_session.id, active_session.results_hidden())
+
+
+def get_teacher_class_ids(teacher_id):
+    """Ids of the classes assigned to a teacher"""
+    return _cache.get('teacher_classes', _load_teacher_classes).get(teacher_id, ())
+
+
+def get_subject_class_id(subject_id):
+    """Id of the class a subject belongs to (or None for an unknown subject)"""
+    return _cache.get('subject_classes', _load_subject_classes).get(subject_id)
+
+
+def get_class_ids():
+    """Ids of every class"""
+    return tuple(_cache.get('class_levels', _load_class_levels))
+
+
+def get_class_level(class_id):
+    """Level of a class, e.g. "GRADE 1" (or None for an unknown class)"""
+    return _cache.get('class_levels', _load_class_levels).get(class_id)
+
+
+def get_grade_boundaries(level=None):
+    """
+    Grade boundaries for a class level: its own GradingScale, else the
+    default scale, else None (meaning the built-in GRADE_BOUNDARIES).
+    """
+    scales = _cache.get('grading_scales', _load_grading_scales)
+    return scales.get(level) or scales.get(None)
+
+
+def invalidate():
+    """
+    Invalidate reference data in every worker. Done immediately and again
+    after commit, so a reload that raced the open transaction is dropped too.
+    """
+    _cache.invalidate()
+    transaction.on_commit(_cache.invalidate)
+
+
+def stats():
+    return _cache.stats()
+
+
+metrics.register('refdata', stats)
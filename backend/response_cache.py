@@ -0,0 +1,132 @@
+"""
+Opt-in, auth-aware response caching for DRF views.
+
+This replaces the site-wide cache middleware, which keyed pages by URL
+alone: one user's response could be served to the next, and lock state
+stayed stale for five minutes. Views now opt in per action. The key is
+built from the URL, the renderer, the caller's scope (admin; teacher and
+their classes; pupil) and the active session's release state, plus the
+current versions of the cache tags the view declares. Model signals bump
+those tags (see ``results.invalidation``), so a write shows up on the
+next request without waiting for anything to expire. The key also
+serves as the response's ETag.
+"""
+
+import hashlib
+import threading
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from rest_framework.response import Response
+
+from backend import cachetags, metrics, refdata
+
+DEFAULT_TIMEOUT = 60 * 60
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def _count(prefix, name):
+    with _lock:
+        counts = _stats.setdefault(prefix, {'hits': 0, 'misses': 0, 'not_modified': 0, 'bypassed': 0})
+        counts[name] += 1
+
+
+def scope_key(user):
+    """What the caller is allowed to see: shared by admins, per teacher (and class set), per pupil"""
+    if not getattr(user, 'is_authenticated', False):
+        return ('anonymous',)
+    role = getattr(user, 'role', None)
+    if role == 'admin':
+        return ('admin',)
+    if role == 'teacher':
+        return ('teacher', user.id, tuple(sorted(refdata.get_teacher_class_ids(user.id))))
+    return (role, user.id)
+
+
+def _finish(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def serve(request, prefix, tags, build, timeout=DEFAULT_TIMEOUT):
+    """
+    The response for ``request`` from cache, calling ``build()`` (returning
+    a DRF Response) on a miss. Only 200 responses are stored. ``tags=None``
+    means nothing would invalidate the entry, so the response is not cached.
+    """
+    if tags is None:
+        _count(prefix, 'bypassed')
+        return build()
+
+    key = cachetags.make_key(
+        prefix, tags, (request.get_full_path(), *scope_key(request.user), *refdata.get_release_state())
+    )
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', None)
+    etag = '"%s"' % hashlib.md5(f'{key}|{renderer}'.encode()).hexdigest()
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        _count(prefix, 'not_modified')
+        return _finish(not_modified, etag)
+
+    data = cache.get(key)
+    if data is not None:
+        _count(prefix, 'hits')
+        return _finish(Response(data), etag)
+
+    _count(prefix, 'misses')
+    response = build()
+    if response.status_code != 200:
+        return response
+    cache.set(key, response.data, timeout=timeout)
+    return _finish(response, etag)
+
+
+class CachedResponseMixin:
+    """
+    Cache the ``cache_actions`` (default ``list`` and ``retrieve``) under
+    ``get_cache_tags()``. Custom actions opt in by returning
+    ``self.cached_response(request, build)``.
+    """
+    cache_actions = ('list', 'retrieve')
+    cache_timeout = DEFAULT_TIMEOUT
+
+    def get_cache_tags(self):
+        """Tags whose bump must drop this view's cached responses (``None``: do not cache)"""
+        raise NotImplementedError
+
+    def cached_response(self, request, build):
+        # The key is the validator, so conditional-GET aggregates are not needed underneath
+        self.response_cached = True
+        return serve(
+            request, f'{type(self).__name__}:{self.action}', self.get_cache_tags(), build, self.cache_timeout
+        )
+
+    def list(self, request, *args, **kwargs):
+        parent = super(CachedResponseMixin, self)
+        if 'list' not in self.cache_actions:
+            return parent.list(request, *args, **kwargs)
+        return self.cached_response(request, lambda: parent.list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        parent = super(CachedResponseMixin, self)
+        if 'retrieve' not in self.cache_actions:
+            return parent.retrieve(request, *args, **kwargs)
+        return self.cached_response(request, lambda: parent.retrieve(request, *args, **kwargs))
+
+
+def stats():
+    with _lock:
+        report = {}
+        for prefix, counts in _stats.items():
+            served = counts['hits'] + counts['not_modified']
+            lookups = served + counts['misses']
+            report[prefix] = {**counts, 'hit_ratio': round(served / lookups, 3) if lookups else None}
+        return report
+
+
+metrics.register('response_cache', stats)
@@ -8,10 +8,10 @@ websocket_urlpatterns = [
 
 # Legacy support
 from channels.routing import ProtocolTypeRouter
-from channels.auth import AuthMiddlewareStack
+from backend.ws_auth import JWTAuthMiddleware
 
 application = ProtocolTypeRouter({
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddleware(
         URLRouter(websocket_urlpatterns)
     ),
 })
@@ -14,6 +14,7 @@ from pathlib import Path
 from decouple import config, Csv
 import dj_database_url
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -62,9 +63,7 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Must be after SecurityMiddleware
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.cache.UpdateCacheMiddleware',  # Cache middleware (first)
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',  # Cache middleware (last)
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -154,21 +153,44 @@ else:
         }
     }
 
-# Caching Configuration - Django Local Memory Cache (no Redis needed)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+# Caching Configuration - shared by every worker: Redis when REDIS_URL is set,
+# otherwise a SQLite file on local disk (see backend/cache_backends.py).
+# Test runs clear the cache between tests, so they get a private in-process
+# cache instead of the one shared with running workers.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tests',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
         }
     }
-}
+elif REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'backend.cache_backends.SQLiteCache',
+            'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, '.cache', 'cache.sqlite3')),
+            'OPTIONS': {
+                'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int),
+                'MAX_SIZE': config('CACHE_MAX_SIZE_MB', default=64, cast=int) * 1024 * 1024,
+            }
+        }
+    }
+
+# Reference data (backend/refdata.py) is cached per worker; the shared generation
+# is checked once per request and otherwise at most this often
+REFDATA_CHECK_SECONDS = config('REFDATA_CHECK_SECONDS', default=1, cast=float)
 
-# Cache settings
-CACHE_MIDDLEWARE_ALIAS = 'default'
-CACHE_MIDDLEWARE_SECONDS = 300  # 5 minutes
-CACHE_MIDDLEWARE_KEY_PREFIX = ''
+# API responses are cached per view and caller by backend/response_cache.py,
+# invalidated through cache tags; there is no site-wide page cache.
 
 
 # Password validation
@@ -216,6 +238,28 @@ if not DEBUG:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Report cards: worker processes used for batch (class/level) PDF exports
+REPORT_CARD_WORKERS = config('REPORT_CARD_WORKERS', default=2, cast=int)
+
+# Scheduled result releases (see results/release.py)
+RESULT_RELEASE_SCHEDULER = config('RESULT_RELEASE_SCHEDULER', default=True, cast=bool)
+RESULT_RELEASE_POLL_SECONDS = config('RESULT_RELEASE_POLL_SECONDS', default=60, cast=int)
+
+# Realtime outbox: websocket updates are batched per window and published in the background (see backend/outbox.py)
+REALTIME_OUTBOX = config('REALTIME_OUTBOX', default=True, cast=bool)
+REALTIME_OUTBOX_WINDOW_MS = config('REALTIME_OUTBOX_WINDOW_MS', default=50, cast=int)
+# Per-connection send queue: a client that falls this far behind, or whose send stalls this long, is disconnected
+REALTIME_SEND_QUEUE_SIZE = config('REALTIME_SEND_QUEUE_SIZE', default=100, cast=int)
+REALTIME_SEND_TIMEOUT_SECONDS = config('REALTIME_SEND_TIMEOUT_SECONDS', default=5, cast=float)
+# Sequenced event log for ?since= resume (see backend/eventlog.py). Persist it when running several workers
+REALTIME_EVENT_BUFFER = config('REALTIME_EVENT_BUFFER', default=1000, cast=int)
+REALTIME_EVENT_LOG_PERSIST = config('REALTIME_EVENT_LOG_PERSIST', default=False, cast=bool)
+REALTIME_EVENT_LOG_RETAIN = config('REALTIME_EVENT_LOG_RETAIN', default=10000, cast=int)
+REALTIME_REPLAY_LIMIT = config('REALTIME_REPLAY_LIMIT', default=200, cast=int)
+
+# Delta sync (GET /api/changes/): how long deletions are remembered; older cursors must resync
+CHANGES_TOMBSTONE_DAYS = config('CHANGES_TOMBSTONE_DAYS', default=30, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
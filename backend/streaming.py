@@ -0,0 +1,45 @@
+"""
+Streaming responses that stream under ASGI as well as WSGI.
+
+Under ASGI (daphne, ``USE_ASGI=true``) Django reads a synchronous
+``StreamingHttpResponse`` iterator with ``sync_to_async(list)``, so the
+whole body is built in memory before the first byte is sent. For ASGI
+requests the iterator is wrapped in an async iterator that advances it a
+batch at a time through ``sync_to_async``; the thread-sensitive executor
+keeps every step (and its database cursor) on the same thread.
+"""
+
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+def iterate_async(iterable, batch_size=1):
+    """Async iterator over a sync ``iterable``, yielding each batch of ``batch_size`` items joined as one chunk"""
+    iterator = iter(iterable)
+
+    def next_batch():
+        return list(islice(iterator, batch_size))
+
+    def close():
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+    async def stream():
+        try:
+            while batch := await sync_to_async(next_batch)():
+                yield batch[0][:0].join(batch)
+        finally:
+            # Release the generator's cursor or pool if the client went away
+            await sync_to_async(close)()
+
+    return stream()
+
+
+def streaming_response(request, iterable, batch_size=1, **kwargs):
+    """``StreamingHttpResponse`` over ``iterable``, asynchronous when ``request`` came in over ASGI"""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        iterable = iterate_async(iterable, batch_size)
+    return StreamingHttpResponse(iterable, **kwargs)
@@ -0,0 +1,128 @@
+"""
+Websocket subscription topics.
+
+Every connection used to join one "updates" group, so each write was sent
+to everyone online. A connection now joins the topics of the user behind
+it, and each event is published to the narrowest topics covering the
+people who care about it:
+
+    role.<role>          everyone with that role (admins get every event here)
+    class.<id>.teacher   the teacher assigned to a class
+    class.<id>.pupil     the pupils of a class
+    pupil.<id>           one pupil
+    session.<id>         teachers and pupils watching a session (the active one by default)
+
+A connection can be in more than one of an event's topics (a teacher of
+two classes at the same level gets a level-wide event through both), and
+over channel-layer groups each of those delivers it. Every event carries
+its ``seq`` and the consumer skips one it has already sent, so nobody
+receives an event twice on either delivery path.
+"""
+
+from backend import refdata
+
+ROLES = ('admin', 'teacher', 'pupil')
+
+
+def role_topic(role):
+    return f'role.{role}'
+
+
+def class_topic(class_id, role):
+    return f'class.{class_id}.{role}'
+
+
+def pupil_topic(pupil_id):
+    return f'pupil.{pupil_id}'
+
+
+def session_topic(session_id):
+    return f'session.{session_id}'
+
+
+def is_personal(topic):
+    """Topics with a single subscriber, whose messages must not be merged with others'"""
+    return topic.startswith('pupil.')
+
+
+def pupil_class_ids(pupil_ids):
+    """``{pupil id: class id}`` for pupils with a class, in one query"""
+    from accounts.models import PupilProfile
+    return dict(
+        PupilProfile.objects.filter(user_id__in=pupil_ids, pupil_class__isnull=False)
+        .order_by().values_list('user_id', 'pupil_class_id')
+    )
+
+
+def topics_for_user(user, session_id=None):
+    """Topics a connection for ``user`` joins; ``session_id`` defaults to the active session"""
+    role = getattr(user, 'role', None)
+    if role not in ROLES:
+        return set()
+    topics = {role_topic(role)}
+    if role == 'admin':
+        return topics
+
+    if session_id is None:
+        active_session = refdata.get_active_session()
+        session_id = active_session.id if active_session else None
+    if session_id is not None:
+        topics.add(session_topic(session_id))
+    if role == 'teacher':
+        topics.update(class_topic(class_id, 'teacher') for class_id in refdata.get_teacher_class_ids(user.id))
+    else:
+        topics.add(pupil_topic(user.id))
+        class_id = pupil_class_ids([user.id]).get(user.id)
+        if class_id is not None:
+            topics.add(class_topic(class_id, 'pupil'))
+    return topics
+
+
+# Audiences for broadcast_update
+
+def everyone():
+    return [role_topic(role) for role in ROLES]
+
+
+def admins():
+    return [role_topic('admin')]
+
+
+def staff():
+    """Admins and every teacher (e.g. upload switches, class lists)"""
+    return [role_topic('admin'), role_topic('teacher')]
+
+
+def pupil_audience(pupil_id, class_id):
+    """Admins, the pupil's class teacher and the pupil"""
+    topics = admins()
+    if class_id is not None:
+        topics.append(class_topic(class_id, 'teacher'))
+    topics.append(pupil_topic(pupil_id))
+    return topics
+
+
+def class_audience(*class_ids):
+    """Admins and the teachers and pupils of the given classes"""
+    topics = admins()
+    for class_id in dict.fromkeys(class_ids):
+        if class_id is not None:
+            topics += [class_topic(class_id, 'teacher'), class_topic(class_id, 'pupil')]
+    return topics
+
+
+def class_list_audience(class_id):
+    """A class being created, renamed or reassigned: every teacher (their class lists), and its pupils"""
+    return staff() + [class_topic(class_id, 'pupil')]
+
+
+def level_audience(level):
+    """Admins and the teachers and pupils of every class at a level"""
+    return class_audience(*(
+        class_id for class_id in refdata.get_class_ids() if refdata.get_class_level(class_id) == level
+    ))
+
+
+def session_audience(session_id):
+    """Admins and everyone watching the session"""
+    return admins() + [session_topic(session_id)]
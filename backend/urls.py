@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
+from backend.metrics import metrics_view
 
 def health_check(request):
     """Health check endpoint for Railway"""
@@ -26,6 +27,7 @@ def health_check(request):
 
 urlpatterns = [
     path('api/health/', health_check, name='health_check'),
+    path('api/metrics/', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/', include('accounts.urls')),
     path('api/', include('classes.urls')),
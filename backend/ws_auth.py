@@ -0,0 +1,36 @@
+"""
+JWT authentication for websocket connections.
+
+The SPA authenticates with simplejwt access tokens, not Django sessions,
+so ``AuthMiddlewareStack`` left every socket anonymous. Browsers cannot
+set an Authorization header on a websocket, so the access token is passed
+as ``?token=<access token>``.
+"""
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+
+@database_sync_to_async
+def get_user(raw_token):
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+    return user if user.is_active else AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Sets ``scope['user']`` from the ``token`` query parameter (``AnonymousUser`` if missing or invalid)"""
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        token = query.get('token', [None])[0]
+        scope = dict(scope, user=await get_user(token) if token else AnonymousUser())
+        return await super().__call__(scope, receive, send)
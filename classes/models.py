@@ -42,6 +42,7 @@ class Class(models.Model):
             models.Index(fields=['level'], name='class_level_idx'),
             models.Index(fields=['assigned_teacher'], name='class_teacher_idx'),
             models.Index(fields=['-created_at'], name='class_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='class_updated_idx'),
         ]
 
 
@@ -78,4 +79,5 @@ class Subject(models.Model):
             models.Index(fields=['assigned_class'], name='subject_class_idx'),
             models.Index(fields=['assigned_teacher'], name='subject_teacher_idx'),
             models.Index(fields=['-created_at'], name='subject_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='subject_updated_idx'),
         ]
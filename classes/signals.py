@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import PupilProfile
+from backend import refdata
+from results.invalidation import invalidate_class
+from .models import Class, Subject
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_class_refdata(sender, **kwargs):
+    """Teacher -> class, subject -> class and class -> level maps may have changed"""
+    refdata.invalidate()
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+def invalidate_class_caches(sender, instance, **kwargs):
+    invalidate_class(instance.id)
+
+
+@receiver(pre_save, sender=Subject)
+@receiver(pre_save, sender=PupilProfile)
+def remember_previous_class(sender, instance, **kwargs):
+    """Keep the class a subject or pupil is moving out of, so both classes are invalidated"""
+    field = 'assigned_class_id' if sender is Subject else 'pupil_class_id'
+    instance._previous_class_id = (
+        sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_subject_class_caches(sender, instance, **kwargs):
+    invalidate_class(instance.assigned_class_id, getattr(instance, '_previous_class_id', None))
+
+
+@receiver(post_save, sender=PupilProfile)
+@receiver(post_delete, sender=PupilProfile)
+def invalidate_pupil_class_caches(sender, instance, **kwargs):
+    invalidate_class(instance.pupil_class_id, getattr(instance, '_previous_class_id', None))
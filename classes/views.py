@@ -22,9 +22,14 @@ from accounts.permissions import IsAdmin, IsAdminOrTeacher
 
 
 from backend.realtime import broadcast_update
+from backend import topics
+from backend.conditional import ConditionalGetMixin
+from backend.response_cache import CachedResponseMixin
+from results.invalidation import CLASSES_TAG, USERS_TAG
+from backend.pagination import paginate_action
 
 
-class ClassViewSet(viewsets.ModelViewSet):
+class ClassViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Class CRUD operations
     Admin: Full access
@@ -32,6 +37,7 @@ class ClassViewSet(viewsets.ModelViewSet):
     Pupil: View their own class
     """
     permission_classes = [IsAuthenticated]
+    conditional_dependencies = ('assigned_teacher', 'pupils', 'subjects', 'subjects__assigned_teacher')
     filterset_fields = ['level', 'assigned_teacher']
     search_fields = ['name', 'level']
     ordering_fields = ['name', 'created_at']
@@ -74,9 +80,8 @@ class ClassViewSet(viewsets.ModelViewSet):
                 pass
         return Class.objects.none()
 
-    def list(self, request, *args, **kwargs):
-        """List classes (no caching) to ensure realtime visibility for assigned teachers."""
-        return super().list(request, *args, **kwargs)
+    def get_cache_tags(self):
+        return [CLASSES_TAG, USERS_TAG]
 
     @action(detail=True, methods=['get'])
     def pupils(self, request, pk=None):
@@ -90,26 +95,59 @@ class ClassViewSet(viewsets.ModelViewSet):
 
         # Optimize pupil query with select_related
         pupils = class_obj.pupils.select_related('user').all()
-        serializer = PupilProfileSerializer(pupils, many=True)
-        return Response(serializer.data)
+        # Cursor pages seek on the profile's primary key (the name ordering is not indexed)
+        return paginate_action(
+            request, pupils, lambda rows: PupilProfileSerializer(rows, many=True).data, ordering=('id',)
+        )
+
+    @action(detail=True, methods=['get'])
+    def broadsheet(self, request, pk=None):
+        """
+        Pupils x subjects matrix for a session/term (?session=&term=, defaulting
+        to the active session and its current term), column-oriented, with
+        each pupil's summary.
+        """
+        if getattr(request.user, 'role', None) not in ('admin', 'teacher'):
+            raise PermissionDenied('Only staff can view class broadsheets.')
+        class_obj = self.get_object()
+
+        from backend import refdata
+        from results.broadsheet import cached_broadsheet
+        from results.models import AcademicSession, Result
+
+        session_id = request.query_params.get('session')
+        if session_id:
+            session = AcademicSession.objects.filter(id=session_id).first()
+        else:
+            session = refdata.get_active_session()
+        if not session:
+            return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+        term = request.query_params.get('term') or session.current_term
+        if term not in dict(Result.TERM_CHOICES):
+            return Response({'error': 'Invalid term'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response(cached_broadsheet(class_obj, session, term))
+        # Kept fresh by tag invalidation; keep it out of shared/page caches
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        broadcast_update('class_update', {'action': 'create', 'class_id': instance.id})
+        broadcast_update('class_update', {'action': 'create', 'class_id': instance.id}, topics=topics.class_list_audience(instance.id))
         return instance
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        broadcast_update('class_update', {'action': 'update', 'class_id': instance.id})
+        broadcast_update('class_update', {'action': 'update', 'class_id': instance.id}, topics=topics.class_list_audience(instance.id))
         return instance
 
     def perform_destroy(self, instance):
         class_id = instance.id
         instance.delete()
-        broadcast_update('class_update', {'action': 'delete', 'class_id': class_id})
+        broadcast_update('class_update', {'action': 'delete', 'class_id': class_id}, topics=topics.class_list_audience(class_id))
 
 
-class SubjectViewSet(viewsets.ModelViewSet):
+class SubjectViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Subject CRUD operations
     Admin: Full access
@@ -117,6 +155,7 @@ class SubjectViewSet(viewsets.ModelViewSet):
     """
     serializer_class = SubjectSerializer
     permission_classes = [IsAuthenticated]
+    conditional_dependencies = ('assigned_class', 'assigned_teacher')
     filterset_fields = ['assigned_class', 'assigned_teacher']
     search_fields = ['name', 'code']
     ordering_fields = ['name', 'created_at']
@@ -154,12 +193,8 @@ class SubjectViewSet(viewsets.ModelViewSet):
                 pass
         return Subject.objects.none()
 
-    def list(self, request, *args, **kwargs):
-        """
-        List subjects without caching to ensure real-time visibility
-        for score entry and subject management
-        """
-        return super().list(request, *args, **kwargs)
+    def get_cache_tags(self):
+        return [CLASSES_TAG, USERS_TAG]
 
     def perform_create(self, serializer):
         """Teachers can only create subjects for their own classes and must assign themselves."""
@@ -175,12 +210,12 @@ class SubjectViewSet(viewsets.ModelViewSet):
                 raise PermissionDenied('Teachers can only assign themselves as the subject teacher.')
 
             instance = serializer.save(assigned_teacher=user)
-            broadcast_update('subject_update', {'action': 'create', 'subject_id': instance.id})
+            broadcast_update('subject_update', {'action': 'create', 'subject_id': instance.id}, topics=topics.class_audience(instance.assigned_class_id))
             return instance
 
         # Admins can set any fields
         instance = serializer.save()
-        broadcast_update('subject_update', {'action': 'create', 'subject_id': instance.id})
+        broadcast_update('subject_update', {'action': 'create', 'subject_id': instance.id}, topics=topics.class_audience(instance.assigned_class_id))
         return instance
 
     def perform_update(self, serializer):
@@ -196,17 +231,17 @@ class SubjectViewSet(viewsets.ModelViewSet):
                 raise PermissionDenied('Teachers can only assign themselves as the subject teacher.')
 
             instance = serializer.save(assigned_teacher=user, assigned_class=new_class)
-            broadcast_update('subject_update', {'action': 'update', 'subject_id': instance.id})
+            broadcast_update('subject_update', {'action': 'update', 'subject_id': instance.id}, topics=topics.class_audience(instance.assigned_class_id))
             return instance
 
         instance = serializer.save()
-        broadcast_update('subject_update', {'action': 'update', 'subject_id': instance.id})
+        broadcast_update('subject_update', {'action': 'update', 'subject_id': instance.id}, topics=topics.class_audience(instance.assigned_class_id))
         return instance
 
     def perform_destroy(self, instance):
-        subject_id = instance.id
+        subject_id, class_id = instance.id, instance.assigned_class_id
         instance.delete()
-        broadcast_update('subject_update', {'action': 'delete', 'subject_id': subject_id})
+        broadcast_update('subject_update', {'action': 'delete', 'subject_id': subject_id}, topics=topics.class_audience(class_id))
 
 
 
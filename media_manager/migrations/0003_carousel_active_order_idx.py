@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media_manager', '0002_add_sitesetting'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carouselimage',
+            index=models.Index(fields=['is_active', 'order', '-id'], name='carousel_active_order_idx'),
+        ),
+    ]
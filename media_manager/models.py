@@ -18,6 +18,10 @@ class CarouselImage(models.Model):
     
     class Meta:
         ordering = ['order', '-created_at']
+        indexes = [
+            # Cursor pages of active images seek on (order, -id)
+            models.Index(fields=['is_active', 'order', '-id'], name='carousel_active_order_idx'),
+        ]
 
 
 class SchoolLogo(models.Model):
@@ -8,11 +8,13 @@ import logging
 from .models import CarouselImage, SchoolLogo, SiteSetting
 from .serializers import CarouselImageSerializer, SchoolLogoSerializer, SiteSettingSerializer
 from accounts.permissions import IsAdmin
+from backend.conditional import ConditionalGetMixin
+from backend.pagination import paginate_action
 
 logger = logging.getLogger(__name__)
 
 
-class CarouselImageViewSet(viewsets.ModelViewSet):
+class CarouselImageViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for CarouselImage CRUD operations
     Public can view active images
@@ -35,8 +37,10 @@ class CarouselImageViewSet(viewsets.ModelViewSet):
     def active_images(self, request):
         """Get all active carousel images"""
         images = CarouselImage.objects.filter(is_active=True)
-        serializer = self.get_serializer(images, many=True)
-        return Response(serializer.data)
+        # id breaks ties in order (newest first, like -created_at) so cursor pages never skip or repeat an image
+        return paginate_action(
+            request, images, lambda rows: self.get_serializer(rows, many=True).data, ordering=('order', '-id')
+        )
 
 
 class SchoolLogoViewSet(viewsets.ModelViewSet):
@@ -64,7 +68,7 @@ class SchoolLogoViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response({'error': 'No active logo found'}, status=status.HTTP_404_NOT_FOUND)
 
-class SiteSettingViewSet(viewsets.ModelViewSet):
+class SiteSettingViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Simple API for site settings. Admin-only for create/update/delete."""
     queryset = SiteSetting.objects.all()
     serializer_class = SiteSettingSerializer
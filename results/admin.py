@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Result, AcademicSession, ResultSummary
+from .models import Result, AcademicSession, ResultSummary, GradingScale
 
 
 @admin.register(AcademicSession)
@@ -20,3 +20,8 @@ class ResultSummaryAdmin(admin.ModelAdmin):
     list_display = ['pupil', 'session', 'term', 'total_subjects', 'average_score', 'overall_grade']
     list_filter = ['session', 'term', 'overall_grade']
     search_fields = ['pupil__full_name']
+
+
+@admin.register(GradingScale)
+class GradingScaleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'level', 'a_min', 'b_min', 'c_min', 'd_min', 'updated_at']
@@ -0,0 +1,126 @@
+"""Score statistics per subject and class for a session/term.
+
+Counts, sums, extremes, pass counts and the grade histogram come from one
+grouped aggregate per level (subject, class). Only the order statistics and
+spread need the raw scores: the ``total`` column is loaded once and split
+into a NumPy array per group. Results are cached per (session, term,
+class) under the class's result tags, so a dashboard load after the first
+is a cache read.
+"""
+
+import numpy as np
+from django.db.models import Count, Max, Min, Q, Sum
+
+from backend import cachetags
+from .invalidation import class_results_tags, results_tag
+from .models import GRADE_BOUNDARIES, Result
+
+GRADES = [grade for _, grade in GRADE_BOUNDARIES] + ['F']
+
+
+def _aggregates(results, group_field):
+    """One GROUP BY over ``results``: count, sum, min, max, passes and grade counts per group"""
+    rows = results.values(group_field).annotate(
+        count=Count('id'),
+        score_sum=Sum('total'),
+        lowest=Min('total'),
+        highest=Max('total'),
+        # Anything above F passes, whichever grading scale the class uses
+        passed=Count('id', filter=~Q(grade='F')),
+        **{f'grade_{grade}': Count('id', filter=Q(grade=grade)) for grade in GRADES},
+    ).order_by()
+    return {row[group_field]: row for row in rows}
+
+
+def _statistics(row, scores):
+    count = row['count']
+    return {
+        'count': count,
+        'mean': round(float(row['score_sum']) / count, 2),
+        'median': round(float(np.median(scores)), 2),
+        'p25': round(float(np.percentile(scores, 25)), 2),
+        'p75': round(float(np.percentile(scores, 75)), 2),
+        'std': round(float(np.std(scores)), 2),
+        'min': float(row['lowest']),
+        'max': float(row['highest']),
+        'pass_rate': round(row['passed'] / count, 4),
+        'grades': {grade: row[f'grade_{grade}'] for grade in GRADES},
+    }
+
+
+def _split(keys, values):
+    """Group ``values`` by ``keys`` (both NumPy arrays) into ``{key: array}``"""
+    if not len(keys):
+        return {}
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    unique, starts = np.unique(keys, return_index=True)
+    return dict(zip(unique.tolist(), np.split(values, starts[1:])))
+
+
+def build_statistics(session_id, term, class_id=None):
+    """
+    Statistics for every subject and class in a session/term (or one class).
+    """
+    from classes.models import Class, Subject
+
+    results = Result.objects.filter(session_id=session_id, term=term)
+    if class_id is not None:
+        results = results.filter(subject__assigned_class_id=class_id)
+
+    by_subject = _aggregates(results, 'subject_id')
+    by_class = _aggregates(results, 'subject__assigned_class_id')
+
+    pairs = np.array(
+        list(results.values_list('subject_id', 'subject__assigned_class_id', 'total').order_by()),
+        dtype=float,
+    ).reshape(-1, 3)
+    subject_scores = _split(pairs[:, 0].astype(int), pairs[:, 2])
+    class_scores = _split(pairs[:, 1].astype(int), pairs[:, 2])
+
+    subjects = {
+        subject_id: (name, assigned_class_id)
+        for subject_id, name, assigned_class_id in Subject.objects.filter(
+            id__in=list(by_subject)
+        ).values_list('id', 'name', 'assigned_class_id')
+    }
+    classes = dict(Class.objects.filter(id__in=list(by_class)).values_list('id', 'name'))
+
+    return {
+        'session_id': session_id,
+        'term': term,
+        'class_id': class_id,
+        'subjects': [
+            {
+                'subject_id': subject_id,
+                'subject': subjects[subject_id][0],
+                'class_id': subjects[subject_id][1],
+                **_statistics(row, subject_scores[subject_id]),
+            }
+            for subject_id, row in sorted(by_subject.items(), key=lambda item: subjects[item[0]][0])
+        ],
+        'classes': [
+            {
+                'class_id': group_id,
+                'class': classes.get(group_id),
+                **_statistics(row, class_scores[group_id]),
+            }
+            for group_id, row in sorted(by_class.items(), key=lambda item: classes.get(item[0]) or '')
+        ],
+    }
+
+
+def cached_statistics(session_id, term, class_id=None):
+    """Statistics from cache; rebuilt when a result in the (session, term, class) group changes"""
+    if class_id is not None:
+        tags = class_results_tags(session_id, term, class_id)
+    else:
+        from classes.models import Class
+        class_ids = Class.objects.order_by('id').values_list('id', flat=True)
+        tags = [results_tag(session_id, term)] + [results_tag(session_id, term, group_id) for group_id in class_ids]
+    return cachetags.get_or_build(
+        'analytics',
+        tags,
+        (session_id, term, class_id),
+        lambda: build_statistics(session_id, term, class_id),
+    )
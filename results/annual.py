@@ -0,0 +1,157 @@
+"""Annual (three-term) results.
+
+AnnualResult and AnnualSummary are materialized from Result with one
+grouped aggregate per session: ``GROUP BY pupil, subject`` with each
+term's total picked out by a filtered SUM. Writes refresh only the pupils
+they touch, so a term's result change costs one small aggregate over that
+pupil's session instead of a per-term query fan-out on every read.
+"""
+
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Rank
+
+from .models import AnnualResult, AnnualSummary, Result, boundaries_for_class, grade_for_score, stored_average
+from .services import BATCH_SIZE, _store_positions
+
+TERMS = ('first', 'second', 'third')
+
+ANNUAL_RESULT_UPDATE_FIELDS = [
+    'first_term', 'second_term', 'third_term', 'terms_count',
+    'annual_total', 'annual_average', 'grade', 'updated_at',
+]
+ANNUAL_SUMMARY_UPDATE_FIELDS = ['total_subjects', 'total_score', 'average_score', 'overall_grade', 'updated_at']
+
+
+def refresh_annual(session_id, pupil_ids=None):
+    """
+    Rebuild annual results and summaries for a session, for the given pupils
+    or (with ``pupil_ids=None``) the whole session, then re-rank annual
+    class positions for the affected classes. Returns the number of pupils
+    refreshed.
+    """
+    results = Result.objects.filter(session_id=session_id)
+    annual_results = AnnualResult.objects.filter(session_id=session_id)
+    annual_summaries = AnnualSummary.objects.filter(session_id=session_id)
+    if pupil_ids is not None:
+        pupil_ids = list(pupil_ids)
+        if not pupil_ids:
+            return 0
+        results = results.filter(pupil_id__in=pupil_ids)
+        annual_results = annual_results.filter(pupil_id__in=pupil_ids)
+        annual_summaries = annual_summaries.filter(pupil_id__in=pupil_ids)
+
+    rows = results.values('pupil_id', 'subject_id', class_id=F('subject__assigned_class_id')).annotate(
+        terms_count=Count('id'),
+        annual_total=Sum('total'),
+        **{f'{term}_term': Sum('total', filter=Q(term=term)) for term in TERMS},
+    ).order_by()
+
+    subject_rows = []
+    per_pupil = {}
+    pupil_classes = {}
+    for row in rows:
+        boundaries = boundaries_for_class(row['class_id'])
+        average = stored_average(row['annual_total'], row['terms_count'])
+        subject_rows.append(AnnualResult(
+            pupil_id=row['pupil_id'],
+            subject_id=row['subject_id'],
+            session_id=session_id,
+            first_term=row['first_term'],
+            second_term=row['second_term'],
+            third_term=row['third_term'],
+            terms_count=row['terms_count'],
+            annual_total=row['annual_total'],
+            annual_average=average,
+            grade=grade_for_score(average, boundaries),
+        ))
+        per_pupil.setdefault(row['pupil_id'], []).append(average)
+        pupil_classes[row['pupil_id']] = row['class_id']
+
+    summaries = []
+    for pupil_id, averages in per_pupil.items():
+        total_score = sum(averages, Decimal('0'))
+        average = stored_average(total_score, len(averages))
+        summaries.append(AnnualSummary(
+            pupil_id=pupil_id,
+            session_id=session_id,
+            total_subjects=len(averages),
+            total_score=total_score,
+            average_score=average,
+            overall_grade=grade_for_score(average, boundaries_for_class(pupil_classes[pupil_id])),
+        ))
+
+    with transaction.atomic():
+        # Subjects (or pupils) with no results left in the session no longer have an annual row
+        current = {(row.pupil_id, row.subject_id) for row in subject_rows}
+        stale_ids = [
+            row_id for row_id, pupil_id, subject_id in annual_results.values_list('id', 'pupil_id', 'subject_id')
+            if (pupil_id, subject_id) not in current
+        ]
+        if stale_ids:
+            AnnualResult.objects.filter(id__in=stale_ids).delete()
+        annual_summaries.exclude(pupil_id__in=list(per_pupil)).delete()
+
+        AnnualResult.objects.bulk_create(
+            subject_rows,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['pupil', 'subject', 'session'],
+            update_fields=ANNUAL_RESULT_UPDATE_FIELDS,
+        )
+        AnnualSummary.objects.bulk_create(
+            summaries,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['pupil', 'session'],
+            update_fields=ANNUAL_SUMMARY_UPDATE_FIELDS,
+        )
+
+    refresh_annual_positions(session_id, pupil_ids=pupil_ids)
+    return len(per_pupil)
+
+
+def refresh_annual_positions(session_id, pupil_ids=None):
+    """Rank annual summaries within each class by annual average (all classes, or those of ``pupil_ids``)"""
+    from accounts.models import PupilProfile
+
+    summaries = AnnualSummary.objects.filter(
+        session_id=session_id, pupil__pupil_profile__pupil_class__isnull=False
+    )
+    if pupil_ids is not None:
+        summaries = summaries.filter(
+            pupil__pupil_profile__pupil_class__in=PupilProfile.objects.filter(
+                user_id__in=list(pupil_ids)
+            ).values('pupil_class')
+        )
+    ranked = summaries.annotate(
+        rank=Window(
+            Rank(),
+            partition_by=[F('pupil__pupil_profile__pupil_class_id')],
+            order_by=F('average_score').desc(),
+        )
+    ).values_list('id', 'position', 'rank')
+    return _store_positions(AnnualSummary, ranked, AnnualSummary.objects.none())
+
+
+def recompute_annual(session, class_id=None, level=None):
+    """Rebuild annual results for a whole session, class or level; returns a small report"""
+    started = time.monotonic()
+    if class_id or level:
+        from accounts.models import PupilProfile
+        profiles = PupilProfile.objects.all()
+        if class_id:
+            profiles = profiles.filter(pupil_class_id=class_id)
+        if level:
+            profiles = profiles.filter(pupil_class__level=level)
+        pupils = refresh_annual(session.id, pupil_ids=profiles.values_list('user_id', flat=True))
+    else:
+        pupils = refresh_annual(session.id)
+    return {
+        'session_id': session.id,
+        'pupils': pupils,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+    }
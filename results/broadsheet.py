@@ -0,0 +1,100 @@
+"""Class broadsheets: one row per pupil, one column per subject.
+
+The sheet is built from four flat queries (pupils, subjects, results and
+summaries of one class/session/term), pivoted in memory into a
+column-oriented structure and cached under the class's result tags.
+"""
+
+from backend import cachetags
+from .invalidation import class_results_tags
+from .models import Result, ResultSummary
+
+
+def _decimal(value):
+    # Numbers, like the rest of the API (COERCE_DECIMAL_TO_STRING is off)
+    return None if value is None else float(value)
+
+
+def build_broadsheet(class_obj, session, term):
+    """
+    Pivot a class's results for a session/term into parallel arrays.
+
+    ``pupils`` and ``summary`` hold one entry per pupil (in the same
+    order); ``scores`` maps each subject id to per-pupil ``test``,
+    ``exam``, ``total``, ``grade`` and ``position`` arrays, with ``None``
+    where a pupil has no result for that subject.
+    """
+    from accounts.models import PupilProfile
+    from classes.models import Subject
+
+    pupil_rows = list(
+        PupilProfile.objects.filter(pupil_class=class_obj).order_by('user__full_name').values_list(
+            'user_id', 'user__username', 'user__full_name'
+        )
+    )
+    subject_rows = list(
+        Subject.objects.filter(assigned_class=class_obj).order_by('name').values_list('id', 'name', 'code')
+    )
+    index = {pupil_id: i for i, (pupil_id, _, _) in enumerate(pupil_rows)}
+    size = len(pupil_rows)
+
+    scores = {
+        subject_id: {column: [None] * size for column in ('test', 'exam', 'total', 'grade', 'position')}
+        for subject_id, _, _ in subject_rows
+    }
+    results = Result.objects.filter(
+        session=session, term=term, pupil__pupil_profile__pupil_class=class_obj
+    ).values_list('pupil_id', 'subject_id', 'test_score', 'exam_score', 'total', 'grade', 'position')
+    for pupil_id, subject_id, test_score, exam_score, total, grade, position in results:
+        i = index.get(pupil_id)
+        column = scores.get(subject_id)
+        if i is None or column is None:
+            continue
+        column['test'][i] = _decimal(test_score)
+        column['exam'][i] = _decimal(exam_score)
+        column['total'][i] = _decimal(total)
+        column['grade'][i] = grade
+        column['position'][i] = position
+
+    summary = {
+        column: [None] * size
+        for column in ('total_subjects', 'total_score', 'average_score', 'overall_grade', 'position')
+    }
+    summaries = ResultSummary.objects.filter(
+        session=session, term=term, pupil_id__in=list(index)
+    ).values_list('pupil_id', 'total_subjects', 'total_score', 'average_score', 'overall_grade', 'position')
+    for pupil_id, total_subjects, total_score, average_score, overall_grade, position in summaries:
+        i = index[pupil_id]
+        summary['total_subjects'][i] = total_subjects
+        summary['total_score'][i] = _decimal(total_score)
+        summary['average_score'][i] = _decimal(average_score)
+        summary['overall_grade'][i] = overall_grade
+        summary['position'][i] = position
+
+    return {
+        'class': {'id': class_obj.id, 'name': class_obj.name, 'level': class_obj.level},
+        'session': {'id': session.id, 'name': session.name},
+        'term': term,
+        'subjects': {
+            'id': [subject_id for subject_id, _, _ in subject_rows],
+            'name': [name for _, name, _ in subject_rows],
+            'code': [code for _, _, code in subject_rows],
+        },
+        'pupils': {
+            'id': [pupil_id for pupil_id, _, _ in pupil_rows],
+            'username': [username for _, username, _ in pupil_rows],
+            'full_name': [full_name for _, _, full_name in pupil_rows],
+        },
+        'scores': {str(subject_id): column for subject_id, column in scores.items()},
+        'summary': summary,
+    }
+
+
+def cached_broadsheet(class_obj, session, term):
+    """The broadsheet, from cache unless a write to the class's results has bumped its tags"""
+    return cachetags.get_or_build(
+        'broadsheet',
+        class_results_tags(session.id, term, class_obj.id),
+        (class_obj.id, session.id, term),
+        lambda: build_broadsheet(class_obj, session, term),
+    )
@@ -0,0 +1,185 @@
+"""
+Delta sync: ``GET /api/changes/?cursor=<cursor>``.
+
+Returns the results, summaries, classes, subjects and sessions created or
+updated since the cursor, plus the ids deleted since then (``Tombstone``
+rows written by signals). Rows are scoped and serialized by the same
+viewsets as the list endpoints, so a client sees exactly what its lists
+would show.
+
+The cursor is an opaque watermark: ``(updated_at, id)`` per kind (and
+``(deleted_at, id)`` for deletions), read through the ``(updated_at, id)``
+indexes. Rows from the last ``SETTLE`` are held back until transactions
+that may still commit with an older ``updated_at`` are done.
+
+Clients ask once without a cursor (returns just a cursor), load their
+lists, then poll with the returned cursor; ``has_more`` means call again
+straight away. ``410 Gone`` with ``resync`` means the cursor cannot be
+served (older than the tombstones kept, or the caller's visibility changed,
+e.g. results were released): reload and start over.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from django.views.decorators.cache import never_cache
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from backend import refdata
+from backend.response_cache import scope_key
+from .models import Tombstone
+
+PAGE_SIZE = 200
+SETTLE = timedelta(seconds=2)
+DELETED = 'deleted'
+PRUNE_KEY = 'changes:tombstones-pruned'
+
+
+def _feeds():
+    from classes.views import ClassViewSet, SubjectViewSet
+    from .views import AcademicSessionViewSet, ResultSummaryViewSet, ResultViewSet
+    return (
+        ('results', ResultViewSet),
+        ('summaries', ResultSummaryViewSet),
+        ('classes', ClassViewSet),
+        ('subjects', SubjectViewSet),
+        ('sessions', AcademicSessionViewSet),
+    )
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def record_tombstone(kind, object_id, class_id=None, pupil_id=None):
+    Tombstone.objects.create(kind=kind, object_id=object_id, class_id=class_id, pupil_id=pupil_id)
+    # Trim expired tombstones at most once an hour
+    if cache.add(PRUNE_KEY, True, timeout=60 * 60):
+        Tombstone.objects.filter(deleted_at__lt=timezone.now() - _retention()).delete()
+
+
+def _retention():
+    return timedelta(days=settings.CHANGES_TOMBSTONE_DAYS)
+
+
+def _scope(user):
+    """What the caller can see; a cursor from a different scope cannot be continued"""
+    scope = scope_key(user)
+    if getattr(user, 'role', None) == 'pupil':
+        scope += refdata.get_release_state()
+    return hashlib.md5(repr(scope).encode()).hexdigest()[:16]
+
+
+def encode_cursor(watermarks, scope):
+    """``watermarks``: ``{kind: (datetime, last id or None)}``"""
+    raw = json.dumps({
+        'w': {kind: [moment.isoformat(), last_id] for kind, (moment, last_id) in watermarks.items()},
+        's': scope,
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, scope):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        watermarks = {
+            kind: (datetime.fromisoformat(moment), last_id) for kind, (moment, last_id) in data['w'].items()
+        }
+        issued_for = data['s']
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError('Invalid cursor')
+    if issued_for != scope:
+        raise CursorExpired('Your access changed since this cursor was issued')
+    deleted = watermarks.get(DELETED)
+    if deleted is None or deleted[0] < timezone.now() - _retention():
+        raise CursorExpired('Deletions this old are no longer kept')
+    return watermarks
+
+
+def _after(queryset, field, watermark, until):
+    """Rows past ``(field, id)`` = ``watermark``, up to ``until``, in watermark order"""
+    moment, last_id = watermark
+    later = Q(**{f'{field}__gt': moment})
+    if last_id is not None:
+        later |= Q(**{field: moment, 'id__gt': last_id})
+    return queryset.filter(later, **{f'{field}__lte': until}).order_by(field, 'id')
+
+
+def _page(queryset, field, watermark, until):
+    """``(rows, next watermark, has_more)``; a caught-up feed moves to ``until`` (id ``None``: all of it)"""
+    rows = list(_after(queryset, field, watermark, until)[:PAGE_SIZE + 1])
+    if len(rows) > PAGE_SIZE:
+        rows = rows[:PAGE_SIZE]
+        return rows, (getattr(rows[-1], field), rows[-1].id), True
+    return rows, (until, None), False
+
+
+def _visible_tombstones(user):
+    role = getattr(user, 'role', None)
+    if role == 'admin':
+        return Tombstone.objects.all()
+    shared = Q(kind='sessions')
+    if role == 'teacher':
+        return Tombstone.objects.filter(shared | Q(class_id__in=refdata.get_teacher_class_ids(user.id)))
+    if role == 'pupil':
+        from accounts.models import PupilProfile
+        class_id = PupilProfile.objects.filter(user=user).values_list('pupil_class_id', flat=True).first()
+        return Tombstone.objects.filter(
+            shared | Q(pupil_id=user.id) | Q(kind__in=['classes', 'subjects'], class_id=class_id)
+        )
+    return Tombstone.objects.none()
+
+
+def changes_since(request, cursor=None):
+    """The ``GET /api/changes/`` payload for ``request.user`` (raises ValueError / CursorExpired)"""
+    scope = _scope(request.user)
+    until = timezone.now() - SETTLE
+    feeds = _feeds()
+    if not cursor:
+        watermarks = {kind: (until, None) for kind, _ in feeds}
+        watermarks[DELETED] = (until, None)
+        return {'cursor': encode_cursor(watermarks, scope), 'has_more': False, 'changes': {}, 'deleted': {}}
+
+    watermarks = decode_cursor(cursor, scope)
+    changes = {}
+    has_more = False
+    for kind, viewset in feeds:
+        view = viewset(request=request, format_kwarg=None, action='list', args=(), kwargs={})
+        rows, watermarks[kind], more = _page(
+            view.get_queryset(), 'updated_at', watermarks.get(kind, watermarks[DELETED]), until
+        )
+        has_more |= more
+        if rows:
+            changes[kind] = view.get_serializer(rows, many=True).data
+
+    tombstones, watermarks[DELETED], more = _page(
+        _visible_tombstones(request.user), 'deleted_at', watermarks[DELETED], until
+    )
+    has_more |= more
+    deleted = {}
+    for tombstone in tombstones:
+        deleted.setdefault(tombstone.kind, []).append(tombstone.object_id)
+
+    return {'cursor': encode_cursor(watermarks, scope), 'has_more': has_more, 'changes': changes, 'deleted': deleted}
+
+
+@never_cache
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def changes_view(request):
+    """Rows created, updated or deleted since ``?cursor=`` (see module docstring)"""
+    try:
+        return Response(changes_since(request, request.query_params.get('cursor')))
+    except CursorExpired as e:
+        return Response({'detail': str(e), 'resync': True}, status=status.HTTP_410_GONE)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
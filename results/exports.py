@@ -0,0 +1,94 @@
+"""Streaming CSV exports of results and summaries.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` and
+written straight into the response ``EXPORT_CHUNK_SIZE`` lines at a time
+(through ``backend.streaming`` under ASGI), so memory stays flat for
+whole-school exports. The header row is a chunk of its own, so it goes out
+before the query has run.
+
+Text cells starting with ``=``, ``+``, ``-`` or ``@`` (or a tab or carriage
+return) are prefixed with ``'`` so spreadsheets show them instead of
+evaluating them as formulas.
+"""
+
+import csv
+from itertools import islice
+
+from backend.streaming import streaming_response
+
+EXPORT_CHUNK_SIZE = 2000
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+RESULT_EXPORT_COLUMNS = (
+    ('result_id', 'id'),
+    ('pupil_id', 'pupil_id'),
+    ('username', 'pupil__username'),
+    ('full_name', 'pupil__full_name'),
+    ('class', 'pupil__pupil_profile__pupil_class__name'),
+    ('subject_id', 'subject_id'),
+    ('subject', 'subject__name'),
+    ('session', 'session__name'),
+    ('term', 'term'),
+    ('test_score', 'test_score'),
+    ('exam_score', 'exam_score'),
+    ('total', 'total'),
+    ('grade', 'grade'),
+    ('position', 'position'),
+    ('teacher_comment', 'teacher_comment'),
+)
+
+SUMMARY_EXPORT_COLUMNS = (
+    ('summary_id', 'id'),
+    ('pupil_id', 'pupil_id'),
+    ('username', 'pupil__username'),
+    ('full_name', 'pupil__full_name'),
+    ('class', 'pupil__pupil_profile__pupil_class__name'),
+    ('session', 'session__name'),
+    ('term', 'term'),
+    ('total_subjects', 'total_subjects'),
+    ('total_score', 'total_score'),
+    ('average_score', 'average_score'),
+    ('overall_grade', 'overall_grade'),
+    ('position', 'position'),
+    ('teacher_comment', 'teacher_comment'),
+    ('principal_comment', 'principal_comment'),
+)
+
+
+class _Echo:
+    """File-like object whose write() just returns the line for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield CSV text: the header line on its own, then the queryset's rows ``chunk_size`` lines at a time"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in columns])
+    rows = queryset.values_list(*[field for _, field in columns]).iterator(chunk_size=chunk_size)
+    while lines := [writer.writerow([_cell(value) for value in row]) for row in islice(rows, chunk_size)]:
+        yield ''.join(lines)
+
+
+def csv_export_response(request, queryset, columns, filename):
+    response = streaming_response(request, iter_csv_rows(queryset, columns), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_filename(prefix, session_name=None, term=None):
+    parts = [prefix]
+    if session_name:
+        parts.append(session_name.replace('/', '-'))
+    if term:
+        parts.append(term)
+    return '_'.join(parts) + '.csv'
@@ -0,0 +1,77 @@
+"""Bulk regrading after a grading scale change.
+
+Each scale (one per class level, plus the default for every other level)
+is applied with a single ``UPDATE ... SET grade = CASE WHEN ...`` per
+table, so a whole session is regraded in a handful of statements instead
+of a Python ``save()`` per row.
+"""
+
+import time
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from backend import refdata
+from .invalidation import invalidate_results
+from .models import (
+    AcademicSession, AnnualResult, AnnualSummary, GradingScale, Result, ResultSummary, grade_expression
+)
+
+# (model, score field, grade field, lookup from the row to its class level)
+GRADED_MODELS = (
+    (Result, 'total', 'grade', 'subject__assigned_class__level'),
+    (ResultSummary, 'average_score', 'overall_grade', 'pupil__pupil_profile__pupil_class__level'),
+    (AnnualResult, 'annual_average', 'grade', 'subject__assigned_class__level'),
+    (AnnualSummary, 'average_score', 'overall_grade', 'pupil__pupil_profile__pupil_class__level'),
+)
+
+
+def regrade(session=None, levels=None):
+    """
+    Recompute stored grades from the configured grading scales.
+
+    ``session`` limits the job to one AcademicSession and ``levels`` to the
+    given class levels (e.g. the level whose scale changed); by default
+    everything is regraded. Returns a report with rows updated per model.
+    """
+    started = time.monotonic()
+    now = timezone.now()
+    refdata.invalidate()
+    scaled_levels = set(GradingScale.objects.exclude(level__isnull=True).values_list('level', flat=True))
+
+    # Levels with their own scale, then one pass for every other level on the default scale
+    passes = [(level, refdata.get_grade_boundaries(level)) for level in sorted(scaled_levels)]
+    passes.append((None, refdata.get_grade_boundaries(None)))
+
+    updated = {model.__name__: 0 for model, _, _, _ in GRADED_MODELS}
+    with transaction.atomic():
+        for level, boundaries in passes:
+            if levels is not None and level is not None and level not in levels:
+                continue
+            for model, score_field, grade_field, level_lookup in GRADED_MODELS:
+                rows = model.objects.all()
+                if session is not None:
+                    rows = rows.filter(session=session)
+                if level is not None:
+                    rows = rows.filter(**{level_lookup: level})
+                else:
+                    rows = rows.exclude(**{f'{level_lookup}__in': scaled_levels})
+                    if levels is not None:
+                        rows = rows.filter(**{f'{level_lookup}__in': levels})
+                grade = grade_expression(F(score_field), boundaries)
+                updated[model.__name__] += rows.exclude(**{grade_field: grade}).update(
+                    **{grade_field: grade, 'updated_at': now}
+                )
+
+    sessions = [session] if session is not None else AcademicSession.objects.all()
+    for each in sessions:
+        for term, _ in Result.TERM_CHOICES:
+            invalidate_results(each.id, term)
+
+    return {
+        'session_id': getattr(session, 'id', None),
+        'levels': sorted(levels) if levels is not None else None,
+        'updated': updated,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+    }
@@ -0,0 +1,116 @@
+"""Cache tags for data derived from results (broadsheets, analytics, ...).
+
+``results:<session>:<term>`` covers a whole session/term and
+``results:<session>:<term>:class:<id>`` one class within it, with
+``results:*:*`` and ``results:*:*:class:<id>`` bumped alongside them for
+readers that span every session; ``pupil:<id>`` covers one pupil's own
+results, ``class:<id>`` covers a class's
+membership and subjects (``classes`` any class), ``sessions`` the sessions
+themselves and ``users`` the names shown next to results. Write paths call
+the ``invalidate_*`` functions below (mostly from model signals) and cached
+readers list the tags they depend on.
+"""
+
+from backend import cachetags
+
+
+def results_tag(session_id, term, class_id=None):
+    if class_id is None:
+        return f'results:{session_id}:{term}'
+    return f'results:{session_id}:{term}:class:{class_id}'
+
+
+def class_tag(class_id):
+    return f'class:{class_id}'
+
+
+def pupil_tag(pupil_id):
+    return f'pupil:{pupil_id}'
+
+
+SESSIONS_TAG = 'sessions'
+CLASSES_TAG = 'classes'
+USERS_TAG = 'users'
+
+
+def class_results_tags(session_id, term, class_id):
+    """Every tag a per-class view of a session/term depends on"""
+    return [results_tag(session_id, term), results_tag(session_id, term, class_id), class_tag(class_id)]
+
+
+def pupil_results_tags(pupil_id, class_id, session_id=None, term=None):
+    """Tags for a pupil's own results: one session/term of their class, or all of them"""
+    if session_id is not None and term is not None:
+        return class_results_tags(session_id, term, class_id) + [pupil_tag(pupil_id), SESSIONS_TAG]
+    return [results_tag('*', '*'), results_tag('*', '*', class_id), class_tag(class_id), pupil_tag(pupil_id), SESSIONS_TAG]
+
+
+def scoped_results_tags(request):
+    """
+    Tags for a results/summaries response as seen by the caller: every
+    class for admins, the teacher's classes, or the pupil's own class (one
+    session/term when ``?session=&term=`` narrow it). ``None`` for a pupil
+    without a class, whose rows no class-level write would invalidate.
+    """
+    from accounts.models import PupilProfile
+    from backend import refdata
+
+    user = request.user
+    if user.role == 'pupil':
+        class_id = (
+            PupilProfile.objects.filter(user_id=user.id).values_list('pupil_class_id', flat=True).order_by().first()
+        )
+        if class_id is None:
+            return None
+        try:
+            session_id = int(request.query_params['session'])
+        except (KeyError, TypeError, ValueError):
+            session_id = None
+        return pupil_results_tags(user.id, class_id, session_id, request.query_params.get('term') or None) + [USERS_TAG]
+
+    if user.role == 'teacher':
+        class_ids = refdata.get_teacher_class_ids(user.id)
+    else:
+        class_ids = refdata.get_class_ids()
+    return [
+        results_tag('*', '*'), SESSIONS_TAG, USERS_TAG,
+        *[results_tag('*', '*', class_id) for class_id in class_ids],
+        *[class_tag(class_id) for class_id in class_ids],
+    ]
+
+
+def invalidate_results(session_id, term, class_ids=None, pupil_ids=()):
+    """
+    Invalidate cached data for the given classes, or the whole session/term
+    when None. ``pupil_ids`` adds those pupils' own tags and their current
+    classes, which readers are scoped by and which differ from the subject's
+    class once a pupil has been promoted or moved.
+    """
+    pupil_ids = {pupil_id for pupil_id in pupil_ids if pupil_id}
+    if pupil_ids:
+        from accounts.models import PupilProfile
+        cachetags.bump(*[pupil_tag(pupil_id) for pupil_id in pupil_ids])
+        if class_ids is not None:
+            class_ids = [*class_ids, *PupilProfile.objects.filter(user_id__in=pupil_ids).values_list(
+                'pupil_class_id', flat=True
+            ).order_by()]
+    if class_ids is None:
+        cachetags.bump(results_tag(session_id, term), results_tag('*', '*'))
+    else:
+        class_ids = {class_id for class_id in class_ids if class_id}
+        cachetags.bump(
+            *[results_tag(session_id, term, class_id) for class_id in class_ids],
+            *[results_tag('*', '*', class_id) for class_id in class_ids],
+        )
+
+
+def invalidate_class(*class_ids):
+    cachetags.bump(CLASSES_TAG, *[class_tag(class_id) for class_id in set(class_ids) if class_id])
+
+
+def invalidate_sessions():
+    cachetags.bump(SESSIONS_TAG)
+
+
+def invalidate_users():
+    cachetags.bump(USERS_TAG)
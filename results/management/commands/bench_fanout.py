@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from backend.consumers import RecentSeqs, UpdateConsumer
+from backend.topics import role_topic
+
+TOPIC = role_topic('pupil')
+
+
+class BenchClient(UpdateConsumer):
+    """An UpdateConsumer whose socket takes ``send_ms`` per frame (or, when slow, never completes a send)"""
+
+    def __init__(self, publish_times, send_ms=0.0, slow=False):
+        super().__init__()
+        self.publish_times = publish_times
+        self.send_delay = send_ms / 1000
+        self.slow = slow
+        self.received = 0
+        self.latencies = []
+        self.channel_layer = None
+        self.session_id = None
+
+    async def base_send(self, message):
+        if self.slow:
+            await asyncio.Event().wait()
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.latencies.append(time.perf_counter() - self.publish_times[self.received])
+        self.received += 1
+
+    async def open(self, queue_size):
+        self.topics = set()
+        self.dropped = False
+        self.last_seq = 0
+        self.sent_seqs = RecentSeqs()
+        self.outgoing = asyncio.Queue(maxsize=queue_size)
+        await self.update_topics({TOPIC})
+        self.writer = asyncio.ensure_future(self._write())
+        UpdateConsumer.connected_clients.add(self)
+
+    async def close(self, code=None):
+        pass
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else 0
+
+
+class Command(BaseCommand):
+    help = 'Benchmark websocket fan-out of updates to N connected clients: sequential per-client sends vs queued fan-out.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=10, help='Updates published to every client')
+        parser.add_argument('--send-ms', type=float, default=1.0, help='Time a socket takes to accept one frame')
+        parser.add_argument('--slow', type=int, default=50, help='Clients whose sends never complete')
+        parser.add_argument('--queue-size', type=int, default=100, help='Per-connection send queue')
+        parser.add_argument('--send-timeout', type=float, default=1.0, help='Seconds before a stalled client is dropped')
+
+    def handle(self, *args, **options):
+        with override_settings(
+            REALTIME_SEND_QUEUE_SIZE=options['queue_size'],
+            REALTIME_SEND_TIMEOUT_SECONDS=options['send_timeout'],
+        ):
+            asyncio.run(self.run(options))
+
+    def message(self, i):
+        return {'type': 'summary_update', 'payload': {
+            'action': 'calculate', 'pupil_id': i, 'session_id': 1, 'term': 'first', 'summary_id': i,
+        }}
+
+    async def run(self, options):
+        clients, messages, slow = options['clients'], options['messages'], options['slow']
+        fast = clients - slow
+        self.stdout.write(f'Fan-out of {messages} updates to {clients} clients ({slow} slow)...')
+
+        # Previous path: encode per client, await each send in turn. A slow client
+        # would stall it for good, so it only gets the fast ones, for one update
+        publish_times = [time.perf_counter()]
+        legacy = [BenchClient(publish_times, options['send_ms']) for _ in range(fast)]
+        for client in legacy:
+            await client.send(text_data=json.dumps(self.message(0)))
+        sequential = (time.perf_counter() - publish_times[0]) * messages
+        self.stdout.write(
+            f'Sequential:  {sequential:.3f}s for {messages} updates (one timed, x{messages}; '
+            f'{fast * messages / sequential:,.0f} sends/s), {fast * messages} encodes, blocks on any slow client'
+        )
+
+        publish_times = []
+        queued = [BenchClient(publish_times, options['send_ms'], slow=i < slow) for i in range(clients)]
+        for client in queued:
+            await client.open(options['queue_size'])
+
+        started = time.perf_counter()
+        publishing = 0.0
+        for i in range(messages):
+            publish_times.append(time.perf_counter())
+            message = self.message(i)
+            UpdateConsumer.broadcast_to_topics([TOPIC], json.dumps(message), message['type'], i + 1)
+            publishing += time.perf_counter() - publish_times[-1]
+            await asyncio.sleep(0)
+        deadline = time.perf_counter() + options['send_timeout'] + 30
+        while sum(client.received for client in queued) < fast * messages and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        delivered = time.perf_counter() - started
+        # Let stalled sends time out
+        await asyncio.sleep(options['send_timeout'] if slow else 0)
+
+        latencies = sorted(latency for client in queued for latency in client.latencies)
+        dropped = sum(client.dropped for client in queued)
+        self.stdout.write(
+            f'Queued:      {delivered:.3f}s ({len(latencies) / delivered:,.0f} sends/s), {messages} encodes, '
+            f'publish {publishing / messages * 1000:.2f} ms/update, '
+            f'latency p50 {percentile(latencies, 0.5):.1f} / p95 {percentile(latencies, 0.95):.1f} / '
+            f'max {percentile(latencies, 1):.1f} ms, {dropped} clients dropped'
+        )
+
+        for client in queued:
+            client.writer.cancel()
+            UpdateConsumer.connected_clients.discard(client)
+            await client.update_topics(set())
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {sequential / delivered:.2f}x'))
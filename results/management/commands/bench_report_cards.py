@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from results.models import AcademicSession, ResultSummary
+from results.report_cards import iter_report_card_contexts, render_report_cards, stream_report_cards_zip
+from results.utils import generate_result_pdf
+
+
+class Command(BaseCommand):
+    help = 'Benchmark report-card generation: per-request path vs batch export (pupils/second).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', help='Session id or name (defaults to the active session)')
+        parser.add_argument('--term', help="Term (defaults to the session's current term)")
+        parser.add_argument('--class', dest='class_id', type=int, help='Only pupils in this class id')
+        parser.add_argument('--level', help='Only pupils in classes of this level')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes for the batch path (defaults to REPORT_CARD_WORKERS)')
+
+    def handle(self, *args, **options):
+        session_ref = options['session']
+        if session_ref:
+            lookup = {'id': session_ref} if session_ref.isdigit() else {'name': session_ref}
+            session = AcademicSession.objects.filter(**lookup).first()
+        else:
+            session = AcademicSession.objects.filter(is_active=True).first()
+        if not session:
+            raise CommandError('Session not found')
+        term = options['term'] or session.current_term
+
+        summaries = ResultSummary.objects.filter(session=session, term=term)
+        if options['class_id']:
+            summaries = summaries.filter(pupil__pupil_profile__pupil_class_id=options['class_id'])
+        if options['level']:
+            summaries = summaries.filter(pupil__pupil_profile__pupil_class__level=options['level'])
+        count = summaries.count()
+        if not count:
+            raise CommandError('No result summaries found')
+
+        self.stdout.write(f'Rendering {count} report cards for {session.name} ({term})...')
+
+        started = time.perf_counter()
+        for summary in summaries.select_related('pupil', 'session'):
+            generate_result_pdf(summary)
+        single = time.perf_counter() - started
+        self.stdout.write(f'Per-request path: {single:.2f}s ({count / single:.1f} pupils/s)')
+
+        started = time.perf_counter()
+        size = 0
+        for chunk in stream_report_cards_zip(
+            render_report_cards(iter_report_card_contexts(summaries), workers=options['workers'])
+        ):
+            size += len(chunk)
+        batch = time.perf_counter() - started
+        self.stdout.write(f'Batch ZIP export:  {batch:.2f}s ({count / batch:.1f} pupils/s, {size / 1024:.0f} KiB)')
+
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {single / batch:.2f}x'))
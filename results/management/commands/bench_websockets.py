@@ -0,0 +1,303 @@
+"""
+Load test for ``/ws/updates/``: how many sockets one worker holds, and how
+update latency grows with them.
+
+Runs offline and in-process: N virtual admins, teachers and pupils
+(spread over ``--classes`` classes) connect through the Channels stack
+with ``WebsocketCommunicator`` on ``InMemoryChannelLayer``, then a mix of
+score, summary, subject, session and grading updates is fired at
+``--rate`` in bursts of ``--burst`` (one request's worth), through the
+realtime outbox, event log, topics and per-connection send queues.
+
+Users are not loaded from the database: the JWT middleware and the
+``topics_for_user`` lookup are replaced by a fixed population, and events
+enter the outbox where ``broadcast_update`` hands them over after commit.
+Memory per connection includes the test client's side of each socket.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+import tracemalloc
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from channels.middleware import BaseMiddleware
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import path
+
+from backend import consumers, topics
+from backend.consumers import SLOW_CLIENT_CLOSE_CODE, UpdateConsumer
+from backend.outbox import outbox
+from results.management.commands.bench_fanout import percentile
+
+SESSION_ID = 1
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+# (event type, share of updates): mostly score entry and the summaries it recalculates
+EVENT_MIX = (
+    ('score_update', 0.5),
+    ('summary_update', 0.3),
+    ('subject_update', 0.1),
+    ('results_locked', 0.05),
+    ('grades_update', 0.05),
+)
+
+
+class LoadTestConsumer(UpdateConsumer):
+    """UpdateConsumer subscribed to the virtual user's topics instead of looking them up"""
+
+    async def resubscribe(self):
+        await self.update_topics(set(self.scope['load_topics']))
+
+
+class PopulationMiddleware(BaseMiddleware):
+    """Authenticates ``?user=<index>`` as that member of the virtual population"""
+
+    def __init__(self, inner, population):
+        super().__init__(inner)
+        self.population = population
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        user, user_topics = self.population[int(query['user'][0])]
+        scope = dict(scope, user=user, load_topics=user_topics)
+        return await super().__call__(scope, receive, send)
+
+
+class LoadClient:
+    """One websocket client: which updates reached it, and how long they took"""
+
+    def __init__(self, index, communicator, sent_at):
+        self.index = index
+        self.communicator = communicator
+        self.sent_at = sent_at
+        self.received = set()
+        self.latencies = []
+        self.frames = 0
+        self.resyncs = 0
+        self.close_code = None
+
+    async def read(self):
+        while True:
+            output = await self.communicator.receive_output(timeout=None)
+            if output['type'] == 'websocket.close':
+                self.close_code = output.get('code')
+                return
+            arrived = time.perf_counter()
+            message = json.loads(output['text'])
+            self.frames += 1
+            if message['type'] == 'resync':
+                self.resyncs += 1
+                continue
+            payload = message['payload']
+            # A coalesced summary message stands for every summary it lists
+            numbers = [payload['n']] if 'n' in payload else payload.get('summary_ids', [])
+            self.received.update(numbers)
+            if numbers:
+                self.latencies.append(arrived - min(self.sent_at[n] for n in numbers))
+
+
+def build_population(clients, classes, admins):
+    """``[(user, topics)]``: ``admins`` admins, a teacher per class, the rest pupils spread over the classes"""
+    User = get_user_model()
+    population = []
+    for index in range(clients):
+        user_id = index + 1
+        class_id = index % classes + 1
+        if index < admins:
+            user, user_topics = User(id=user_id, role='admin'), {topics.role_topic('admin')}
+        elif index < admins + classes:
+            user = User(id=user_id, role='teacher')
+            user_topics = {
+                topics.role_topic('teacher'), topics.session_topic(SESSION_ID),
+                topics.class_topic(class_id, 'teacher'),
+            }
+        else:
+            user = User(id=user_id, role='pupil')
+            user_topics = {
+                topics.role_topic('pupil'), topics.session_topic(SESSION_ID),
+                topics.pupil_topic(user_id), topics.class_topic(class_id, 'pupil'),
+            }
+        user.class_id = class_id
+        population.append((user, user_topics))
+    return population
+
+
+def make_event(n, event_type, pupil):
+    """A realistic ``(event_type, payload, topics)`` numbered ``n`` (and ``summary_id``, which survives coalescing)"""
+    if event_type == 'score_update':
+        return event_type, {'action': 'update', 'result_id': n, 'n': n}, topics.pupil_audience(pupil.id, pupil.class_id)
+    if event_type == 'summary_update':
+        return event_type, {
+            'action': 'calculate', 'pupil_id': pupil.id, 'session_id': SESSION_ID, 'term': 'first', 'summary_id': n, 'n': n,
+        }, topics.pupil_audience(pupil.id, pupil.class_id)
+    if event_type == 'subject_update':
+        return event_type, {'action': 'update', 'subject_id': n, 'n': n}, topics.class_audience(pupil.class_id)
+    if event_type == 'results_locked':
+        return event_type, {
+            'action': 'lock', 'session_id': SESSION_ID, 'term': 'first', 'n': n,
+            'message': 'Results for 2025/2026 have been locked by admin.',
+        }, topics.session_audience(SESSION_ID)
+    return event_type, {'action': 'regrade', 'levels': ['primary'], 'n': n}, topics.everyone()
+
+
+class Command(BaseCommand):
+    help = ('Load-test /ws/updates/ in-process on InMemoryChannelLayer: connect rate, delivery latency, '
+            'memory per connection and dropped updates for N websocket clients.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--classes', type=int, default=40, help='Classes the pupils are spread over (a teacher each)')
+        parser.add_argument('--admins', type=int, default=5)
+        parser.add_argument('--events', type=int, default=1000, help='Updates to fire')
+        parser.add_argument('--rate', type=float, default=100, help='Updates per second')
+        parser.add_argument('--burst', type=int, default=20, help='Updates fired together, like one bulk upload')
+        parser.add_argument('--concurrency', type=int, default=200, help='Connections opened at once')
+        parser.add_argument('--connect-timeout', type=float, default=30)
+        parser.add_argument('--drain', type=float, default=30, help='Seconds to wait for deliveries after the last update')
+        parser.add_argument('--window-ms', type=int, help='Outbox window (defaults to REALTIME_OUTBOX_WINDOW_MS)')
+        parser.add_argument('--queue-size', type=int, help='Per-connection send queue (defaults to REALTIME_SEND_QUEUE_SIZE)')
+        parser.add_argument('--send-timeout', type=float,
+                            help='Seconds before a stalled client is dropped (defaults to REALTIME_SEND_TIMEOUT_SECONDS)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['clients'] < options['admins'] + options['classes'] + 1:
+            raise CommandError('--clients must cover the admins, one teacher per class and at least one pupil')
+        overrides = {
+            'CHANNEL_LAYERS': IN_MEMORY_LAYER,
+            'REALTIME_OUTBOX': True,
+            'REALTIME_EVENT_LOG_PERSIST': False,
+        }
+        for option, setting in (
+            ('window_ms', 'REALTIME_OUTBOX_WINDOW_MS'),
+            ('queue_size', 'REALTIME_SEND_QUEUE_SIZE'),
+            ('send_timeout', 'REALTIME_SEND_TIMEOUT_SECONDS'),
+        ):
+            if options[option] is not None:
+                overrides[setting] = options[option]
+        # The consumer prints a line per connection
+        with override_settings(**overrides), contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(self.run(options))
+
+    async def run(self, options):
+        population = build_population(options['clients'], options['classes'], options['admins'])
+        application = PopulationMiddleware(
+            URLRouter([path('ws/updates/', LoadTestConsumer.as_asgi())]), population
+        )
+        sent_at = {}
+        before = consumers.stats()
+        self.stdout.write(
+            f"Connecting {options['clients']} clients ({options['admins']} admins, {options['classes']} teachers, "
+            f"{options['clients'] - options['admins'] - options['classes']} pupils)..."
+        )
+
+        clients, connected, connect_time, per_connection = await self.connect(application, population, sent_at, options)
+        self.stdout.write(
+            f'Connect:   {connected}/{len(clients)} in {connect_time:.2f}s ({connected / connect_time:,.0f}/s), '
+            f'{per_connection / 1024:.1f} KiB per connection'
+        )
+        clients = [client for client in clients if client is not None]
+        readers = [asyncio.ensure_future(client.read()) for client in clients]
+
+        outbox.ensure_started()
+        started = time.perf_counter()
+        expected, firing = await self.fire(population, clients, sent_at, options)
+        wanted = sum(len(numbers) for numbers in expected.values())
+        deadline = time.perf_counter() + options['drain']
+        while time.perf_counter() < deadline and sum(len(client.received) for client in clients) < wanted:
+            await asyncio.sleep(0.05)
+        self.report(clients, expected, firing, time.perf_counter() - started, before, options)
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*(client.communicator.disconnect() for client in clients), return_exceptions=True)
+
+    async def connect(self, application, population, sent_at, options):
+        """Open every connection, ``--concurrency`` at a time, tracing the memory they hold"""
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        clients = []
+        started = time.perf_counter()
+        for start in range(0, len(population), options['concurrency']):
+            chunk = [
+                LoadClient(index, WebsocketCommunicator(application, f'/ws/updates/?user={index}'), sent_at)
+                for index in range(start, min(start + options['concurrency'], len(population)))
+            ]
+            results = await asyncio.gather(
+                *(client.communicator.connect(timeout=options['connect_timeout']) for client in chunk),
+                return_exceptions=True,
+            )
+            clients += [
+                client if result is not None and not isinstance(result, BaseException) and result[0] else None
+                for client, result in zip(chunk, results)
+            ]
+        connect_time = time.perf_counter() - started
+        held = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        connected = sum(client is not None for client in clients)
+        return clients, connected, connect_time, held / max(connected, 1)
+
+    async def fire(self, population, clients, sent_at, options):
+        """Fire the event mix; returns ``({client index: expected update numbers}, seconds spent firing)``"""
+        rng = random.Random(options['seed'])
+        pupils = [user for user, _ in population if user.role == 'pupil']
+        event_types, weights = zip(*EVENT_MIX)
+        subscribers = {}
+        for client in clients:
+            for topic in population[client.index][1]:
+                subscribers.setdefault(topic, []).append(client.index)
+
+        expected = {client.index: set() for client in clients}
+        events = []
+        for n in range(options['events']):
+            event = make_event(n, rng.choices(event_types, weights)[0], rng.choice(pupils))
+            events.append(event)
+            for index in {index for topic in event[2] for index in subscribers.get(topic, ())}:
+                expected[index].add(n)
+
+        def burst(first, chunk):
+            # What a request thread does after its transaction commits
+            for n, (event_type, payload, event_topics) in enumerate(chunk, first):
+                sent_at[n] = time.perf_counter()
+                outbox.enqueue(event_type, payload, tuple(event_topics))
+
+        started = time.perf_counter()
+        for first in range(0, len(events), options['burst']):
+            await sync_to_async(burst)(first, events[first:first + options['burst']])
+            delay = started + (first + options['burst']) / options['rate'] - time.perf_counter()
+            await asyncio.sleep(max(delay, 0))
+        return expected, time.perf_counter() - started
+
+    def report(self, clients, expected, firing, elapsed, before, options):
+        latencies = sorted(latency for client in clients for latency in client.latencies)
+        wanted = sum(len(numbers) for numbers in expected.values())
+        missed = sum(len(expected[client.index] - client.received) for client in clients)
+        frames = sum(client.frames for client in clients)
+        after = consumers.stats()
+        dropped_clients = sum(client.close_code == SLOW_CLIENT_CLOSE_CODE for client in clients)
+        outbox_stats = outbox.stats()
+
+        self.stdout.write(
+            f"Fire:      {options['events']} updates in {firing:.2f}s ({options['events'] / firing:,.0f}/s), "
+            f"{outbox_stats['messages']} messages after coalescing in {outbox_stats['batches']} batches"
+        )
+        self.stdout.write(
+            f'Delivery:  {wanted - missed}/{wanted} updates in {frames} frames ({frames / elapsed:,.0f}/s), '
+            f'latency p50 {percentile(latencies, 0.5):.1f} / p95 {percentile(latencies, 0.95):.1f} / '
+            f'p99 {percentile(latencies, 0.99):.1f} / max {percentile(latencies, 1):.1f} ms'
+        )
+        summary = (
+            f'Dropped:   {missed} updates, {dropped_clients} slow clients disconnected '
+            f"({after['queue_full'] - before['queue_full']} full queues, "
+            f"{after['send_timeouts'] - before['send_timeouts']} send timeouts), "
+            f'{sum(client.resyncs for client in clients)} resyncs'
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if not missed else self.style.WARNING(summary))
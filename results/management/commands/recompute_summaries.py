@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from results.models import AcademicSession, Result
+from results.services import recompute_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute result summaries for a session/term, optionally limited to a class or class level.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', help='Session id or name (defaults to the active session)')
+        parser.add_argument('--term', choices=[term for term, _ in Result.TERM_CHOICES],
+                            help="Term to recompute (defaults to the session's current term)")
+        parser.add_argument('--class', dest='class_id', type=int, help='Only pupils in this class id')
+        parser.add_argument('--level', help='Only pupils in classes of this level, e.g. "GRADE 1"')
+
+    def handle(self, *args, **options):
+        session_ref = options['session']
+        if session_ref:
+            lookup = {'id': session_ref} if session_ref.isdigit() else {'name': session_ref}
+            session = AcademicSession.objects.filter(**lookup).first()
+        else:
+            session = AcademicSession.objects.filter(is_active=True).first()
+        if not session:
+            raise CommandError('Session not found')
+
+        term = options['term'] or session.current_term
+        report = recompute_summaries(session, term, class_id=options['class_id'], level=options['level'])
+
+        self.stdout.write(
+            f"Session {session.name}, term {term}: {report['results']} results across "
+            f"{report['pupils']} pupils"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']} and updated {report['updated']} summaries "
+            f"in {report['elapsed_ms']} ms."
+        ))
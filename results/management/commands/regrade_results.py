@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from results.grading import regrade
+from results.models import AcademicSession
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored grades (results, summaries, annual results) from the configured grading scales.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', help='Session id or name (defaults to every session)')
+        parser.add_argument('--level', action='append', dest='levels',
+                            help='Only classes of this level; may be repeated')
+
+    def handle(self, *args, **options):
+        session = None
+        session_ref = options['session']
+        if session_ref:
+            lookup = {'id': session_ref} if session_ref.isdigit() else {'name': session_ref}
+            session = AcademicSession.objects.filter(**lookup).first()
+            if not session:
+                raise CommandError('Session not found')
+
+        levels = set(options['levels']) if options['levels'] else None
+        report = regrade(session=session, levels=levels)
+        for model, count in report['updated'].items():
+            self.stdout.write(f'{model}: {count} grades changed')
+        self.stdout.write(self.style.SUCCESS(f"Regrade finished in {report['elapsed_ms']} ms."))
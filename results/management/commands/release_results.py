@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from results.release import release_due_sessions
+
+
+class Command(BaseCommand):
+    help = ('Release results for sessions whose release date has passed. '
+            'Fallback for the in-process scheduler; run from cron or with --watch.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true',
+                            help='Keep running, checking every RESULT_RELEASE_POLL_SECONDS')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_due_sessions()
+            for session in released:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Released results for {session.name} ({session.current_term} term)'
+                ))
+            if not options['watch']:
+                if not released:
+                    self.stdout.write('No sessions due for release.')
+                return
+            time.sleep(settings.RESULT_RELEASE_POLL_SECONDS)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0008_add_teacher_upload_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Position among pupils taking this subject for the term (ties share a position)', null=True),
+        ),
+        migrations.AddField(
+            model_name='resultsummary',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Position in class by average score for the term (ties share a position)', null=True),
+        ),
+    ]
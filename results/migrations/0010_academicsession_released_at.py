@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def mark_past_releases_done(apps, schema_editor):
+    # Release dates already past were handled before the scheduler existed;
+    # without this its first tick would re-release (and announce) every old session
+    AcademicSession = apps.get_model('results', 'AcademicSession')
+    AcademicSession.objects.filter(
+        result_release_date__isnull=False, result_release_date__lte=timezone.now()
+    ).update(released_at=F('result_release_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0009_result_position_resultsummary_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='academicsession',
+            name='released_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the scheduled release for result_release_date was carried out', null=True),
+        ),
+        migrations.RunPython(mark_past_releases_done, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0007_update_class_levels'),
+        ('results', '0010_academicsession_released_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnualResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_term', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('second_term', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('third_term', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('terms_count', models.PositiveSmallIntegerField(default=0)),
+                ('annual_total', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('annual_average', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('grade', models.CharField(choices=[('A', 'A (Excellent)'), ('B', 'B (Very Good)'), ('C', 'C (Good)'), ('D', 'D (Pass)'), ('F', 'F (Fail)')], max_length=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pupil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='annual_results', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='annual_results', to='results.academicsession')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='annual_results', to='classes.subject')),
+            ],
+            options={
+                'ordering': ['subject__name'],
+                'indexes': [models.Index(fields=['pupil', 'session'], name='annual_result_pupil_sess_idx')],
+                'unique_together': {('pupil', 'subject', 'session')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AnnualSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_subjects', models.IntegerField(default=0)),
+                ('total_score', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('average_score', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('overall_grade', models.CharField(choices=[('A', 'A (Excellent)'), ('B', 'B (Very Good)'), ('C', 'C (Good)'), ('D', 'D (Pass)'), ('F', 'F (Fail)')], max_length=1)),
+                ('position', models.PositiveIntegerField(blank=True, editable=False, help_text='Position in class by annual average (ties share a position)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pupil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='annual_summaries', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='annual_summaries', to='results.academicsession')),
+            ],
+            options={
+                'verbose_name_plural': 'Annual Summaries',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['session'], name='annual_summary_sess_idx')],
+                'unique_together': {('pupil', 'session')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0011_annualresult_annualsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingScale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('level', models.CharField(blank=True, help_text='Class level this scale applies to; leave empty for the default scale', max_length=20, null=True, unique=True)),
+                ('a_min', models.DecimalField(decimal_places=2, default=70, max_digits=5)),
+                ('b_min', models.DecimalField(decimal_places=2, default=60, max_digits=5)),
+                ('c_min', models.DecimalField(decimal_places=2, default=50, max_digits=5)),
+                ('d_min', models.DecimalField(decimal_places=2, default=45, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['level'],
+            },
+        ),
+    ]
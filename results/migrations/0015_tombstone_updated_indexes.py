@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:23
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0008_updated_indexes'),
+        ('results', '0014_realtimeevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('results', 'Result'), ('summaries', 'Result summary'), ('classes', 'Class'), ('subjects', 'Subject'), ('sessions', 'Academic session')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('class_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('pupil_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='academicsession',
+            index=models.Index(fields=['updated_at', 'id'], name='session_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['updated_at', 'id'], name='result_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resultsummary',
+            index=models.Index(fields=['updated_at', 'id'], name='summary_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ),
+    ]
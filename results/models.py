@@ -1,6 +1,92 @@
-from django.db import models
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# Minimum score (inclusive) for each letter grade, highest first. Used
+# when no GradingScale has been configured.
+GRADE_BOUNDARIES = (
+    (70, 'A'),
+    (60, 'B'),
+    (50, 'C'),
+    (45, 'D'),
+)
+
+
+def grade_for_score(score, boundaries=None):
+    """Return the letter grade for a total or average score"""
+    for minimum, grade in boundaries or GRADE_BOUNDARIES:
+        if score >= minimum:
+            return grade
+    return 'F'
+
+
+TWO_PLACES = Decimal('0.01')
+
+
+def stored_average(total, count):
+    """
+    An average as stored (two places, half up). Every path grades this
+    value, so an average like 69.995 gets the same grade however it was written.
+    """
+    if not count:
+        return Decimal('0')
+    return (Decimal(total) / count).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def grade_expression(score, boundaries=None):
+    """Database-side equivalent of grade_for_score for use in UPDATE/annotate"""
+    return Case(
+        *[
+            When(GreaterThanOrEqual(score, Value(float(minimum))), then=Value(grade))
+            for minimum, grade in boundaries or GRADE_BOUNDARIES
+        ],
+        default=Value('F'),
+        output_field=models.CharField(max_length=1),
+    )
+
+
+def boundaries_for_class(class_id):
+    """Grade boundaries that apply to a class (its level's scale, else the default scale)"""
+    from backend import refdata
+    return refdata.get_grade_boundaries(refdata.get_class_level(class_id))
+
+
+class GradingScale(models.Model):
+    """
+    Grade cut-offs, for one class level or (with no level) the school default.
+    Scores at or above a minimum get that grade; anything below D is F.
+    """
+    name = models.CharField(max_length=50)
+    level = models.CharField(
+        max_length=20,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Class level this scale applies to; leave empty for the default scale"
+    )
+    a_min = models.DecimalField(max_digits=5, decimal_places=2, default=70)
+    b_min = models.DecimalField(max_digits=5, decimal_places=2, default=60)
+    c_min = models.DecimalField(max_digits=5, decimal_places=2, default=50)
+    d_min = models.DecimalField(max_digits=5, decimal_places=2, default=45)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def boundaries(self):
+        return ((self.a_min, 'A'), (self.b_min, 'B'), (self.c_min, 'C'), (self.d_min, 'D'))
+
+    def __str__(self):
+        return f"{self.name} ({self.level or 'default'})"
+
+    class Meta:
+        ordering = ['level']
 
 
 class AcademicSession(models.Model):
@@ -36,13 +122,33 @@ class AcademicSession(models.Model):
         default=True,
         help_text="If false, teachers cannot upload/edit results for this session"
     )
+    released_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="When the scheduled release for result_release_date was carried out"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
+
+    def results_hidden(self, now=None):
+        """True while pupils must not see this session's results yet"""
+        if self.results_unlocked or not self.result_release_date:
+            return False
+        if self.released_at and self.released_at >= self.result_release_date:
+            # The scheduled release for the current date has been carried out
+            return False
+        return (now or timezone.now()) < self.result_release_date
     
     class Meta:
         ordering = ['-start_date']
+        indexes = [
+            # Watermark for GET /api/changes/
+            models.Index(fields=['updated_at', 'id'], name='session_updated_idx'),
+        ]
 
 
 class Result(models.Model):
@@ -95,6 +201,12 @@ class Result(models.Model):
     total = models.DecimalField(max_digits=5, decimal_places=2, editable=False)
     grade = models.CharField(max_length=1, choices=GRADE_CHOICES, editable=False)
     teacher_comment = models.TextField(blank=True, null=True)
+    position = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Position among pupils taking this subject for the term (ties share a position)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -102,17 +214,9 @@ class Result(models.Model):
         # Calculate total
         self.total = self.test_score + self.exam_score
         
-        # Calculate grade
-        if self.total >= 70:
-            self.grade = 'A'
-        elif self.total >= 60:
-            self.grade = 'B'
-        elif self.total >= 50:
-            self.grade = 'C'
-        elif self.total >= 45:
-            self.grade = 'D'
-        else:
-            self.grade = 'F'
+        # Calculate grade on the scale for the subject's class
+        from backend import refdata
+        self.grade = grade_for_score(self.total, boundaries_for_class(refdata.get_subject_class_id(self.subject_id)))
         
         super().save(*args, **kwargs)
     
@@ -127,6 +231,7 @@ class Result(models.Model):
             models.Index(fields=['session', 'term'], name='result_sess_term_idx'),
             models.Index(fields=['subject'], name='result_subject_idx'),
             models.Index(fields=['-created_at'], name='result_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='result_updated_idx'),
         ]
 
 
@@ -149,42 +254,89 @@ class ResultSummary(models.Model):
     total_score = models.DecimalField(max_digits=7, decimal_places=2, default=0)
     average_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     overall_grade = models.CharField(max_length=1, choices=Result.GRADE_CHOICES)
+    position = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Position in class by average score for the term (ties share a position)"
+    )
     principal_comment = models.TextField(blank=True, null=True)
     teacher_comment = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def calculate_summary(self):
-        """Calculate and update summary from results"""
-        results = Result.objects.filter(
+        """
+        Fully recalculate and save the summary from results.
+
+        Normal writes keep summaries current through apply_delta; this full
+        recompute is kept as the verification/repair path and logs when the
+        incrementally maintained values had drifted.
+        """
+        totals = Result.objects.filter(
             pupil=self.pupil,
             session=self.session,
             term=self.term
+        ).aggregate(subject_count=Count('id'), score_sum=Sum('total'))
+        from accounts.models import PupilProfile
+        boundaries = boundaries_for_class(
+            PupilProfile.objects.filter(user_id=self.pupil_id).values_list('pupil_class_id', flat=True).first()
         )
         
-        self.total_subjects = results.count()
+        previous = (self.total_subjects, self.total_score, self.overall_grade)
+        self.total_subjects = totals['subject_count']
         if self.total_subjects > 0:
-            self.total_score = sum([result.total for result in results])
-            self.average_score = self.total_score / self.total_subjects
-            
-            # Calculate overall grade
-            if self.average_score >= 70:
-                self.overall_grade = 'A'
-            elif self.average_score >= 60:
-                self.overall_grade = 'B'
-            elif self.average_score >= 50:
-                self.overall_grade = 'C'
-            elif self.average_score >= 45:
-                self.overall_grade = 'D'
-            else:
-                self.overall_grade = 'F'
+            self.total_score = totals['score_sum']
+            self.average_score = stored_average(self.total_score, self.total_subjects)
+            self.overall_grade = grade_for_score(self.average_score, boundaries)
         else:
             self.total_score = 0
             self.average_score = 0
             self.overall_grade = 'F'
         
+        if self.pk and previous != (self.total_subjects, self.total_score, self.overall_grade):
+            logger.warning(
+                f"Summary {self.pk} drifted: {previous} -> "
+                f"{(self.total_subjects, self.total_score, self.overall_grade)}"
+            )
+        
         self.save()
     
+    @classmethod
+    def apply_delta(cls, pupil_id, session_id, term, total_delta, subject_delta, boundaries=None):
+        """
+        Apply one result change to a pupil's summary.
+
+        ``total_delta`` is new_total - old_total and ``subject_delta`` is +1
+        for a new result, -1 for a removed one and 0 for an edit. Totals are
+        adjusted from the row's current values in one UPDATE, whose row lock
+        is held until commit, so concurrent edits for one pupil cannot
+        overwrite each other; the average and grade are then derived from
+        the totals read back, like every other path (``stored_average``).
+        ``boundaries`` is the grading scale of the pupil's class (the
+        default scale when omitted).
+        """
+        with transaction.atomic():
+            summary, created = cls.objects.get_or_create(
+                pupil_id=pupil_id,
+                session_id=session_id,
+                term=term,
+                defaults={'overall_grade': 'F'}
+            )
+            rows = cls.objects.filter(pk=summary.pk)
+            rows.update(
+                total_score=F('total_score') + Value(Decimal(total_delta)),
+                total_subjects=F('total_subjects') + Value(subject_delta),
+                updated_at=timezone.now(),
+            )
+            total_score, total_subjects = rows.values_list('total_score', 'total_subjects').get()
+            average = stored_average(total_score, total_subjects)
+            rows.update(
+                average_score=average,
+                overall_grade=grade_for_score(average, boundaries) if total_subjects > 0 else 'F',
+            )
+        return summary
+    
     def __str__(self):
         return f"{self.pupil.full_name} - {self.term} {self.session}"
     
@@ -196,5 +348,133 @@ class ResultSummary(models.Model):
             models.Index(fields=['pupil', 'session', 'term'], name='summary_pupil_sess_term_idx'),
             models.Index(fields=['session', 'term'], name='summary_sess_term_idx'),
             models.Index(fields=['-created_at'], name='summary_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='summary_updated_idx'),
         ]
 
+
+
+class AnnualResult(models.Model):
+    """
+    Cumulative result for one subject across the three terms of a session.
+    Materialized from Result by results.annual; not edited directly.
+    """
+    pupil = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='annual_results'
+    )
+    subject = models.ForeignKey(
+        'classes.Subject',
+        on_delete=models.CASCADE,
+        related_name='annual_results'
+    )
+    session = models.ForeignKey(
+        AcademicSession,
+        on_delete=models.CASCADE,
+        related_name='annual_results'
+    )
+    first_term = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    second_term = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    third_term = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    terms_count = models.PositiveSmallIntegerField(default=0)
+    annual_total = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    annual_average = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    grade = models.CharField(max_length=1, choices=Result.GRADE_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.pupil.full_name} - {self.subject.name} - {self.session}"
+
+    class Meta:
+        ordering = ['subject__name']
+        unique_together = ['pupil', 'subject', 'session']
+        indexes = [
+            models.Index(fields=['pupil', 'session'], name='annual_result_pupil_sess_idx'),
+        ]
+
+
+class AnnualSummary(models.Model):
+    """
+    Overall result for a session: the mean of the pupil's annual subject averages
+    """
+    pupil = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='annual_summaries'
+    )
+    session = models.ForeignKey(
+        AcademicSession,
+        on_delete=models.CASCADE,
+        related_name='annual_summaries'
+    )
+    total_subjects = models.IntegerField(default=0)
+    total_score = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    average_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    overall_grade = models.CharField(max_length=1, choices=Result.GRADE_CHOICES)
+    position = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Position in class by annual average (ties share a position)"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.pupil.full_name} - {self.session} (annual)"
+
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ['pupil', 'session']
+        verbose_name_plural = 'Annual Summaries'
+        indexes = [
+            models.Index(fields=['session'], name='annual_summary_sess_idx'),
+        ]
+
+
+class RealtimeEvent(models.Model):
+    """
+    A published websocket update, kept (when REALTIME_EVENT_LOG_PERSIST is on)
+    so reconnecting clients of any worker can catch up (see backend/eventlog.py)
+    """
+    seq = models.PositiveBigIntegerField(unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    topics = models.JSONField(help_text="Topics the update was published to")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.seq} {self.event_type}"
+
+    class Meta:
+        ordering = ['seq']
+
+
+class Tombstone(models.Model):
+    """
+    A deleted result, summary, class, subject or session, so GET /api/changes/
+    can report deletions (see results/changes.py). ``class_id``/``pupil_id``
+    record who could see the row, for role scoping.
+    """
+    KIND_CHOICES = (
+        ('results', 'Result'),
+        ('summaries', 'Result summary'),
+        ('classes', 'Class'),
+        ('subjects', 'Subject'),
+        ('sessions', 'Academic session'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    class_id = models.PositiveBigIntegerField(null=True, blank=True)
+    pupil_id = models.PositiveBigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} deleted"
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ]
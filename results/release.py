@@ -0,0 +1,150 @@
+"""Scheduled result releases.
+
+When an AcademicSession's ``result_release_date`` passes, the release is
+recorded in ``released_at``, the caches that depend on it are warmed and the same
+``results_released`` event ``unlock_results`` sends is broadcast, so
+clients no longer need to poll.
+
+``release_due_sessions`` does the work and is safe to run from several
+workers at once: each session is claimed with a conditional UPDATE, so
+exactly one caller releases it. It is driven by ``ReleaseScheduler`` (an
+asyncio task started by the ASGI app) and by the ``release_results``
+management command for deployments without a long-running ASGI process.
+"""
+
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from backend import refdata, topics
+from backend.realtime import broadcast_update
+from .invalidation import invalidate_sessions
+from .models import AcademicSession
+
+logger = logging.getLogger(__name__)
+
+
+def broadcast_results_released(session, action='unlock'):
+    """Tell connected clients that a session's results are now visible"""
+    broadcast_update('results_released', {
+        'action': action,
+        'session_id': session.id,
+        'session_name': session.name,
+        'term': session.current_term,
+        'message': f'Results for {session.name} have been released!'
+    }, topics=topics.session_audience(session.id))
+
+
+def _due_sessions(now):
+    # Due: the release date has passed and it has not been released since that date was set
+    return AcademicSession.objects.filter(
+        result_release_date__isnull=False,
+        result_release_date__lte=now,
+    ).filter(
+        Q(released_at__isnull=True) | Q(released_at__lt=F('result_release_date'))
+    )
+
+
+def release_due_sessions(now=None):
+    """
+    Release every session whose release date has passed. Returns the
+    sessions released by this call.
+
+    Visibility itself follows from the date (``results_hidden``), so
+    ``results_unlocked`` stays the admin's override: setting a later date
+    for the next term hides results again until that date.
+    """
+    now = now or timezone.now()
+    released = []
+    for session in _due_sessions(now):
+        claimed = _due_sessions(now).filter(id=session.id).update(
+            released_at=now, updated_at=now
+        )
+        if not claimed:
+            # Another worker got there first
+            continue
+        session.released_at = now
+        session.updated_at = now
+        released.append(session)
+
+    if released:
+        # update() bypasses the post_save signal, so invalidate and warm explicitly
+        refdata.invalidate()
+        invalidate_sessions()
+        refdata.get_active_session()
+        for session in released:
+            logger.info(f"🔓 Results released for {session.name} ({session.current_term} term)")
+            broadcast_results_released(session, action='scheduled')
+    return released
+
+
+def next_release_date():
+    """The earliest pending release date, or None if nothing is scheduled"""
+    return AcademicSession.objects.filter(
+        result_release_date__gt=timezone.now()
+    ).filter(
+        Q(released_at__isnull=True) | Q(released_at__lt=F('result_release_date'))
+    ).order_by('result_release_date').values_list('result_release_date', flat=True).first()
+
+
+class ReleaseScheduler:
+    """
+    Asyncio task that sleeps until the next release date (re-checking at
+    least every ``RESULT_RELEASE_POLL_SECONDS``) and releases due sessions.
+    ``wake()`` makes it re-read the schedule, e.g. after a session is saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+
+    def ensure_started(self):
+        """Start the scheduler on the running event loop (once per process)"""
+        if not getattr(settings, 'RESULT_RELEASE_SCHEDULER', True):
+            return
+        if self._task and not self._task.done():
+            return
+        with self._lock:
+            if self._task and not self._task.done():
+                return
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    def wake(self):
+        """Thread-safe: re-read the schedule now"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop and wakeup and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def _run(self):
+        logger.info("⏰ Result release scheduler started")
+        poll = settings.RESULT_RELEASE_POLL_SECONDS
+        while True:
+            self._wakeup.clear()
+            try:
+                await sync_to_async(release_due_sessions)()
+                upcoming = await sync_to_async(next_release_date)()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Scheduled result release failed: {e}")
+                upcoming = None
+
+            delay = poll
+            if upcoming:
+                delay = min(poll, max((upcoming - timezone.now()).total_seconds(), 0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+scheduler = ReleaseScheduler()
@@ -0,0 +1,328 @@
+"""Report-card generation: batch export and the on-disk PDF cache.
+
+All data is fetched up front in a constant number of queries and turned
+into plain contexts (see ``utils.report_card_context``), so the reportlab
+work can run in a process pool and be streamed back without holding every
+rendered card in memory. A merged, print-ready PDF is streamed from the
+same pool's output: each card's objects are renumbered and written out as
+soon as it is rendered, and only the page tree, bookmarks and xref offsets
+(a few numbers per card) are kept until the end.
+
+Single report cards are cached under ``MEDIA_ROOT/report_cards`` keyed by
+a hash of their rendering context (summary, results, logo) and
+``REPORT_CARD_TEMPLATE_VERSION``, so a repeat download is a stat() and a
+file stream instead of a reportlab run.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, TextStringObject,
+)
+
+from .models import Result
+from .utils import get_logo_path, report_card_context, render_report_card
+
+
+# Bump whenever the report-card layout in utils.py changes so cached PDFs are re-rendered
+REPORT_CARD_TEMPLATE_VERSION = 2
+REPORT_CARD_CACHE_DIR = 'report_cards'
+
+
+def iter_report_card_contexts(summaries):
+    """
+    Yield a report card context for every summary in the queryset.
+
+    Uses three queries regardless of class size: the summaries (with pupil,
+    class and session joined), all of their results (with subjects joined)
+    and the school logo.
+    """
+    summaries = list(
+        summaries.select_related(
+            'pupil', 'session', 'pupil__pupil_profile', 'pupil__pupil_profile__pupil_class'
+        ).order_by('pupil__full_name')
+    )
+    if not summaries:
+        return
+
+    results_by_key = defaultdict(list)
+    results = Result.objects.filter(
+        pupil_id__in=[summary.pupil_id for summary in summaries],
+        session_id__in={summary.session_id for summary in summaries},
+        term__in={summary.term for summary in summaries},
+    ).select_related('subject').order_by('subject__name')
+    for result in results:
+        results_by_key[(result.pupil_id, result.session_id, result.term)].append(result)
+
+    logo_path = get_logo_path()
+    for summary in summaries:
+        key = (summary.pupil_id, summary.session_id, summary.term)
+        yield report_card_context(summary, results=results_by_key[key], logo_path=logo_path)
+
+
+def render_report_cards(contexts, workers=None):
+    """
+    Render contexts to PDFs, yielding ``(context, pdf_bytes)`` in input order.
+
+    With more than one worker the cards are rendered in a process pool. At
+    most ``2 * workers`` cards are in flight at once so memory stays bounded
+    while the caller streams the output.
+    """
+    if workers is None:
+        workers = settings.REPORT_CARD_WORKERS
+    if workers <= 1:
+        for context in contexts:
+            yield context, render_report_card(context)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        pending = deque()
+        for context in contexts:
+            pending.append((context, pool.submit(render_report_card, context)))
+            if len(pending) >= workers * 2:
+                context, future = pending.popleft()
+                yield context, future.result()
+        while pending:
+            context, future = pending.popleft()
+            yield context, future.result()
+
+
+class _ChunkSink:
+    """Write-only file object that collects bytes for a streaming response"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_report_cards_zip(rendered):
+    """Yield a ZIP archive chunk by chunk from ``(context, pdf_bytes)`` pairs"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for context, pdf in rendered:
+            archive.writestr(context['filename'], pdf)
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _PdfStream:
+    """
+    Writes numbered PDF objects to a ``_ChunkSink``, remembering each one's
+    byte offset for the closing xref table
+    """
+
+    # Fixed object numbers for the document structure, written last
+    CATALOG, PAGES, OUTLINES = 1, 2, 3
+
+    def __init__(self):
+        self.sink = _ChunkSink()
+        self.position = 0
+        self.offsets = {}
+        self.next_number = 4
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data):
+        self.sink.write(data)
+        self.position += len(data)
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def write_object(self, number, obj):
+        self.offsets[number] = self.position
+        body = io.BytesIO()
+        obj.write_to_stream(body)
+        self._write(f'{number} 0 obj\n'.encode() + body.getvalue() + b'\nendobj\n')
+
+    def finish(self):
+        size = self.next_number
+        xref = self.position
+        lines = ['xref', f'0 {size}', '0000000000 65535 f ']
+        lines += [f'{self.offsets[number]:010d} 00000 n ' for number in range(1, size)]
+        self._write(('\n'.join(lines) + '\n').encode())
+        self._write(f'trailer\n<< /Size {size} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+
+
+def _ref(number):
+    return IndirectObject(number, 0, None)
+
+
+def _copy_card(pdf, out):
+    """Write one rendered card's pages and everything they use to ``out``; returns the new page numbers"""
+    reader = PdfReader(io.BytesIO(pdf))
+    numbers = {}
+    pending = deque()
+    # Containers already rewritten; pypdf shares inherited ones between pages
+    done = set()
+
+    def renumber(obj):
+        if isinstance(obj, IndirectObject):
+            if obj.idnum not in numbers:
+                numbers[obj.idnum] = out.reserve()
+                pending.append(obj)
+            return _ref(numbers[obj.idnum])
+        if id(obj) in done:
+            return obj
+        done.add(id(obj))
+        if isinstance(obj, DictionaryObject):
+            for key, value in list(obj.items()):
+                obj[key] = renumber(value)
+        elif isinstance(obj, ArrayObject):
+            for index, value in enumerate(obj):
+                obj[index] = renumber(value)
+        return obj
+
+    pages = []
+    for page in reader.pages:
+        number = out.reserve()
+        numbers[page.indirect_reference.idnum] = number
+        pages.append(number)
+        # pypdf has already copied inherited attributes (MediaBox, Resources) onto the page
+        del page['/Parent']
+        renumber(page)
+        page[NameObject('/Parent')] = _ref(_PdfStream.PAGES)
+        out.write_object(number, page)
+    while pending:
+        reference = pending.popleft()
+        out.write_object(numbers[reference.idnum], renumber(reference.get_object()))
+    return pages
+
+
+def stream_merged_report_cards(rendered):
+    """
+    Yield one PDF, bookmarked by pupil, from ``(context, pdf_bytes)`` pairs.
+    Each card is written out (and released) as soon as it arrives, so
+    memory holds one card plus a few numbers per card for the page tree,
+    bookmarks and xref.
+    """
+    out = _PdfStream()
+    pages = []
+    bookmarks = []
+    for context, pdf in rendered:
+        card_pages = _copy_card(pdf, out)
+        pages += card_pages
+        if card_pages:
+            bookmarks.append((context['pupil_name'], card_pages[0]))
+        yield out.sink.drain()
+
+    out.write_object(out.PAGES, DictionaryObject({
+        NameObject('/Type'): NameObject('/Pages'),
+        NameObject('/Kids'): ArrayObject(_ref(number) for number in pages),
+        NameObject('/Count'): NumberObject(len(pages)),
+    }))
+    items = [out.reserve() for _ in bookmarks]
+    for index, (title, page) in enumerate(bookmarks):
+        item = DictionaryObject({
+            NameObject('/Title'): TextStringObject(title),
+            NameObject('/Parent'): _ref(out.OUTLINES),
+            NameObject('/Dest'): ArrayObject([_ref(page), NameObject('/Fit')]),
+        })
+        if index > 0:
+            item[NameObject('/Prev')] = _ref(items[index - 1])
+        if index < len(items) - 1:
+            item[NameObject('/Next')] = _ref(items[index + 1])
+        out.write_object(items[index], item)
+    outlines = DictionaryObject({NameObject('/Type'): NameObject('/Outlines'), NameObject('/Count'): NumberObject(len(items))})
+    if items:
+        outlines[NameObject('/First')] = _ref(items[0])
+        outlines[NameObject('/Last')] = _ref(items[-1])
+    out.write_object(out.OUTLINES, outlines)
+    out.write_object(out.CATALOG, DictionaryObject({
+        NameObject('/Type'): NameObject('/Catalog'),
+        NameObject('/Pages'): _ref(out.PAGES),
+        NameObject('/Outlines'): _ref(out.OUTLINES),
+        NameObject('/PageMode'): NameObject('/UseOutlines'),
+    }))
+    out.finish()
+    yield out.sink.drain()
+
+
+def report_card_cache_key(context):
+    """Content hash of everything that affects a rendered report card"""
+    digest = hashlib.sha256()
+    digest.update(f"v{REPORT_CARD_TEMPLATE_VERSION}".encode())
+    digest.update(json.dumps(context, sort_keys=True, default=str).encode())
+    logo_path = context.get('logo_path')
+    if logo_path:
+        try:
+            stat = os.stat(logo_path)
+            digest.update(f"{stat.st_mtime_ns}:{stat.st_size}".encode())
+        except OSError:
+            pass
+    return digest.hexdigest()[:32]
+
+
+def _summary_cache_dir(summary_id):
+    return os.path.join(settings.MEDIA_ROOT, REPORT_CARD_CACHE_DIR, str(summary_id))
+
+
+def cached_report_card(result_summary):
+    """
+    Return ``(path, key)`` of the rendered PDF for a summary, rendering and
+    storing it only if no file exists for the current content hash. Older
+    renders for the same summary are removed when a new one is written, so
+    read the file through ``open_report_card``.
+    """
+    context = report_card_context(result_summary, logo_path=get_logo_path())
+    key = report_card_cache_key(context)
+    directory = _summary_cache_dir(result_summary.id)
+    path = os.path.join(directory, f"{key}.pdf")
+    if os.path.exists(path):
+        return path, key
+
+    os.makedirs(directory, exist_ok=True)
+    pdf = render_report_card(context)
+    # Write to a temporary file and rename so concurrent readers never see a partial PDF
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(pdf)
+    os.replace(tmp_path, path)
+
+    for name in os.listdir(directory):
+        if name != f"{key}.pdf" and name.endswith('.pdf'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return path, key
+
+
+def open_report_card(result_summary, path):
+    """
+    Open a render returned by ``cached_report_card``. A concurrent request
+    may have replaced (or a delete purged) it since the lookup; the card is
+    then rendered into memory instead of failing with FileNotFoundError.
+    """
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        return io.BytesIO(render_report_card(report_card_context(result_summary, logo_path=get_logo_path())))
+
+
+def purge_report_card_cache(summary_id):
+    """Remove every cached PDF for a summary"""
+    shutil.rmtree(_summary_cache_dir(summary_id), ignore_errors=True)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Result, AcademicSession, ResultSummary
+from .models import Result, AcademicSession, ResultSummary, AnnualResult, AnnualSummary, GradingScale
 
 
 class AcademicSessionSerializer(serializers.ModelSerializer):
@@ -10,8 +10,8 @@ class AcademicSessionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = AcademicSession
-        fields = ['id', 'name', 'start_date', 'end_date', 'is_active', 'result_release_date', 'results_unlocked', 'current_term', 'teacher_upload_enabled', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'name', 'start_date', 'end_date', 'is_active', 'result_release_date', 'results_unlocked', 'current_term', 'teacher_upload_enabled', 'released_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
     
     # Removed get_current_term; now returns actual value
 
@@ -29,8 +29,8 @@ class ResultSerializer(serializers.ModelSerializer):
         model = Result
         fields = ['id', 'pupil', 'pupil_name', 'pupil_class', 'subject', 'subject_name', 
                   'session', 'session_name', 'term', 'test_score', 'exam_score', 'total', 
-                  'grade', 'teacher_comment', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'total', 'grade', 'created_at', 'updated_at']
+                  'grade', 'position', 'teacher_comment', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'total', 'grade', 'position', 'created_at', 'updated_at']
     
     def get_pupil_class(self, obj):
         try:
@@ -127,9 +127,9 @@ class ResultSummarySerializer(serializers.ModelSerializer):
         model = ResultSummary
         fields = ['id', 'pupil', 'pupil_name', 'pupil_class', 'session', 'session_name', 
                   'term', 'total_subjects', 'total_score', 'average_score', 'overall_grade', 
-                  'principal_comment', 'teacher_comment', 'results', 'created_at', 'updated_at']
+                  'position', 'principal_comment', 'teacher_comment', 'results', 'created_at', 'updated_at']
         read_only_fields = ['id', 'total_subjects', 'total_score', 'average_score', 
-                           'overall_grade', 'created_at', 'updated_at']
+                           'overall_grade', 'position', 'created_at', 'updated_at']
     
     def get_pupil_class(self, obj):
         try:
@@ -170,3 +170,95 @@ class BulkResultCreateSerializer(serializers.Serializer):
     results = serializers.ListField(
         child=serializers.DictField()
     )
+
+
+class ResultImportSerializer(serializers.Serializer):
+    """
+    Serializer for CSV score imports
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from classes.models import Subject
+        self.fields['subject'] = serializers.PrimaryKeyRelatedField(
+            queryset=Subject.objects.all(), required=False, allow_null=True
+        )
+
+    file = serializers.FileField()
+    session = serializers.PrimaryKeyRelatedField(queryset=AcademicSession.objects.all())
+    term = serializers.ChoiceField(choices=Result.TERM_CHOICES)
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+
+class AnnualResultSerializer(serializers.ModelSerializer):
+    """
+    Serializer for AnnualResult model
+    """
+    subject_name = serializers.CharField(source='subject.name', read_only=True)
+
+    class Meta:
+        model = AnnualResult
+        fields = ['id', 'subject', 'subject_name', 'first_term', 'second_term', 'third_term',
+                  'terms_count', 'annual_total', 'annual_average', 'grade', 'updated_at']
+        read_only_fields = fields
+
+
+class AnnualSummarySerializer(serializers.ModelSerializer):
+    """
+    Serializer for AnnualSummary model, with the pupil's annual subject results
+    """
+    pupil_name = serializers.CharField(source='pupil.full_name', read_only=True)
+    session_name = serializers.CharField(source='session.name', read_only=True)
+    pupil_class = serializers.SerializerMethodField()
+    results = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AnnualSummary
+        fields = ['id', 'pupil', 'pupil_name', 'pupil_class', 'session', 'session_name',
+                  'total_subjects', 'total_score', 'average_score', 'overall_grade',
+                  'position', 'results', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+    def get_pupil_class(self, obj):
+        try:
+            return obj.pupil.pupil_profile.pupil_class.name
+        except Exception:
+            return None
+
+    def get_results(self, obj):
+        # Uses the prefetched annual results when the viewset provides them
+        results = [
+            result for result in obj.pupil.annual_results.all() if result.session_id == obj.session_id
+        ]
+        return AnnualResultSerializer(results, many=True).data
+
+
+class GradingScaleSerializer(serializers.ModelSerializer):
+    """
+    Serializer for GradingScale model
+    """
+    class Meta:
+        model = GradingScale
+        fields = ['id', 'name', 'level', 'a_min', 'b_min', 'c_min', 'd_min', 'updated_at']
+        read_only_fields = ['id', 'updated_at']
+
+    def validate_level(self, value):
+        # Blank means the default scale
+        return value or None
+
+    def validate(self, attrs):
+        minimums = []
+        for field in ('a_min', 'b_min', 'c_min', 'd_min'):
+            value = attrs.get(field, getattr(self.instance, field, None))
+            minimums.append(GradingScale._meta.get_field(field).default if value is None else value)
+        if any(value < 0 or value > 100 for value in minimums):
+            raise serializers.ValidationError("Grade minimums must be between 0 and 100")
+        if not all(higher > lower for higher, lower in zip(minimums, minimums[1:])):
+            raise serializers.ValidationError("Grade minimums must decrease from A to D")
+        level = attrs.get('level', getattr(self.instance, 'level', None))
+        if level is None:
+            default_scales = GradingScale.objects.filter(level__isnull=True)
+            if self.instance:
+                default_scales = default_scales.exclude(pk=self.instance.pk)
+            if default_scales.exists():
+                raise serializers.ValidationError({'level': "A default grading scale already exists"})
+        return attrs
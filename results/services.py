@@ -0,0 +1,433 @@
+"""Set-based write paths for results and summaries.
+
+These helpers replace per-row ORM round trips (lookup + update_or_create +
+summary recalculation) with a constant number of queries per upload, so a
+whole class can be written in one transaction.
+"""
+
+import csv
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Rank
+from django.utils import timezone
+
+from backend import refdata
+from .invalidation import invalidate_results
+from .models import TWO_PLACES, Result, ResultSummary, boundaries_for_class, grade_for_score, stored_average
+
+
+BATCH_SIZE = 500
+
+RESULT_UNIQUE_FIELDS = ['pupil', 'subject', 'session', 'term']
+RESULT_UPDATE_FIELDS = ['test_score', 'exam_score', 'total', 'grade', 'teacher_comment', 'updated_at']
+
+SUMMARY_UNIQUE_FIELDS = ['pupil', 'session', 'term']
+SUMMARY_UPDATE_FIELDS = ['total_subjects', 'total_score', 'average_score', 'overall_grade', 'updated_at']
+
+
+def parse_score(value, field_label, maximum):
+    """Parse a score into a Decimal, enforcing the same bounds as ResultCreateSerializer"""
+    if value is None or value == '':
+        raise ValueError(f"{field_label} is required")
+    try:
+        score = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{field_label} must be a number")
+    if not score.is_finite() or score < 0 or score > maximum:
+        raise ValueError(f"{field_label} must be between 0 and {maximum}")
+    return score.quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def _resolve_pupils(pupil_ids=(), usernames=()):
+    """
+    Look up pupils by id and/or username in one query.
+
+    Returns ``(pupils, ids_by_username)`` where ``pupils`` maps each pupil id
+    to ``(class_id, class_teacher_id)``.
+    """
+    from accounts.models import CustomUser
+
+    pupils = {}
+    ids_by_username = {}
+    if not pupil_ids and not usernames:
+        return pupils, ids_by_username
+    for pupil_id, username, class_id, class_teacher_id in CustomUser.objects.filter(
+        Q(id__in=pupil_ids) | Q(username__in=usernames), role='pupil'
+    ).values_list(
+        'id', 'username', 'pupil_profile__pupil_class_id', 'pupil_profile__pupil_class__assigned_teacher_id'
+    ):
+        pupils[pupil_id] = (class_id, class_teacher_id)
+        ids_by_username[username] = pupil_id
+    return pupils, ids_by_username
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_result(row, pupil_id, pupils, subject_id, subject_class_id, session, term, user):
+    """Validate one row and return an unsaved Result, or raise ValueError with the reason"""
+    if pupil_id not in pupils:
+        raise ValueError('Invalid pupil_id')
+    class_id, class_teacher_id = pupils[pupil_id]
+    if not class_id:
+        raise ValueError('Pupil has no assigned class')
+    if subject_class_id != class_id:
+        raise ValueError('Subject does not belong to pupil’s class')
+    if getattr(user, 'role', None) == 'teacher' and class_teacher_id != user.id:
+        raise ValueError('You can only upload scores for pupils in your assigned classes')
+
+    test_score = parse_score(row.get('test_score'), 'Test score', 30)
+    exam_score = parse_score(row.get('exam_score'), 'Exam score', 70)
+    total = test_score + exam_score
+    return Result(
+        pupil_id=pupil_id,
+        subject_id=subject_id,
+        session=session,
+        term=term,
+        test_score=test_score,
+        exam_score=exam_score,
+        total=total,
+        grade=grade_for_score(total, boundaries_for_class(subject_class_id)),
+        teacher_comment=row.get('teacher_comment') or '',
+    )
+
+
+def _write_results(results):
+    with transaction.atomic():
+        Result.objects.bulk_create(
+            results,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=RESULT_UNIQUE_FIELDS,
+            update_fields=RESULT_UPDATE_FIELDS,
+        )
+
+
+def bulk_upsert_results(subject, session, term, rows, user=None):
+    """
+    Validate and write many results for one subject/session/term.
+
+    Every ``pupil_id`` is resolved against the subject's class in a single
+    query, totals and grades are computed in memory and all valid rows are
+    written with one ``INSERT ... ON CONFLICT DO UPDATE`` on the result's
+    unique key.
+
+    Returns ``(written, errors, pupil_ids)`` where ``written`` is the number
+    of rows accepted, ``errors`` is a list of ``{'pupil_id', 'error'}`` dicts
+    in the same shape the bulk endpoint has always returned and
+    ``pupil_ids`` is the set of pupils whose results changed.
+    """
+    pupils, _ = _resolve_pupils(
+        pupil_ids={_parse_id(row.get('pupil_id')) for row in rows} - {None}
+    )
+
+    errors = []
+    written = 0
+    # Keyed by pupil so a repeated pupil_id behaves like successive updates (last row wins)
+    to_write = {}
+
+    for row in rows:
+        raw_pupil_id = row.get('pupil_id')
+        pupil_id = _parse_id(raw_pupil_id)
+        try:
+            to_write[pupil_id] = _build_result(
+                row, pupil_id, pupils, subject.id, subject.assigned_class_id, session, term, user
+            )
+        except ValueError as e:
+            errors.append({
+                'pupil_id': raw_pupil_id,
+                'error': str(e)
+            })
+            continue
+        written += 1
+
+    if to_write:
+        _write_results(list(to_write.values()))
+
+    return written, errors, set(to_write)
+
+
+def import_results_csv(stream, session, term, user=None, subject=None, dry_run=False):
+    """
+    Import scores from a CSV text stream for one session/term.
+
+    The header must name the pupil (``pupil_id`` or ``username``) and the
+    scores (``test_score``, ``exam_score``); ``subject_id`` and
+    ``teacher_comment`` are optional, and ``subject`` supplies the subject
+    for rows without one. Rows are read and validated ``BATCH_SIZE`` at a
+    time (one pupil lookup per batch, subjects and teacher classes from
+    reference data) and each batch is upserted in its own transaction, so
+    memory stays flat however long the file is. With ``dry_run`` nothing is
+    written.
+
+    Returns ``(report, pupil_ids, subject_ids)``; the report holds the row
+    count, rows accepted and a list of ``{'row', 'error'}`` entries numbered
+    by line in the file. Raises ValueError if the header is unusable.
+    """
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames:
+        raise ValueError('The CSV file is empty')
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    header = set(reader.fieldnames)
+    missing = []
+    if not header & {'pupil_id', 'username'}:
+        missing.append('pupil_id or username')
+    if 'subject_id' not in header and subject is None:
+        missing.append('subject_id')
+    missing += [column for column in ('test_score', 'exam_score') if column not in header]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+
+    teacher_class_ids = None
+    if getattr(user, 'role', None) == 'teacher':
+        teacher_class_ids = set(refdata.get_teacher_class_ids(user.id))
+
+    report = {'rows': 0, 'accepted': 0, 'errors': []}
+    pupil_ids = set()
+    subject_ids = set()
+
+    def process(batch):
+        pupils, ids_by_username = _resolve_pupils(
+            pupil_ids={_parse_id(row.get('pupil_id')) for _, row in batch} - {None},
+            usernames={(row.get('username') or '').strip() for _, row in batch} - {''},
+        )
+        to_write = {}
+        for line, row in batch:
+            pupil_id = _parse_id(row.get('pupil_id'))
+            if pupil_id is None:
+                pupil_id = ids_by_username.get((row.get('username') or '').strip())
+            subject_id = _parse_id(row.get('subject_id')) if row.get('subject_id') else getattr(subject, 'id', None)
+            subject_class_id = refdata.get_subject_class_id(subject_id)
+            try:
+                if subject_class_id is None:
+                    raise ValueError('Invalid subject_id')
+                if teacher_class_ids is not None and subject_class_id not in teacher_class_ids:
+                    raise ValueError('You can only upload scores for subjects in your assigned classes')
+                result = _build_result(
+                    row, pupil_id, pupils, subject_id, subject_class_id, session, term, user
+                )
+            except ValueError as e:
+                report['errors'].append({'row': line, 'error': str(e)})
+                continue
+            to_write[(pupil_id, subject_id)] = result
+            report['accepted'] += 1
+        if to_write and not dry_run:
+            _write_results(list(to_write.values()))
+            pupil_ids.update(pupil for pupil, _ in to_write)
+            subject_ids.update(subject for _, subject in to_write)
+
+    batch = []
+    for row in reader:
+        if not any((value or '').strip() for value in row.values() if isinstance(value, str)):
+            continue
+        report['rows'] += 1
+        batch.append((reader.line_num, row))
+        if len(batch) >= BATCH_SIZE:
+            process(batch)
+            batch = []
+    if batch:
+        process(batch)
+
+    return report, pupil_ids, subject_ids
+
+
+def _upsert_summaries(session, term, aggregates, pupil_ids):
+    """Build ResultSummary rows from per-pupil aggregates and upsert them in bulk"""
+    summaries = []
+    for pupil_id in pupil_ids:
+        row = aggregates.get(pupil_id)
+        subject_count = row['subject_count'] if row else 0
+        if subject_count:
+            total_score = row['score_sum']
+            average_score = stored_average(total_score, subject_count)
+            overall_grade = grade_for_score(average_score, boundaries_for_class(row['class_id']))
+        else:
+            total_score = Decimal('0')
+            average_score = Decimal('0')
+            overall_grade = 'F'
+        summaries.append(ResultSummary(
+            pupil_id=pupil_id,
+            session=session,
+            term=term,
+            total_subjects=subject_count,
+            total_score=total_score,
+            average_score=average_score,
+            overall_grade=overall_grade,
+        ))
+
+    with transaction.atomic():
+        ResultSummary.objects.bulk_create(
+            summaries,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=SUMMARY_UNIQUE_FIELDS,
+            update_fields=SUMMARY_UPDATE_FIELDS,
+        )
+
+
+def _aggregate_by_pupil(results):
+    """One GROUP BY over the given Result queryset: class, subject count and score sum per pupil"""
+    return {
+        row['pupil_id']: row
+        for row in results.values('pupil_id', class_id=F('pupil__pupil_profile__pupil_class_id')).annotate(
+            subject_count=Count('id'), score_sum=Sum('total')
+        ).order_by()
+    }
+
+
+def refresh_summaries(session, term, pupil_ids):
+    """
+    Rebuild the ResultSummary rows for the given pupils from one grouped
+    aggregate over Result and upsert them in bulk.
+
+    Returns a ``{pupil_id: summary_id}`` mapping for the refreshed rows.
+    """
+    pupil_ids = list(pupil_ids)
+    if not pupil_ids:
+        return {}
+
+    aggregates = _aggregate_by_pupil(
+        Result.objects.filter(session=session, term=term, pupil_id__in=pupil_ids)
+    )
+    _upsert_summaries(session, term, aggregates, pupil_ids)
+
+    return dict(
+        ResultSummary.objects.filter(
+            session=session, term=term, pupil_id__in=pupil_ids
+        ).values_list('pupil_id', 'id')
+    )
+
+
+def recompute_summaries(session, term, class_id=None, level=None):
+    """
+    Recompute every ResultSummary for a session/term, optionally limited to
+    one class or one class level.
+
+    Counts and sums for all pupils come from a single grouped aggregate over
+    Result; existing summaries in scope with no remaining results are reset
+    to zero. Class and subject positions in scope are re-ranked. Returns a
+    report with row counts and timing.
+    """
+    started = time.monotonic()
+
+    results = Result.objects.filter(session=session, term=term)
+    summaries = ResultSummary.objects.filter(session=session, term=term)
+    if class_id:
+        results = results.filter(pupil__pupil_profile__pupil_class_id=class_id)
+        summaries = summaries.filter(pupil__pupil_profile__pupil_class_id=class_id)
+    if level:
+        results = results.filter(pupil__pupil_profile__pupil_class__level=level)
+        summaries = summaries.filter(pupil__pupil_profile__pupil_class__level=level)
+
+    aggregates = _aggregate_by_pupil(results)
+    existing = set(summaries.values_list('pupil_id', flat=True))
+    pupil_ids = sorted(existing | set(aggregates))
+
+    if pupil_ids:
+        _upsert_summaries(session, term, aggregates, pupil_ids)
+
+    class_ids = [class_id] if class_id else None
+    if level:
+        from classes.models import Class
+        class_ids = list(Class.objects.filter(level=level).values_list('id', flat=True))
+    subject_ids = None
+    if class_ids is not None:
+        from classes.models import Subject
+        subject_ids = list(Subject.objects.filter(assigned_class_id__in=class_ids).values_list('id', flat=True))
+    refresh_class_positions(session.id, term, class_ids=class_ids)
+    refresh_subject_positions(session.id, term, subject_ids=subject_ids)
+    invalidate_results(session.id, term, class_ids)
+
+    # Annual results span all terms, so bring those of the pupils in scope up to date too
+    from .annual import refresh_annual
+    refresh_annual(session.id, pupil_ids)
+
+    created = len(set(aggregates) - existing)
+    return {
+        'session_id': session.id,
+        'term': term,
+        'class_id': class_id,
+        'level': level,
+        'pupils': len(pupil_ids),
+        'results': sum(row['subject_count'] for row in aggregates.values()),
+        'created': created,
+        'updated': len(pupil_ids) - created,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+def _store_positions(model, ranked, unranked):
+    """Write changed ``(id, old_position, rank)`` rows and clear positions in ``unranked``"""
+    now = timezone.now()
+    changed = [
+        model(id=row_id, position=rank, updated_at=now)
+        for row_id, position, rank in ranked
+        if position != rank
+    ]
+    with transaction.atomic():
+        model.objects.bulk_update(changed, ['position', 'updated_at'], batch_size=BATCH_SIZE)
+        cleared = unranked.exclude(position__isnull=True).update(position=None, updated_at=now)
+    return len(changed) + cleared
+
+
+def refresh_class_positions(session_id, term, class_ids=None, pupil_ids=None):
+    """
+    Recompute class positions on ResultSummary with
+    ``RANK() OVER (PARTITION BY class ORDER BY average_score DESC)``.
+
+    Only the partitions touched by a write need refreshing: pass the
+    ``class_ids`` or the ``pupil_ids`` (whose classes are used) that
+    changed. With neither, every class in the session/term is ranked.
+    Summaries with no subjects are left unranked. Returns the number of
+    rows whose position changed.
+    """
+    from accounts.models import PupilProfile
+
+    summaries = ResultSummary.objects.filter(
+        session_id=session_id, term=term, pupil__pupil_profile__pupil_class__isnull=False
+    )
+    if pupil_ids is not None:
+        summaries = summaries.filter(
+            pupil__pupil_profile__pupil_class__in=PupilProfile.objects.filter(
+                user_id__in=list(pupil_ids)
+            ).values('pupil_class')
+        )
+    if class_ids is not None:
+        summaries = summaries.filter(pupil__pupil_profile__pupil_class_id__in=list(class_ids))
+
+    ranked = summaries.filter(total_subjects__gt=0).annotate(
+        rank=Window(
+            Rank(),
+            partition_by=[F('pupil__pupil_profile__pupil_class_id')],
+            order_by=F('average_score').desc(),
+        )
+    ).values_list('id', 'position', 'rank')
+    return _store_positions(ResultSummary, ranked, summaries.filter(total_subjects=0))
+
+
+def refresh_subject_positions(session_id, term, subject_ids=None):
+    """
+    Recompute subject positions on Result with
+    ``RANK() OVER (PARTITION BY subject ORDER BY total DESC)`` for the given
+    subjects (or every subject in the session/term). Returns the number of
+    rows whose position changed.
+    """
+    results = Result.objects.filter(session_id=session_id, term=term)
+    if subject_ids is not None:
+        results = results.filter(subject_id__in=list(subject_ids))
+
+    ranked = results.annotate(
+        rank=Window(
+            Rank(),
+            partition_by=[F('subject_id')],
+            order_by=F('total').desc(),
+        )
+    ).values_list('id', 'position', 'rank')
+    return _store_positions(Result, ranked, Result.objects.none())
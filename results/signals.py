@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from backend import refdata
+from backend.realtime import broadcast_update
+from classes.models import Class, Subject
+from .changes import record_tombstone
+from .grading import regrade
+from .invalidation import invalidate_results, invalidate_sessions
+from .models import AcademicSession, GradingScale, Result, ResultSummary
+from .release import scheduler
+from .report_cards import purge_report_card_cache
+
+
+@receiver(post_delete, sender=ResultSummary)
+def purge_deleted_summary_pdfs(sender, instance, **kwargs):
+    """Drop cached report-card PDFs when their summary is deleted"""
+    purge_report_card_cache(instance.pk)
+
+
+@receiver(post_save, sender=AcademicSession)
+@receiver(post_delete, sender=AcademicSession)
+def invalidate_session_refdata(sender, **kwargs):
+    """The cached active session, the release schedule and per-pupil responses may have changed"""
+    refdata.invalidate()
+    invalidate_sessions()
+    scheduler.wake()
+
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def invalidate_result_caches(sender, instance, **kwargs):
+    """Cached broadsheets etc. for the result's class and the pupil's current class are stale"""
+    invalidate_results(
+        instance.session_id, instance.term, [refdata.get_subject_class_id(instance.subject_id)],
+        pupil_ids=[instance.pupil_id],
+    )
+
+
+@receiver(post_save, sender=ResultSummary)
+@receiver(post_delete, sender=ResultSummary)
+def invalidate_summary_caches(sender, instance, **kwargs):
+    invalidate_results(instance.session_id, instance.term, [], pupil_ids=[instance.pupil_id])
+
+
+@receiver(post_save, sender=GradingScale)
+@receiver(post_delete, sender=GradingScale)
+def invalidate_grading_refdata(sender, **kwargs):
+    """Cached grade boundaries are stale"""
+    refdata.invalidate()
+
+
+@receiver(pre_save, sender=GradingScale)
+def remember_previous_level(sender, instance, **kwargs):
+    """Keep the level a scale is moving away from, so its rows are regraded too"""
+    instance._previous_levels = (
+        list(sender.objects.filter(pk=instance.pk).values_list('level', flat=True)) if instance.pk else []
+    )
+
+
+@receiver(post_save, sender=GradingScale)
+@receiver(post_delete, sender=GradingScale)
+def regrade_after_scale_change(sender, instance, **kwargs):
+    """Stored grades follow the scale whichever path changed it (API, admin, shell), once committed"""
+    levels = {instance.level, *getattr(instance, '_previous_levels', ())}
+    transaction.on_commit(lambda: _regrade(levels))
+
+
+def _regrade(levels):
+    # A default scale change can affect any level without its own scale
+    report = regrade(levels=None if None in levels else levels)
+    broadcast_update('grades_update', {'action': 'regrade', 'levels': report['levels']})
+
+
+@receiver(post_delete, sender=Result)
+def tombstone_result(sender, instance, **kwargs):
+    record_tombstone(
+        'results', instance.pk, class_id=refdata.get_subject_class_id(instance.subject_id), pupil_id=instance.pupil_id
+    )
+
+
+@receiver(post_delete, sender=ResultSummary)
+def tombstone_summary(sender, instance, **kwargs):
+    from accounts.models import PupilProfile
+    class_id = PupilProfile.objects.filter(user_id=instance.pupil_id).values_list('pupil_class_id', flat=True).first()
+    record_tombstone('summaries', instance.pk, class_id=class_id, pupil_id=instance.pupil_id)
+
+
+@receiver(post_delete, sender=AcademicSession)
+def tombstone_session(sender, instance, **kwargs):
+    record_tombstone('sessions', instance.pk)
+
+
+@receiver(post_delete, sender=Class)
+def tombstone_class(sender, instance, **kwargs):
+    record_tombstone('classes', instance.pk, class_id=instance.pk)
+
+
+@receiver(post_delete, sender=Subject)
+def tombstone_subject(sender, instance, **kwargs):
+    record_tombstone('subjects', instance.pk, class_id=instance.assigned_class_id)
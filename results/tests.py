@@ -1,3 +1,1495 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
 
-# Create your tests here.
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from pypdf import PdfReader
+
+from accounts.models import CustomUser, PupilProfile
+from backend import refdata
+from classes.models import Class, Subject
+from .models import AcademicSession, GradingScale, Result, ResultSummary
+from .annual import refresh_annual
+from .exports import RESULT_EXPORT_COLUMNS
+from .release import next_release_date, release_due_sessions
+from .services import recompute_summaries, refresh_subject_positions
+from .views import ResultSummaryViewSet, ResultViewSet
+
+
+class ResultsTestBase(TestCase):
+    def setUp(self):
+        # Test runs use a private in-memory cache (see CACHES in settings); start each test empty
+        cache.clear()
+
+        # Keep rendered report cards out of the real MEDIA_ROOT
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = self.settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.admin = self.make_user('1001', 'admin')
+        self.teacher = self.make_user('2001', 'teacher')
+        self.other_teacher = self.make_user('2002', 'teacher')
+
+        self.class_a = Class.objects.create(name='GRADE 1A', level='GRADE 1', assigned_teacher=self.teacher)
+        self.class_b = Class.objects.create(name='GRADE 1B', level='GRADE 1', assigned_teacher=self.other_teacher)
+        self.maths = Subject.objects.create(name='Mathematics', assigned_class=self.class_a, assigned_teacher=self.teacher)
+        self.english = Subject.objects.create(name='English', assigned_class=self.class_a, assigned_teacher=self.teacher)
+
+        self.session = AcademicSession.objects.create(
+            name='2024/2025', start_date=date(2024, 9, 1), end_date=date(2025, 7, 31)
+        )
+        self.pupils = [self.make_pupil(f'30{i:02d}', self.class_a) for i in range(3)]
+        self.outsider = self.make_pupil('3100', self.class_b)
+
+        self.client = APIClient()
+
+    def make_user(self, username, role):
+        return CustomUser.objects.create_user(
+            username=username, full_name=f'User {username}', password='pass',
+            role=role, email=f'{username}@example.com'
+        )
+
+    def make_pupil(self, username, pupil_class):
+        pupil = self.make_user(username, 'pupil')
+        PupilProfile.objects.create(user=pupil, pupil_class=pupil_class)
+        return pupil
+
+
+class BulkCreateTests(ResultsTestBase):
+    def bulk_payload(self, rows, subject=None):
+        return {
+            'subject': (subject or self.maths).id,
+            'session': self.session.id,
+            'term': 'first',
+            'results': rows,
+        }
+
+    def test_bulk_create_upserts_rows_and_summaries(self):
+        self.client.force_authenticate(self.teacher)
+        url = reverse('result-bulk-create')
+        rows = [
+            {'pupil_id': self.pupils[0].id, 'test_score': 25, 'exam_score': 60},
+            {'pupil_id': self.pupils[1].id, 'test_score': '10.5', 'exam_score': 30},
+        ]
+        resp = self.client.post(url, self.bulk_payload(rows), format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()['created'], 2)
+        self.assertEqual(resp.json()['summaries_updated'], 2)
+
+        first = Result.objects.get(pupil=self.pupils[0], subject=self.maths)
+        self.assertEqual(first.total, Decimal('85.00'))
+        self.assertEqual(first.grade, 'A')
+
+        # Re-uploading updates in place instead of duplicating
+        rows[0]['exam_score'] = 20
+        resp = self.client.post(url, self.bulk_payload(rows), format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(Result.objects.filter(subject=self.maths).count(), 2)
+        first.refresh_from_db()
+        self.assertEqual(first.total, Decimal('45.00'))
+        self.assertEqual(first.grade, 'D')
+
+        summary = ResultSummary.objects.get(pupil=self.pupils[0], session=self.session, term='first')
+        self.assertEqual(summary.total_subjects, 1)
+        self.assertEqual(summary.average_score, Decimal('45.00'))
+        self.assertEqual(summary.overall_grade, 'D')
+
+    def test_bulk_create_reports_row_errors(self):
+        self.client.force_authenticate(self.teacher)
+        rows = [
+            {'pupil_id': self.pupils[0].id, 'test_score': 25, 'exam_score': 60},
+            {'pupil_id': self.outsider.id, 'test_score': 25, 'exam_score': 60},
+            {'pupil_id': 999999, 'test_score': 25, 'exam_score': 60},
+            {'pupil_id': self.pupils[1].id, 'test_score': 31, 'exam_score': 60},
+        ]
+        resp = self.client.post(reverse('result-bulk-create'), self.bulk_payload(rows), format='json')
+        self.assertEqual(resp.status_code, 201)
+        data = resp.json()
+        self.assertEqual(data['created'], 1)
+        errors = {e['pupil_id']: e['error'] for e in data['errors']}
+        self.assertEqual(errors[self.outsider.id], 'Subject does not belong to pupil’s class')
+        self.assertEqual(errors[999999], 'Invalid pupil_id')
+        self.assertEqual(errors[self.pupils[1].id], 'Test score must be between 0 and 30')
+        self.assertEqual(Result.objects.count(), 1)
+
+
+class CsvImportTests(ResultsTestBase):
+    def upload(self, content, **data):
+        data.setdefault('session', self.session.id)
+        data.setdefault('term', 'first')
+        data['file'] = SimpleUploadedFile('scores.csv', content.encode(), content_type='text/csv')
+        return self.client.post(reverse('result-import-csv'), data, format='multipart')
+
+    def test_import_validates_rows_and_upserts(self):
+        self.client.force_authenticate(self.teacher)
+        english_row = f'{self.pupils[1].username},,{self.english.id},15,40,Good'
+        content = '\n'.join([
+            'Username,Pupil_ID,Subject_ID,Test_Score,Exam_Score,Teacher_Comment',
+            f',{self.pupils[0].id},{self.maths.id},25,60,',
+            english_row,
+            f',{self.outsider.id},{self.maths.id},20,50,',
+            f',{self.pupils[2].id},{self.maths.id},31,50,',
+            f'nobody,,{self.maths.id},20,50,',
+        ])
+
+        resp = self.upload(content, dry_run='true')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(resp.json()['valid'], 2)
+        self.assertEqual(Result.objects.count(), 0)
+
+        resp = self.upload(content)
+        self.assertEqual(resp.status_code, 201, resp.content)
+        body = resp.json()
+        self.assertEqual((body['rows'], body['imported'], body['summaries_updated']), (5, 2, 2))
+        self.assertEqual(body['errors'], [
+            {'row': 4, 'error': 'Subject does not belong to pupil’s class'},
+            {'row': 5, 'error': 'Test score must be between 0 and 30'},
+            {'row': 6, 'error': 'Invalid pupil_id'},
+        ])
+        english = Result.objects.get(pupil=self.pupils[1], subject=self.english)
+        self.assertEqual((english.total, english.teacher_comment), (Decimal('55.00'), 'Good'))
+        self.assertEqual(ResultSummary.objects.get(pupil=self.pupils[0]).total_score, Decimal('85.00'))
+
+    def test_import_rejects_foreign_subjects_and_bad_headers(self):
+        self.client.force_authenticate(self.other_teacher)
+        resp = self.upload(f'pupil_id,test_score,exam_score\n{self.pupils[0].id},10,20\n', subject=self.maths.id)
+        self.assertEqual(resp.json()['errors'][0]['error'],
+                         'You can only upload scores for subjects in your assigned classes')
+
+        resp = self.upload('pupil_id,score\n1,2\n')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('subject_id', resp.json()['detail'])
+
+
+class IncrementalSummaryTests(ResultsTestBase):
+    def create_result(self, pupil, subject, test_score, exam_score):
+        resp = self.client.post(reverse('result-list'), {
+            'pupil': pupil.id, 'subject': subject.id, 'session': self.session.id,
+            'term': 'first', 'test_score': test_score, 'exam_score': exam_score,
+        }, format='json')
+        self.assertEqual(resp.status_code, 201, resp.content)
+        return Result.objects.get(pupil=pupil, subject=subject)
+
+    def get_summary(self, pupil):
+        return ResultSummary.objects.get(pupil=pupil, session=self.session, term='first')
+
+    def test_create_update_delete_apply_deltas(self):
+        self.client.force_authenticate(self.admin)
+        pupil = self.pupils[0]
+        maths = self.create_result(pupil, self.maths, 25, 60)
+        self.create_result(pupil, self.english, 20, 45)
+
+        summary = self.get_summary(pupil)
+        self.assertEqual(summary.total_subjects, 2)
+        self.assertEqual(summary.total_score, Decimal('150.00'))
+        self.assertEqual(summary.average_score, Decimal('75.00'))
+        self.assertEqual(summary.overall_grade, 'A')
+
+        resp = self.client.put(reverse('result-detail', args=[maths.id]), {
+            'pupil': pupil.id, 'subject': self.maths.id, 'session': self.session.id,
+            'term': 'first', 'test_score': 10, 'exam_score': 30,
+        }, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        summary = self.get_summary(pupil)
+        self.assertEqual(summary.total_subjects, 2)
+        self.assertEqual(summary.total_score, Decimal('105.00'))
+        self.assertEqual(summary.average_score, Decimal('52.50'))
+        self.assertEqual(summary.overall_grade, 'C')
+
+        resp = self.client.delete(reverse('result-detail', args=[maths.id]))
+        self.assertEqual(resp.status_code, 204)
+        summary = self.get_summary(pupil)
+        self.assertEqual(summary.total_subjects, 1)
+        self.assertEqual(summary.average_score, Decimal('65.00'))
+        self.assertEqual(summary.overall_grade, 'B')
+
+        # The full recompute agrees with the incrementally maintained row
+        summary.calculate_summary()
+        summary.refresh_from_db()
+        self.assertEqual(summary.total_score, Decimal('65.00'))
+        self.assertEqual(summary.average_score, Decimal('65.00'))
+
+    def test_edit_from_a_stale_read_applies_its_delta_to_the_current_row(self):
+        self.client.force_authenticate(self.admin)
+        pupil = self.pupils[0]
+        maths = self.create_result(pupil, self.maths, 25, 60)
+        url = reverse('result-detail', args=[maths.id])
+        stale = Result.objects.get(pk=maths.pk)
+
+        # Another edit commits after this request loaded the row
+        self.client.patch(url, {'exam_score': 40}, format='json')
+        with patch.object(ResultViewSet, 'get_object', return_value=stale):
+            resp = self.client.patch(url, {'test_score': 10}, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+
+        maths.refresh_from_db()
+        self.assertEqual((maths.test_score, maths.exam_score, maths.total), (10, 40, Decimal('50.00')))
+        self.assertEqual(self.get_summary(pupil).total_score, Decimal('50.00'))
+
+    def test_every_path_grades_the_rounded_average(self):
+        self.client.force_authenticate(self.admin)
+        pupil = self.pupils[0]
+        self.create_result(pupil, self.maths, 20, 50)
+        self.create_result(pupil, self.english, '19.99', 50)
+
+        # 139.99 / 2 = 69.995, stored as 70.00: an A on every path, not a B from the unrounded value
+        summary = self.get_summary(pupil)
+        self.assertEqual((summary.average_score, summary.overall_grade), (Decimal('70.00'), 'A'))
+        summary.calculate_summary()
+        summary.refresh_from_db()
+        self.assertEqual((summary.average_score, summary.overall_grade), (Decimal('70.00'), 'A'))
+        ResultSummary.objects.filter(pk=summary.pk).update(overall_grade='F')
+        recompute_summaries(self.session, 'first')
+        summary.refresh_from_db()
+        self.assertEqual((summary.average_score, summary.overall_grade), (Decimal('70.00'), 'A'))
+
+
+class RecomputeSummariesTests(ResultsTestBase):
+    def test_recompute_class_repairs_drifted_summaries(self):
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=40)
+        Result.objects.create(pupil=self.pupils[0], subject=self.english, session=self.session,
+                              term='first', test_score=30, exam_score=70)
+        Result.objects.create(pupil=self.pupils[1], subject=self.maths, session=self.session,
+                              term='first', test_score=10, exam_score=20)
+        # A stale summary whose results have all been removed
+        ResultSummary.objects.create(pupil=self.pupils[2], session=self.session, term='first',
+                                     total_subjects=3, total_score=200, average_score=66.67, overall_grade='B')
+
+        self.client.force_authenticate(self.admin)
+        resp = self.client.post(reverse('summary-recompute'), {
+            'session': self.session.id, 'term': 'first', 'class': self.class_a.id,
+        }, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        report = resp.json()
+        self.assertEqual(report['pupils'], 3)
+        self.assertEqual(report['results'], 3)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['updated'], 1)
+
+        first = ResultSummary.objects.get(pupil=self.pupils[0], session=self.session, term='first')
+        self.assertEqual(first.total_subjects, 2)
+        self.assertEqual(first.average_score, Decimal('80.00'))
+        self.assertEqual(first.overall_grade, 'A')
+        stale = ResultSummary.objects.get(pupil=self.pupils[2], session=self.session, term='first')
+        self.assertEqual(stale.total_subjects, 0)
+        self.assertEqual(stale.overall_grade, 'F')
+
+    def test_recompute_is_admin_only(self):
+        self.client.force_authenticate(self.teacher)
+        resp = self.client.post(reverse('summary-recompute'), {'session': self.session.id}, format='json')
+        self.assertEqual(resp.status_code, 403)
+
+
+class PositionTests(ResultsTestBase):
+    def test_bulk_upload_ranks_class_and_subject_with_ties(self):
+        self.client.force_authenticate(self.teacher)
+        rows = [
+            {'pupil_id': self.pupils[0].id, 'test_score': 20, 'exam_score': 50},
+            {'pupil_id': self.pupils[1].id, 'test_score': 30, 'exam_score': 60},
+            {'pupil_id': self.pupils[2].id, 'test_score': 20, 'exam_score': 50},
+        ]
+        resp = self.client.post(reverse('result-bulk-create'), {
+            'subject': self.maths.id, 'session': self.session.id, 'term': 'first', 'results': rows,
+        }, format='json')
+        self.assertEqual(resp.status_code, 201, resp.content)
+
+        positions = dict(Result.objects.filter(subject=self.maths).values_list('pupil_id', 'position'))
+        self.assertEqual(positions, {self.pupils[1].id: 1, self.pupils[0].id: 2, self.pupils[2].id: 2})
+        summary_positions = dict(ResultSummary.objects.values_list('pupil_id', 'position'))
+        self.assertEqual(summary_positions[self.pupils[1].id], 1)
+        self.assertEqual(summary_positions[self.pupils[2].id], 2)
+
+        # Editing one score re-ranks the touched partitions
+        result = Result.objects.get(pupil=self.pupils[2], subject=self.maths)
+        resp = self.client.put(reverse('result-detail', args=[result.id]), {
+            'pupil': self.pupils[2].id, 'subject': self.maths.id, 'session': self.session.id,
+            'term': 'first', 'test_score': 30, 'exam_score': 70,
+        }, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        positions = dict(Result.objects.filter(subject=self.maths).values_list('pupil_id', 'position'))
+        self.assertEqual(positions, {self.pupils[2].id: 1, self.pupils[1].id: 2, self.pupils[0].id: 3})
+        summary = ResultSummary.objects.get(pupil=self.pupils[2])
+        self.assertEqual(summary.position, 1)
+
+        resp = self.client.get(reverse('summary-pdf', args=[summary.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+
+    def test_moving_a_result_to_another_subject_reranks_both(self):
+        self.client.force_authenticate(self.admin)
+        for pupil, exam_score in ((self.pupils[0], 60), (self.pupils[1], 50)):
+            Result.objects.create(pupil=pupil, subject=self.maths, session=self.session,
+                                  term='first', test_score=20, exam_score=exam_score)
+        refresh_subject_positions(self.session.id, 'first')
+
+        top = Result.objects.get(pupil=self.pupils[0], subject=self.maths)
+        resp = self.client.put(reverse('result-detail', args=[top.id]), {
+            'pupil': self.pupils[0].id, 'subject': self.english.id, 'session': self.session.id,
+            'term': 'first', 'test_score': 20, 'exam_score': 60,
+        }, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(Result.objects.get(pupil=self.pupils[1], subject=self.maths).position, 1)
+        self.assertEqual(Result.objects.get(pupil=self.pupils[0], subject=self.english).position, 1)
+
+
+    def test_recalculating_a_summary_reranks_the_class(self):
+        for pupil, exam_score in ((self.pupils[0], 60), (self.pupils[1], 50)):
+            Result.objects.create(pupil=pupil, subject=self.maths, session=self.session,
+                                  term='first', test_score=20, exam_score=exam_score)
+        recompute_summaries(self.session, 'first', class_id=self.class_a.id)
+        self.client.force_authenticate(self.teacher)
+        url = reverse('summary-list')
+
+        def positions():
+            rows = self.client.get(url, {'session': self.session.id, 'term': 'first'}).json()['results']
+            return {row['pupil']: row['position'] for row in rows}
+
+        self.assertEqual(positions(), {self.pupils[0].id: 1, self.pupils[1].id: 2})
+
+        # Scores fixed up behind the API, then the summary recalculated on request
+        Result.objects.filter(pupil=self.pupils[1]).update(exam_score=70, total=90)
+        summary = ResultSummary.objects.get(pupil=self.pupils[1])
+        self.assertEqual(self.client.post(reverse('summary-calculate', args=[summary.id])).status_code, 200)
+        self.assertEqual(positions(), {self.pupils[1].id: 1, self.pupils[0].id: 2})
+
+        Result.objects.filter(pupil=self.pupils[0]).update(exam_score=75, total=95)
+        resp = self.client.post(reverse('summary-generate-summary'), {
+            'pupil': self.pupils[0].id, 'session': self.session.id, 'term': 'first',
+        }, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(positions(), {self.pupils[0].id: 1, self.pupils[1].id: 2})
+
+
+@override_settings(REPORT_CARD_WORKERS=1)
+class BatchReportCardTests(ResultsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.session.current_term = 'first'
+        self.session.save()
+        for pupil in self.pupils:
+            Result.objects.create(pupil=pupil, subject=self.maths, session=self.session,
+                                  term='first', test_score=20, exam_score=50)
+        recompute_summaries(self.session, 'first', class_id=self.class_a.id)
+
+    def test_class_zip_contains_one_card_per_pupil(self):
+        self.client.force_authenticate(self.teacher)
+        resp = self.client.get(reverse('summary-batch-pdf'), {'class': self.class_a.id})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(resp.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(len(names), 3)
+        self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in names))
+
+    def test_merged_pdf_and_teacher_scoping(self):
+        self.client.force_authenticate(self.admin)
+        resp = self.client.get(reverse('summary-batch-pdf'), {'level': 'GRADE 1', 'output': 'pdf'})
+        self.assertEqual(resp.status_code, 200)
+        chunks = list(resp.streaming_content)
+        # Every card goes out as soon as it is rendered, then the page tree, bookmarks and xref
+        self.assertEqual(len(chunks), 4)
+        merged = PdfReader(io.BytesIO(b''.join(chunks)), strict=True)
+        self.assertEqual(len(merged.pages), 3)
+        self.assertEqual([item.title for item in merged.outline], sorted(pupil.full_name for pupil in self.pupils))
+        self.assertEqual([merged.get_destination_page_number(item) for item in merged.outline], [0, 1, 2])
+        self.assertIn('Mathematics', merged.pages[2].extract_text())
+
+        self.client.force_authenticate(self.other_teacher)
+        resp = self.client.get(reverse('summary-batch-pdf'), {'class': self.class_a.id})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_zip_streams_asynchronously_under_asgi(self):
+        token = str(RefreshToken.for_user(self.teacher).access_token)
+
+        async def download():
+            response = await AsyncClient().get(
+                reverse('summary-batch-pdf'), {'class': self.class_a.id}, headers={'Authorization': f'Bearer {token}'}
+            )
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, content = async_to_sync(download)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(zipfile.ZipFile(io.BytesIO(content)).namelist()), 3)
+
+
+@override_settings(REPORT_CARD_WORKERS=2)
+class PooledBatchReportCardTests(BatchReportCardTests):
+    """The same exports rendered in the process pool"""
+
+
+class ReportCardCacheTests(ResultsTestBase):
+    def test_pdf_is_cached_revalidated_and_invalidated(self):
+        result = Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                                       term='first', test_score=20, exam_score=50)
+        recompute_summaries(self.session, 'first')
+        summary = ResultSummary.objects.get(pupil=self.pupils[0])
+        url = reverse('summary-pdf', args=[summary.id])
+        self.client.force_authenticate(self.admin)
+
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertTrue(b''.join(first.streaming_content).startswith(b'%PDF'))
+
+        with patch('results.report_cards.render_report_card') as render:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(again.status_code, 304)
+            versioned = self.client.get(url, {'v': etag.strip('"')})
+            self.assertEqual(versioned.status_code, 200)
+            self.assertIn('immutable', versioned['Cache-Control'])
+            render.assert_not_called()
+
+        # Changing a score changes the content hash and replaces the cached file
+        result.exam_score = 60
+        result.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        cache_dir = os.path.join(settings.MEDIA_ROOT, 'report_cards', str(summary.id))
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_pdf_removed_after_lookup_is_rendered_again(self):
+        from results import views
+        from results.report_cards import cached_report_card
+
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=50)
+        recompute_summaries(self.session, 'first')
+        summary = ResultSummary.objects.get(pupil=self.pupils[0])
+
+        def lookup_then_replaced(result_summary):
+            # A concurrent request writes a newer render and removes this one
+            path, key = cached_report_card(result_summary)
+            os.remove(path)
+            return path, key
+
+        self.client.force_authenticate(self.admin)
+        with patch.object(views, 'cached_report_card', lookup_then_replaced):
+            resp = self.client.get(reverse('summary-pdf', args=[summary.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(b''.join(resp.streaming_content).startswith(b'%PDF'))
+
+
+class ReferenceDataCacheTests(ResultsTestBase):
+    def test_active_session_and_teacher_classes_are_cached_and_invalidated(self):
+        refdata.get_active_session()
+        with self.assertNumQueries(0):
+            self.assertEqual(refdata.get_active_session(), self.session)
+        refdata.get_teacher_class_ids(self.teacher.id)
+        refdata.get_subject_class_id(self.maths.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(refdata.get_teacher_class_ids(self.teacher.id), (self.class_a.id,))
+            self.assertEqual(refdata.get_subject_class_id(self.maths.id), self.class_a.id)
+
+        misses = refdata.stats()['misses']
+        self.class_b.assigned_teacher = self.teacher
+        self.class_b.save()
+        self.assertEqual(set(refdata.get_teacher_class_ids(self.teacher.id)), {self.class_a.id, self.class_b.id})
+
+        self.session.is_active = False
+        self.session.save()
+        self.assertIsNone(refdata.get_active_session())
+        self.assertEqual(refdata.stats()['misses'], misses + 2)
+
+    @override_settings(REFDATA_CHECK_SECONDS=60)
+    def test_shared_generation_is_read_once_per_request(self):
+        refdata.get_active_session()
+        checks = refdata.stats()['generation_checks']
+        with patch('backend.refdata.cache.get') as shared_get:
+            for _ in range(3):
+                refdata.get_active_session()
+                refdata.get_teacher_class_ids(self.teacher.id)
+        shared_get.assert_not_called()
+
+        # Another worker changes the data: seen from the next request on
+        AcademicSession.objects.filter(pk=self.session.pk).update(is_active=False)
+        cache.incr(refdata.GENERATION_KEY)
+        self.assertEqual(refdata.get_active_session(), self.session)
+        self.client.force_authenticate(self.admin)
+        self.client.get(reverse('metrics'))
+        self.assertIsNone(refdata.get_active_session())
+        self.assertGreater(refdata.stats()['generation_checks'], checks)
+
+    def test_metrics_endpoint_reports_refdata_counters(self):
+        self.client.force_authenticate(self.admin)
+        resp = self.client.get(reverse('metrics'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('hits', resp.json()['metrics']['refdata'])
+        self.client.force_authenticate(self.teacher)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+
+class ScheduledReleaseTests(ResultsTestBase):
+    def test_due_session_is_released_once_and_broadcast(self):
+        release_date = timezone.now() + timedelta(hours=1)
+        self.session.result_release_date = release_date
+        self.session.save()
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=40)
+
+        self.client.force_authenticate(self.pupils[0])
+        self.assertEqual(self.client.get(reverse('result-my-results')).json(), [])
+        self.assertEqual(release_due_sessions(), [])
+        self.assertEqual(next_release_date(), release_date)
+
+        with patch('results.release.broadcast_update') as broadcast:
+            released = release_due_sessions(now=release_date + timedelta(seconds=1))
+            self.assertEqual(release_due_sessions(now=release_date + timedelta(seconds=2)), [])
+        self.assertEqual([session.id for session in released], [self.session.id])
+        broadcast.assert_called_once()
+        self.assertEqual(broadcast.call_args.args[0], 'results_released')
+        self.assertEqual(broadcast.call_args.args[1]['session_id'], self.session.id)
+
+        self.session.refresh_from_db()
+        self.assertFalse(self.session.results_unlocked)
+        self.assertIsNotNone(self.session.released_at)
+        self.assertIsNone(next_release_date())
+        self.assertFalse(refdata.get_active_session().results_hidden())
+        resp = self.client.get(reverse('result-my-results'), {'session': self.session.id})
+        self.assertEqual(len(resp.json()), 1)
+
+    def test_next_term_release_date_hides_results_again(self):
+        first_release = timezone.now() - timedelta(days=60)
+        self.session.result_release_date = first_release
+        self.session.save()
+        release_due_sessions()
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='second', test_score=20, exam_score=40)
+
+        second_release = timezone.now() + timedelta(days=1)
+        self.session.current_term = 'second'
+        self.session.result_release_date = second_release
+        self.session.save()
+        self.session.refresh_from_db()
+        self.assertFalse(self.session.results_unlocked)
+        self.assertTrue(self.session.results_hidden())
+        self.client.force_authenticate(self.pupils[0])
+        url = reverse('result-my-results')
+        self.assertEqual(self.client.get(url, {'term': 'second'}).json(), [])
+        self.assertEqual(next_release_date(), second_release)
+
+        with patch('results.release.broadcast_update'):
+            released = release_due_sessions(now=second_release + timedelta(seconds=1))
+        self.assertEqual([session.id for session in released], [self.session.id])
+        self.session.refresh_from_db()
+        self.assertFalse(self.session.results_hidden(now=second_release + timedelta(seconds=1)))
+
+    def test_migration_marks_past_release_dates_as_released(self):
+        migration = import_module('results.migrations.0010_academicsession_released_at')
+        past = timezone.now() - timedelta(days=30)
+        future = AcademicSession.objects.create(
+            name='2025/2026', start_date=date(2025, 9, 1), end_date=date(2026, 7, 31),
+            result_release_date=timezone.now() + timedelta(days=1),
+        )
+        AcademicSession.objects.filter(pk=self.session.pk).update(result_release_date=past)
+
+        migration.mark_past_releases_done(django_apps, None)
+        self.session.refresh_from_db()
+        future.refresh_from_db()
+        self.assertEqual(self.session.released_at, past)
+        self.assertIsNone(future.released_at)
+        with patch('results.release.broadcast_update') as broadcast:
+            self.assertEqual(release_due_sessions(), [])
+        broadcast.assert_not_called()
+
+
+class CsvExportTests(ResultsTestBase):
+    def test_exports_stream_scoped_rows(self):
+        for pupil, score in ((self.pupils[0], 60), (self.pupils[1], 40), (self.outsider, 50)):
+            Result.objects.create(pupil=pupil, subject=self.maths, session=self.session,
+                                  term='first', test_score=20, exam_score=score)
+        recompute_summaries(self.session, 'first')
+
+        self.client.force_authenticate(self.teacher)
+        resp = self.client.get(reverse('result-export-csv'), {'session': self.session.id, 'term': 'first'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertIn('results_2024-2025_first.csv', resp['Content-Disposition'])
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('result_id,pupil_id,username'))
+        self.assertEqual(len(lines), 3)
+
+        self.client.force_authenticate(self.admin)
+        resp = self.client.get(reverse('summary-export-csv'), {'class': self.class_a.id})
+        rows = list(csv.DictReader(io.StringIO(b''.join(resp.streaming_content).decode())))
+        self.assertEqual([row['username'] for row in rows], [self.pupils[0].username, self.pupils[1].username])
+        self.assertEqual((rows[0]['average_score'], rows[0]['position']), ('80.00', '1'))
+
+    def test_formula_cells_are_neutralised(self):
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session, term='first',
+                              test_score=20, exam_score=60, teacher_comment='=HYPERLINK("http://x")')
+        self.pupils[0].full_name = '@SUM(A1)'
+        self.pupils[0].save()
+
+        self.client.force_authenticate(self.admin)
+        resp = self.client.get(reverse('result-export-csv'))
+        row = next(csv.DictReader(io.StringIO(b''.join(resp.streaming_content).decode())))
+        self.assertEqual(row['teacher_comment'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(row['full_name'], "'@SUM(A1)")
+        self.assertEqual(row['total'], '80.00')
+
+    def test_streams_asynchronously_under_asgi(self):
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=60)
+        token = str(RefreshToken.for_user(self.admin).access_token)
+
+        async def download():
+            response = await AsyncClient().get(reverse('result-export-csv'), headers={'Authorization': f'Bearer {token}'})
+            return response, [chunk async for chunk in response.streaming_content]
+
+        response, chunks = async_to_sync(download)()
+        self.assertTrue(response.is_async)
+        # The header goes out on its own, ahead of the first batch of rows
+        self.assertEqual(chunks[0].decode().splitlines(), [','.join(header for header, _ in RESULT_EXPORT_COLUMNS)])
+        self.assertEqual(len(b''.join(chunks).decode().splitlines()), 2)
+
+
+class BroadsheetTests(ResultsTestBase):
+    def test_broadsheet_pivots_and_is_invalidated_by_writes(self):
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=60)
+        Result.objects.create(pupil=self.pupils[1], subject=self.english, session=self.session,
+                              term='first', test_score=10, exam_score=40)
+        recompute_summaries(self.session, 'first')
+
+        self.client.force_authenticate(self.teacher)
+        url = reverse('class-broadsheet', args=[self.class_a.id])
+        sheet = self.client.get(url).json()
+        self.assertEqual(sheet['subjects']['name'], ['English', 'Mathematics'])
+        self.assertEqual(sheet['pupils']['id'], [pupil.id for pupil in self.pupils])
+        self.assertEqual(sheet['scores'][str(self.maths.id)]['total'], [80.0, None, None])
+        self.assertEqual(sheet['scores'][str(self.english.id)]['grade'], [None, 'C', None])
+        self.assertEqual(sheet['summary']['position'], [1, 2, None])
+
+        self.client.post(reverse('result-bulk-create'), {
+            'subject': self.maths.id, 'session': self.session.id, 'term': 'first',
+            'results': [{'pupil_id': self.pupils[2].id, 'test_score': 30, 'exam_score': 70}],
+        }, format='json')
+        sheet = self.client.get(url).json()
+        self.assertEqual(sheet['scores'][str(self.maths.id)]['total'], [80.0, None, 100.0])
+        self.assertEqual(sheet['summary']['position'], [2, 3, 1])
+
+        self.client.force_authenticate(self.other_teacher)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(self.pupils[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class AnalyticsTests(ResultsTestBase):
+    def test_subject_and_class_statistics(self):
+        for pupil, exam in zip(self.pupils, (60, 30, 20)):
+            Result.objects.create(pupil=pupil, subject=self.maths, session=self.session,
+                                  term='first', test_score=20, exam_score=exam)
+        Result.objects.create(pupil=self.pupils[0], subject=self.english, session=self.session,
+                              term='first', test_score=30, exam_score=70)
+
+        self.client.force_authenticate(self.admin)
+        url = reverse('result-analytics')
+        data = self.client.get(url, {'term': 'first'}).json()
+        maths = next(row for row in data['subjects'] if row['subject_id'] == self.maths.id)
+        self.assertEqual((maths['count'], maths['mean'], maths['median']), (3, 56.67, 50.0))
+        self.assertEqual((maths['min'], maths['max'], maths['std']), (40.0, 80.0, 17.0))
+        self.assertEqual(maths['pass_rate'], 0.6667)
+        self.assertEqual(maths['grades'], {'A': 1, 'B': 0, 'C': 1, 'D': 0, 'F': 1})
+        self.assertEqual(data['classes'][0]['count'], 4)
+        self.assertEqual(data['classes'][0]['median'], 65.0)
+
+        # Cached until a result in the class changes
+        with self.assertNumQueries(1):
+            self.client.get(url, {'term': 'first'})
+        Result.objects.filter(subject=self.english).get().delete()
+        data = self.client.get(url, {'term': 'first', 'class': self.class_a.id}).json()
+        self.assertEqual([row['subject_id'] for row in data['subjects']], [self.maths.id])
+
+        self.client.force_authenticate(self.other_teacher)
+        self.assertEqual(self.client.get(url, {'class': self.class_a.id}).status_code, 403)
+
+
+class AnnualResultsTests(ResultsTestBase):
+    def test_annual_results_follow_term_writes(self):
+        self.client.force_authenticate(self.admin)
+        for term, exam in (('first', 50), ('second', 60)):
+            self.client.post(reverse('result-bulk-create'), {
+                'subject': self.maths.id, 'session': self.session.id, 'term': term,
+                'results': [
+                    {'pupil_id': self.pupils[0].id, 'test_score': 20, 'exam_score': exam},
+                    {'pupil_id': self.pupils[1].id, 'test_score': 10, 'exam_score': exam},
+                ],
+            }, format='json')
+        english = Result.objects.create(pupil=self.pupils[0], subject=self.english, session=self.session,
+                                        term='first', test_score=25, exam_score=65)
+        self.client.delete(reverse('result-detail', args=[english.id]))
+        third = self.client.post(reverse('result-list'), {
+            'pupil': self.pupils[0].id, 'subject': self.maths.id, 'session': self.session.id,
+            'term': 'third', 'test_score': 30, 'exam_score': 70,
+        }, format='json')
+        self.assertEqual(third.status_code, 201, third.content)
+
+        annual = self.client.get(reverse('annual-summary-list'), {'session': self.session.id}).json()['results']
+        by_pupil = {row['pupil']: row for row in annual}
+        top = by_pupil[self.pupils[0].id]
+        self.assertEqual((top['total_subjects'], top['average_score'], top['position']), (1, 83.33, 1))
+        self.assertEqual(top['results'][0]['first_term'], 70.0)
+        self.assertEqual(top['results'][0]['third_term'], 100.0)
+        self.assertEqual(top['results'][0]['terms_count'], 3)
+        self.assertEqual(by_pupil[self.pupils[1].id]['average_score'], 65.0)
+
+        resp = self.client.get(reverse('annual-summary-pdf', args=[top['id']]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content.startswith(b'%PDF'))
+
+    def test_annual_validator_follows_only_the_nested_results(self):
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=50)
+        refresh_annual(self.session.id)
+        self.client.force_authenticate(self.admin)
+        url = reverse('annual-summary-list')
+        params = {'session': self.session.id}
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.json()['count'], 1)
+        etag = resp['ETag']
+
+        # The pupil's annual results for another session are not nested in this one
+        later = AcademicSession.objects.create(name='2025/2026', start_date=date(2025, 9, 1), end_date=date(2026, 7, 31))
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=later,
+                              term='first', test_score=10, exam_score=40)
+        refresh_annual(later.id)
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # A nested result's subject renamed
+        self.maths.name = 'Maths'
+        self.maths.save()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class GradingScaleTests(ResultsTestBase):
+    def test_scale_change_regrades_stored_rows(self):
+        self.client.force_authenticate(self.admin)
+        self.client.post(reverse('result-bulk-create'), {
+            'subject': self.maths.id, 'session': self.session.id, 'term': 'first',
+            'results': [
+                {'pupil_id': self.pupils[0].id, 'test_score': 20, 'exam_score': 45},
+                {'pupil_id': self.pupils[1].id, 'test_score': 10, 'exam_score': 30},
+            ],
+        }, format='json')
+        self.assertEqual(Result.objects.get(pupil=self.pupils[0]).grade, 'B')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse('grading-scale-list'), {
+                'name': 'Lower primary', 'level': 'GRADE 1', 'a_min': 65, 'b_min': 55, 'c_min': 45, 'd_min': 40,
+            }, format='json')
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(Result.objects.get(pupil=self.pupils[0]).grade, 'A')
+        self.assertEqual(Result.objects.get(pupil=self.pupils[1]).grade, 'D')
+        self.assertEqual(ResultSummary.objects.get(pupil=self.pupils[1]).overall_grade, 'D')
+
+        # New writes use the level's scale too
+        Result.objects.create(pupil=self.pupils[2], subject=self.maths, session=self.session,
+                              term='first', test_score=15, exam_score=40)
+        self.assertEqual(Result.objects.get(pupil=self.pupils[2]).grade, 'B')
+
+        resp = self.client.patch(reverse('grading-scale-detail', args=[resp.json()['id']]),
+                                 {'b_min': 30}, format='json')
+        self.assertEqual(resp.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('grading-scale-detail', args=[GradingScale.objects.get().id]))
+        self.assertEqual(Result.objects.get(pupil=self.pupils[0]).grade, 'B')
+        self.assertEqual(ResultSummary.objects.get(pupil=self.pupils[1]).overall_grade, 'F')
+
+    def test_scale_saved_outside_the_api_regrades_stored_rows(self):
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=45)
+        self.assertEqual(Result.objects.get().grade, 'B')
+
+        # What Django admin does: a plain model save
+        with self.captureOnCommitCallbacks(execute=True):
+            scale = GradingScale.objects.create(name='Lower primary', level='GRADE 1',
+                                                a_min=65, b_min=55, c_min=45, d_min=40)
+        self.assertEqual(Result.objects.get().grade, 'A')
+
+        # Moving the scale to another level regrades the level it left
+        with self.captureOnCommitCallbacks(execute=True):
+            scale.level = 'GRADE 2'
+            scale.save()
+        self.assertEqual(Result.objects.get().grade, 'B')
+
+
+class CursorPaginationTests(ResultsTestBase):
+    def setUp(self):
+        super().setUp()
+        for pupil in self.pupils:
+            for subject in (self.maths, self.english):
+                Result.objects.create(pupil=pupil, subject=subject, session=self.session,
+                                      term='first', test_score=20, exam_score=50)
+
+    def test_cursor_pages_cover_every_result_once(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse('result-list')
+        resp = self.client.get(url, {'cursor': '', 'page_size': 4})
+        self.assertEqual(resp.status_code, 200)
+        first = resp.json()
+        self.assertNotIn('count', first)
+        self.assertEqual(len(first['results']), 4)
+        self.assertIsNone(first['previous'])
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        seen = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(sorted(seen), sorted(Result.objects.values_list('id', flat=True)))
+
+    def test_page_numbers_remain_the_default(self):
+        self.client.force_authenticate(self.admin)
+        resp = self.client.get(reverse('summary-list'), {'page_size': 500})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('count', resp.json())
+
+    def test_custom_actions_paginate_only_on_request(self):
+        self.client.force_authenticate(self.teacher)
+        url = reverse('class-pupils', args=[self.class_a.id])
+        self.assertEqual(len(self.client.get(url).json()), 3)
+        page = self.client.get(url, {'cursor': '', 'page_size': 2}).json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertEqual(len(self.client.get(page['next']).json()['results']), 1)
+
+    def test_tied_carousel_images_are_paged_once_each(self):
+        from media_manager.models import CarouselImage
+        images = [CarouselImage.objects.create(image=f'carousel/{i}.jpg', order=i // 3) for i in range(5)]
+        CarouselImage.objects.update(created_at=timezone.now())
+
+        seen = []
+        page = self.client.get(reverse('carousel-active-images'), {'cursor': '', 'page_size': 2}).json()
+        while True:
+            seen += [row['id'] for row in page['results']]
+            if not page['next']:
+                break
+            page = self.client.get(page['next']).json()
+        self.assertEqual(seen, [images[2].id, images[1].id, images[0].id, images[4].id, images[3].id])
+
+    def test_carousel_cursor_seeks_past_many_equal_orders(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from media_manager.models import CarouselImage
+        images = [CarouselImage.objects.create(image=f'carousel/{i}.jpg', order=i // 20) for i in range(45)]
+        expected = [image.id for image in sorted(images, key=lambda image: (image.order, -image.id))]
+
+        seen, pages = [], []
+        page = self.client.get(reverse('carousel-active-images'), {'cursor': '', 'page_size': 7}).json()
+        while True:
+            pages.append(page)
+            seen += [row['id'] for row in page['results']]
+            if not page['next']:
+                break
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(page['next']).json()
+            # A seek on (order, id), not an OFFSET over the tied rows
+            self.assertNotIn('OFFSET', queries[-1]['sql'].upper())
+        self.assertEqual(seen, expected)
+
+        # Walking back from the last page returns the same pages
+        back = self.client.get(pages[-1]['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], [row['id'] for row in pages[-2]['results']])
+
+
+class ConditionalGetTests(ResultsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.result = Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                                            term='first', test_score=20, exam_score=50)
+        Result.objects.create(pupil=self.pupils[1], subject=self.maths, session=self.session,
+                              term='first', test_score=10, exam_score=40)
+
+    def test_unchanged_list_is_not_modified(self):
+        self.client.force_authenticate(self.teacher)
+        url = reverse('result-list')
+        first = self.client.get(url, {'term': 'first'})
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+
+        again = self.client.get(url, {'term': 'first'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+        # Another user's copy of the same URL never validates
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(url, {'term': 'first'}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+        # Views without a response cache validate with Max(updated_at) and the count
+        users = self.client.get(reverse('user-list'))
+        self.assertIn('Last-Modified', users)
+        self.assertEqual(self.client.get(reverse('user-list'), HTTP_IF_NONE_MATCH=users['ETag']).status_code, 304)
+
+    def test_writes_deletes_and_related_rows_change_the_etag(self):
+        self.client.force_authenticate(self.teacher)
+        url = reverse('result-list')
+        etag = self.client.get(url)['ETag']
+
+        self.maths.name = 'Maths'
+        self.maths.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+        Result.objects.filter(pk=self.result.pk).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 200)
+
+    def test_session_update_fields_refresh_the_validator(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse('session-detail', args=[self.session.id])
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('session-unlock-results', args=[self.session.id]))
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()['results_unlocked'])
+
+    @patch.object(ResultSummaryViewSet, 'cache_actions', ())
+    def test_summary_validator_follows_only_the_nested_results(self):
+        recompute_summaries(self.session, 'first')
+        self.client.force_authenticate(self.admin)
+        url = reverse('summary-list')
+        etag = self.client.get(url, {'term': 'first'})['ETag']
+
+        # A result outside the listed summaries' session/term is not nested in them
+        Result.objects.create(pupil=self.pupils[0], subject=self.english, session=self.session,
+                              term='second', test_score=10, exam_score=40)
+        self.assertEqual(self.client.get(url, {'term': 'first'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # A nested result re-ranked without touching its summary
+        Result.objects.filter(pk=self.result.pk).update(position=2, updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, {'term': 'first'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class PupilResultCacheTests(ResultsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.session.result_release_date = timezone.now() + timedelta(days=1)
+        self.session.save()
+        self.result = Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                                            term='first', test_score=20, exam_score=50)
+        self.client.force_authenticate(self.pupils[0])
+        self.url = reverse('result-my-results')
+
+    def get(self, **headers):
+        return self.client.get(self.url, {'session': self.session.id, 'term': 'first'}, **headers)
+
+    def test_repeat_reads_hit_the_cache_until_a_write(self):
+        from backend.response_cache import stats
+
+        before = stats().get('ResultViewSet:my_results', {'hits': 0})
+        self.assertEqual(self.get().json(), [])  # hidden until release
+        self.session.results_unlocked = True
+        self.session.save()
+        self.assertEqual(len(self.get().json()), 1)
+        with self.assertNumQueries(1):  # the pupil's class
+            cached = self.get()
+        self.assertEqual(cached.json()[0]['total'], 70.0)
+        self.assertEqual(stats()['ResultViewSet:my_results']['hits'], before['hits'] + 1)
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=cached['ETag']).status_code, 304)
+
+        # A classmate's write re-ranks the class, so it invalidates this pupil too
+        Result.objects.create(pupil=self.pupils[1], subject=self.maths, session=self.session,
+                              term='first', test_score=30, exam_score=60)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=cached['ETag']).status_code, 200)
+
+    def test_edits_after_a_class_move_reach_the_new_class(self):
+        self.session.results_unlocked = True
+        self.session.save()
+        PupilProfile.objects.filter(user=self.pupils[0]).update(pupil_class=self.class_b)
+        self.assertEqual(self.get().json()[0]['total'], 70.0)
+        self.client.force_authenticate(self.other_teacher)
+        self.assertEqual(self.client.get(reverse('result-list')).json()['results'][0]['total'], 70.0)
+
+        detail = reverse('result-detail', args=[self.result.id])
+        for exam_score, total in ((15, 35.0), (25, 45.0)):
+            self.client.force_authenticate(self.admin)
+            self.assertEqual(self.client.patch(detail, {'exam_score': exam_score}, format='json').status_code, 200)
+            self.client.force_authenticate(self.pupils[0])
+            self.assertEqual(self.get().json()[0]['total'], total)
+            self.client.force_authenticate(self.other_teacher)
+            self.assertEqual(self.client.get(reverse('result-list')).json()['results'][0]['total'], total)
+
+    def test_summaries_follow_the_release_state(self):
+        recompute_summaries(self.session, 'first', class_id=self.class_a.id)
+        url = reverse('summary-list')
+        self.assertEqual(self.client.get(url, {'term': 'first'}).json()['count'], 0)
+        self.client.force_authenticate(self.admin)
+        self.client.post(reverse('session-unlock-results', args=[self.session.id]))
+        self.client.force_authenticate(self.pupils[0])
+        self.assertEqual(self.client.get(url, {'term': 'first'}).json()['count'], 1)
+
+
+class ResponseCacheTests(ResultsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.other_maths = Subject.objects.create(name='Mathematics', assigned_class=self.class_b,
+                                                  assigned_teacher=self.other_teacher)
+        Result.objects.create(pupil=self.pupils[0], subject=self.maths, session=self.session,
+                              term='first', test_score=20, exam_score=50)
+        Result.objects.create(pupil=self.outsider, subject=self.other_maths, session=self.session,
+                              term='first', test_score=10, exam_score=40)
+
+    def result_ids(self, user):
+        self.client.force_authenticate(user)
+        return sorted(row['pupil'] for row in self.client.get(reverse('result-list')).json()['results'])
+
+    def test_same_url_is_scoped_per_caller(self):
+        self.assertEqual(self.result_ids(self.admin), sorted([self.pupils[0].id, self.outsider.id]))
+        self.assertEqual(self.result_ids(self.teacher), [self.pupils[0].id])
+        self.assertEqual(self.result_ids(self.other_teacher), [self.outsider.id])
+        self.assertEqual(self.result_ids(self.pupils[0]), [self.pupils[0].id])
+
+    def test_writes_and_lock_state_are_visible_immediately(self):
+        self.assertEqual(self.result_ids(self.teacher), [self.pupils[0].id])
+        Result.objects.create(pupil=self.pupils[1], subject=self.maths, session=self.session,
+                              term='first', test_score=15, exam_score=45)
+        self.assertEqual(self.result_ids(self.teacher), sorted([self.pupils[0].id, self.pupils[1].id]))
+
+        self.client.force_authenticate(self.pupils[0])
+        url = reverse('session-active')
+        self.assertFalse(self.client.get(url).json()['results_unlocked'])
+        self.session.results_unlocked = True
+        self.session.save(update_fields=['results_unlocked', 'updated_at'])
+        self.assertTrue(self.client.get(url).json()['results_unlocked'])
+
+    def test_logins_do_not_invalidate_user_names(self):
+        from django.contrib.auth.models import update_last_login
+        from backend import cachetags
+        from results.invalidation import USERS_TAG
+
+        version = cachetags.tag_versions([USERS_TAG])
+        update_last_login(None, self.pupils[0])  # what token logins do with UPDATE_LAST_LOGIN
+        self.assertEqual(cachetags.tag_versions([USERS_TAG]), version)
+        self.pupils[0].full_name = 'Renamed'
+        self.pupils[0].save()
+        self.assertNotEqual(cachetags.tag_versions([USERS_TAG]), version)
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+
+    def backend(self, **options):
+        from backend.cache_backends import SQLiteCache
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_workers_share_entries_and_counters(self):
+        first, second = self.backend(), self.backend()
+        first.set('answer', {'value': 42})
+        self.assertEqual(second.get('answer'), {'value': 42})
+        self.assertTrue(second.add('counter', 1, timeout=None))
+        self.assertFalse(first.add('counter', 5))
+        self.assertEqual(first.incr('counter'), 2)
+        self.assertEqual(second.incr('counter', 3), 5)
+        with self.assertRaises(ValueError):
+            first.incr('missing')
+        second.set('brief', 'x', timeout=0)
+        self.assertIsNone(first.get('brief'))
+        self.assertTrue(first.delete('answer'))
+        self.assertEqual(second.get_many(['answer', 'counter']), {'counter': 5})
+
+    def test_evicts_least_recently_used_by_count_and_size(self):
+        backend = self.backend(MAX_ENTRIES=10, MAX_SIZE=1024 * 1024)
+        for i in range(10):
+            backend.set(f'key{i}', i)
+        with patch('backend.cache_backends.ACCESS_RESOLUTION', 0):
+            backend.get('key0')
+        backend.set('key10', 10)
+        self.assertEqual(backend.get('key0'), 0)
+        self.assertIsNone(backend.get('key1'))
+        self.assertLessEqual(backend.stats()['entries'], 10)
+
+        backend = self.backend(MAX_ENTRIES=1000, MAX_SIZE=4096)
+        for i in range(8):
+            backend.set(f'blob{i}', b'x' * 1000)
+        stats = backend.stats()
+        self.assertLessEqual(stats['size'], 4096)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertIsNotNone(backend.get('blob7'))
+
+
+class RealtimeOutboxTests(TestCase):
+    def test_coalesces_summary_updates_and_duplicates(self):
+        from backend.outbox import coalesce
+        staff = ('role.admin', 'class.1.teacher')
+
+        def summary(pupil_id, term='First Term'):
+            payload = {'action': 'calculate', 'pupil_id': pupil_id, 'session_id': 5, 'term': term, 'summary_id': pupil_id + 10}
+            return ('summary_update', payload, staff + (f'pupil.{pupil_id}',))
+
+        score = ('score_update', {'action': 'update', 'result_id': 3}, staff + ('pupil.1',))
+        events = [summary(1), score, summary(2), score, summary(1, 'Second Term')]
+        self.assertEqual(coalesce(events), [
+            ('summary_update', {
+                'action': 'calculate', 'session_id': 5, 'term': 'First Term',
+                'pupil_ids': [1, 2], 'summary_ids': [11, 12],
+            }, staff),
+            # Each pupil still only hears about their own summary
+            ('summary_update', events[0][1], ('pupil.1',)),
+            ('summary_update', events[2][1], ('pupil.2',)),
+            score,
+            events[4],
+        ])
+
+    @override_settings(REALTIME_OUTBOX_WINDOW_MS=20)
+    def test_background_publish_batches_a_burst(self):
+        import asyncio
+        from backend.outbox import Outbox
+
+        box = Outbox()
+        publish = AsyncMock()
+
+        async def burst():
+            box.ensure_started()
+            for pupil_id in range(1, 51):
+                box.enqueue('summary_update', {
+                    'action': 'calculate', 'pupil_id': pupil_id, 'session_id': 1,
+                    'term': 'First Term', 'summary_id': pupil_id,
+                }, ('role.admin', 'class.1.teacher'))
+            self.assertEqual(box.stats()['depth'], 50)
+            await asyncio.sleep(0.2)
+            box._task.cancel()
+
+        with patch('backend.realtime.publish', publish):
+            asyncio.run(burst())
+
+        publish.assert_awaited_once()
+        [(event_type, payload, topics)] = publish.await_args.args[0]
+        self.assertEqual(payload['pupil_ids'], list(range(1, 51)))
+        stats = box.stats()
+        self.assertEqual((stats['depth'], stats['enqueued'], stats['published'], stats['messages']), (0, 50, 50, 1))
+        self.assertIn('p95', stats['latency_ms'])
+
+    def test_publishes_synchronously_without_a_running_outbox(self):
+        from backend.outbox import Outbox
+
+        box = Outbox()
+        publish = AsyncMock()
+        with patch('backend.realtime.publish', publish):
+            box.enqueue('class_update', {'action': 'update', 'class_id': 1}, ['role.admin'])
+        publish.assert_awaited_once_with([('class_update', {'action': 'update', 'class_id': 1}, ('role.admin',))])
+        self.assertEqual(box.stats()['fallbacks'], 1)
+
+
+class RealtimeTopicTests(ResultsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.session.is_active = True
+        self.session.save()
+
+    def test_topics_follow_role_class_pupil_and_session(self):
+        from backend.topics import topics_for_user
+        session = f'session.{self.session.id}'
+        self.assertEqual(topics_for_user(self.admin), {'role.admin'})
+        self.assertEqual(
+            topics_for_user(self.teacher), {'role.teacher', session, f'class.{self.class_a.id}.teacher'}
+        )
+        self.assertEqual(
+            topics_for_user(self.pupils[0]),
+            {'role.pupil', session, f'pupil.{self.pupils[0].id}', f'class.{self.class_a.id}.pupil'},
+        )
+        self.assertEqual(topics_for_user(self.pupils[0], session_id=99) & {session, 'session.99'}, {'session.99'})
+
+    def test_score_updates_reach_only_the_class_teacher_and_the_pupil(self):
+        self.client.force_authenticate(self.teacher)
+        with patch('backend.outbox.outbox.enqueue') as enqueue, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('result-list'), {
+                'pupil': self.pupils[0].id, 'subject': self.maths.id, 'session': self.session.id,
+                'term': 'first', 'test_score': 20, 'exam_score': 50,
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        sent = {call.args[0]: call.args[2] for call in enqueue.call_args_list}
+        expected = ('role.admin', f'class.{self.class_a.id}.teacher', f'pupil.{self.pupils[0].id}')
+        self.assertEqual(sent['score_update'], expected)
+        self.assertEqual(sent['summary_update'], expected)
+
+    @override_settings(RESULT_RELEASE_SCHEDULER=False, REALTIME_OUTBOX=False)
+    def test_websocket_requires_a_token_and_joins_the_users_topics(self):
+        import asyncio
+        from channels.testing import WebsocketCommunicator
+        from rest_framework_simplejwt.tokens import AccessToken
+        from backend.asgi import application
+        from backend.consumers import UpdateConsumer
+        from backend.realtime import publish
+
+        # Topics are looked up on another thread, which cannot see this test's uncommitted rows
+        teacher_topics = {'role.teacher', f'class.{self.class_a.id}.teacher'}
+        pupil_topics = {'role.pupil', f'pupil.{self.pupils[0].id}'}
+
+        async def scenario():
+            anonymous = WebsocketCommunicator(application, '/ws/updates/')
+            connected, code = await anonymous.connect()
+            self.assertEqual((connected, code), (False, 4401))
+
+            sockets = {}
+            for user, topics in ((self.teacher, teacher_topics), (self.outsider, pupil_topics)):
+                with patch('backend.consumers.topics_for_user', return_value=topics), \
+                        patch('backend.ws_auth.JWTAuthentication.get_user', return_value=user):
+                    socket = WebsocketCommunicator(application, f'/ws/updates/?token={AccessToken.for_user(user)}')
+                    connected, _ = await socket.connect()
+                    self.assertTrue(connected)
+                    sockets[user.role] = socket
+
+            await publish([('score_update', {'result_id': 1}, (f'class.{self.class_a.id}.teacher',))])
+            message = await sockets['teacher'].receive_json_from()
+            self.assertIsInstance(message.pop('seq'), int)
+            self.assertEqual(message, {'type': 'score_update', 'payload': {'result_id': 1}})
+            self.assertTrue(await sockets['pupil'].receive_nothing())
+            for socket in sockets.values():
+                await socket.disconnect()
+            self.assertEqual(UpdateConsumer.subscribers, {})
+
+        asyncio.run(scenario())
+
+    @override_settings(RESULT_RELEASE_SCHEDULER=False, REALTIME_OUTBOX=False)
+    def test_level_event_reaches_a_two_class_teacher_once_over_layer_groups(self):
+        import asyncio
+        from channels.testing import WebsocketCommunicator
+        from rest_framework_simplejwt.tokens import AccessToken
+        from backend import topics
+        from backend.asgi import application
+        from backend.realtime import publish
+
+        Class.objects.filter(pk=self.class_b.pk).update(assigned_teacher=self.teacher)
+        refdata.invalidate()
+        teacher_topics = topics.topics_for_user(self.teacher)
+        audience = topics.level_audience('GRADE 1')
+        self.assertEqual(len(teacher_topics & set(audience)), 2)
+
+        async def scenario():
+            with patch('backend.consumers.topics_for_user', return_value=teacher_topics), \
+                    patch('backend.ws_auth.JWTAuthentication.get_user', return_value=self.teacher):
+                socket = WebsocketCommunicator(application, f'/ws/updates/?token={AccessToken.for_user(self.teacher)}')
+                connected, _ = await socket.connect()
+                self.assertTrue(connected)
+
+            await publish([('summary_update', {'action': 'recompute', 'level': 'GRADE 1'}, tuple(audience))])
+            message = await socket.receive_json_from()
+            self.assertEqual(message['payload'], {'action': 'recompute', 'level': 'GRADE 1'})
+            self.assertTrue(await socket.receive_nothing())
+            await socket.disconnect()
+
+        # Deliver through channel-layer groups, as with Redis
+        with patch('backend.consumers.uses_layer_groups', return_value=True):
+            asyncio.run(scenario())
+
+
+class EventLogTests(ResultsTestBase):
+    def record_updates(self):
+        from backend import eventlog
+        return eventlog.record([
+            ('score_update', {'result_id': 1}, ('role.admin', 'class.1.teacher', 'pupil.5')),
+            ('class_update', {'class_id': 2}, ('role.admin', 'class.2.pupil')),
+            ('score_update', {'result_id': 3}, ('role.admin', 'class.1.teacher', 'pupil.6')),
+        ])
+
+    def test_replays_missed_updates_for_the_clients_topics(self):
+        from backend import eventlog
+        start = eventlog.latest_seq()
+        events = self.record_updates()
+        self.assertEqual([event[0] for event in events], [start + 1, start + 2, start + 3])
+
+        self.assertEqual(eventlog.missed(start, {'pupil.5', 'class.1.pupil'}), events[:1])
+        self.assertEqual(eventlog.missed(start + 1, {'role.teacher', 'class.1.teacher'}), events[2:])
+        self.assertEqual(eventlog.missed(start + 3, {'role.admin'}), [])
+        # Ahead of the counter (it was reset), or too many to replay: reload instead
+        self.assertIsNone(eventlog.missed(start + 10, {'role.admin'}))
+        with self.settings(REALTIME_REPLAY_LIMIT=2):
+            self.assertIsNone(eventlog.missed(start, {'role.admin'}))
+
+    def test_falls_back_to_the_persisted_log(self):
+        from collections import deque
+        from backend import eventlog
+        from .models import RealtimeEvent
+
+        with self.settings(REALTIME_EVENT_LOG_PERSIST=True):
+            start = eventlog.latest_seq()
+            self.record_updates()
+            self.assertEqual(RealtimeEvent.objects.count(), 3)
+            # Not in this worker's buffer (e.g. published by another worker)
+            with patch('backend.eventlog._buffer', deque()):
+                replay = eventlog.missed(start, {'class.2.pupil'})
+        self.assertEqual(replay, [(start + 2, 'class_update', {'class_id': 2}, ('role.admin', 'class.2.pupil'))])
+        with patch('backend.eventlog._buffer', deque()):
+            self.assertIsNone(eventlog.missed(start, {'class.2.pupil'}))
+
+    @override_settings(RESULT_RELEASE_SCHEDULER=False, REALTIME_OUTBOX=False)
+    def test_reconnecting_socket_resumes_from_since(self):
+        import asyncio
+        from channels.testing import WebsocketCommunicator
+        from rest_framework_simplejwt.tokens import AccessToken
+        from backend import eventlog
+        from backend.asgi import application
+
+        start = eventlog.latest_seq()
+        events = self.record_updates()
+
+        async def connect(since):
+            with patch('backend.consumers.topics_for_user', return_value={'role.teacher', 'class.1.teacher'}), \
+                    patch('backend.ws_auth.JWTAuthentication.get_user', return_value=self.teacher):
+                socket = WebsocketCommunicator(
+                    application, f'/ws/updates/?token={AccessToken.for_user(self.teacher)}&since={since}'
+                )
+                connected, _ = await socket.connect()
+                self.assertTrue(connected)
+                return socket
+
+        async def scenario():
+            socket = await connect(start)
+            replayed = [await socket.receive_json_from(), await socket.receive_json_from()]
+            self.assertEqual([message['seq'] for message in replayed], [events[0][0], events[2][0]])
+            self.assertTrue(await socket.receive_nothing())
+            await socket.disconnect()
+
+            socket = await connect(start + 100)
+            self.assertEqual((await socket.receive_json_from())['type'], 'resync')
+            await socket.disconnect()
+
+        asyncio.run(scenario())
+
+
+class WebsocketFanOutTests(TestCase):
+    @override_settings(REALTIME_SEND_QUEUE_SIZE=2, REALTIME_SEND_TIMEOUT_SECONDS=0.05)
+    def test_encodes_once_delivers_once_and_drops_slow_clients(self):
+        import asyncio
+        import json
+        from backend.consumers import RecentSeqs, UpdateConsumer
+        from backend.realtime import publish
+
+        class Client(UpdateConsumer):
+            def __init__(self, topics, stalled=False):
+                super().__init__()
+                self.channel_layer = None
+                self.session_id = None
+                self.last_seq = 0
+                self.sent_seqs = RecentSeqs()
+                self.stalled = stalled
+                self.frames = []
+                self.closed_with = None
+                self.wanted_topics = set(topics)
+
+            async def base_send(self, message):
+                if self.stalled:
+                    await asyncio.Event().wait()
+                self.frames.append(message['text'])
+
+            async def close(self, code=None):
+                self.closed_with = code
+
+        async def scenario():
+            clients = [
+                Client({'role.teacher', 'class.1.teacher'}), Client({'role.pupil'}), Client({'role.teacher'}, stalled=True),
+            ]
+            for client in clients:
+                client.topics, client.dropped = set(), False
+                client.outgoing = asyncio.Queue(maxsize=2)
+                await client.update_topics(client.wanted_topics)
+                client.writer = asyncio.ensure_future(client._write())
+
+            with patch('backend.eventlog.json.dumps', wraps=json.dumps) as dumps:
+                await publish([('score_update', {'result_id': 1}, ('role.teacher', 'class.1.teacher'))])
+            self.assertEqual(dumps.call_count, 1)
+            await asyncio.sleep(0.2)
+
+            teacher, pupil, stalled = clients
+            self.assertEqual([json.loads(frame)['payload'] for frame in teacher.frames], [{'result_id': 1}])
+            self.assertEqual(pupil.frames, [])
+            self.assertTrue(stalled.dropped)
+            self.assertEqual(stalled.closed_with, 4408)
+            self.assertNotIn(stalled, UpdateConsumer.subscribers.get('role.teacher', ()))
+
+            # A client that stops draining its queue is dropped without blocking the publisher
+            teacher.outgoing = asyncio.Queue(maxsize=2)
+            teacher.writer.cancel()
+            for i in range(3):
+                UpdateConsumer.broadcast_to_topics(['class.1.teacher'], f'"frame {i}"')
+            await asyncio.sleep(0)
+            self.assertTrue(teacher.dropped)
+
+            for client in clients:
+                client.writer.cancel()
+                await client.update_topics(set())
+
+        asyncio.run(scenario())
+
+
+@patch('results.changes.SETTLE', timedelta(0))
+class ChangesTests(ResultsTestBase):
+    def changes(self, user, cursor=None):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse('changes'), {'cursor': cursor} if cursor else {})
+
+    def test_returns_scoped_changes_and_deletions_since_the_cursor(self):
+        cursors = {user.id: self.changes(user).data['cursor'] for user in (self.admin, self.pupils[0], self.outsider)}
+        result = Result.objects.create(
+            pupil=self.pupils[0], subject=self.maths, session=self.session, term='first',
+            test_score=20, exam_score=50,
+        )
+        self.maths.name = 'Maths'
+        self.maths.save()
+
+        admin = self.changes(self.admin, cursors[self.admin.id]).data
+        self.assertEqual([row['id'] for row in admin['changes']['results']], [result.id])
+        self.assertEqual([row['id'] for row in admin['changes']['subjects']], [self.maths.id])
+        self.assertNotIn('classes', admin['changes'])
+        pupil = self.changes(self.pupils[0], cursors[self.pupils[0].id]).data
+        self.assertEqual([row['id'] for row in pupil['changes']['results']], [result.id])
+        outsider = self.changes(self.outsider, cursors[self.outsider.id]).data
+        self.assertEqual(outsider['changes'], {})
+
+        # Nothing new since the returned cursor
+        self.assertEqual(self.changes(self.admin, admin['cursor']).data['changes'], {})
+
+        result_id = result.id
+        result.delete()
+        self.assertEqual(self.changes(self.admin, admin['cursor']).data['deleted'], {'results': [result_id]})
+        self.assertEqual(self.changes(self.pupils[0], pupil['cursor']).data['deleted'], {'results': [result_id]})
+        self.assertEqual(self.changes(self.outsider, outsider['cursor']).data['deleted'], {})
+
+    def test_pages_through_large_backlogs(self):
+        cursor = self.changes(self.admin).data['cursor']
+        for subject in (self.maths, self.english):
+            subject.save()
+        seen = []
+        with patch('results.changes.PAGE_SIZE', 1):
+            while True:
+                data = self.changes(self.admin, cursor).data
+                seen += [row['id'] for row in data['changes'].get('subjects', [])]
+                cursor = data['cursor']
+                if not data['has_more']:
+                    break
+        self.assertEqual(sorted(seen), sorted([self.maths.id, self.english.id]))
+
+    def test_cursor_must_be_resynced_when_visibility_changes(self):
+        cursor = self.changes(self.pupils[0]).data['cursor']
+        self.session.is_active = True
+        self.session.result_release_date = timezone.now() + timedelta(days=1)
+        self.session.save()
+        response = self.changes(self.pupils[0], cursor)
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['resync'])
+        self.assertEqual(self.changes(self.pupils[0], 'not-a-cursor').status_code, 400)
@@ -1,12 +1,19 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ResultViewSet, AcademicSessionViewSet, ResultSummaryViewSet
+from .views import (
+    ResultViewSet, AcademicSessionViewSet, ResultSummaryViewSet, AnnualSummaryViewSet,
+    GradingScaleViewSet
+)
+from .changes import changes_view
 
 router = DefaultRouter()
 router.register(r'results', ResultViewSet, basename='result')
 router.register(r'sessions', AcademicSessionViewSet, basename='session')
 router.register(r'summaries', ResultSummaryViewSet, basename='summary')
+router.register(r'annual-summaries', AnnualSummaryViewSet, basename='annual-summary')
+router.register(r'grading-scales', GradingScaleViewSet, basename='grading-scale')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('changes/', changes_view, name='changes'),
 ]
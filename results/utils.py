@@ -9,17 +9,86 @@ from django.conf import settings
 import os
 
 
-def generate_result_pdf(result_summary):
+def ordinal(position):
+    """Format a position as 1st, 2nd, 3rd, 11th, ... (blank when unranked)"""
+    if not position:
+        return '-'
+    if 10 <= position % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(position % 10, 'th')
+    return f"{position}{suffix}"
+
+
+def get_logo_path():
+    """Return the filesystem path of the school logo, or None if there is none"""
+    try:
+        from media_manager.models import SchoolLogo
+        logo = SchoolLogo.objects.first()
+        if logo and logo.logo:
+            logo_path = os.path.join(settings.MEDIA_ROOT, str(logo.logo))
+            if os.path.exists(logo_path):
+                return logo_path
+    except:
+        pass
+    return None
+
+
+def report_card_filename(result_summary):
+    return f"Result_{result_summary.pupil.username}_{result_summary.term}_{result_summary.session.name.replace('/', '-')}.pdf"
+
+
+def report_card_context(result_summary, results=None, logo_path=None):
     """
-    Generate a PDF result sheet for a pupil
+    Collect everything a report card needs into plain, picklable values so
+    rendering needs no database access (and can run in a worker process).
+
+    ``results`` may be passed in pre-fetched (with ``subject`` selected);
+    otherwise they are loaded for the summary's pupil, session and term.
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Define styles
+    pupil = result_summary.pupil
+    try:
+        pupil_class = pupil.pupil_profile.pupil_class.name
+    except:
+        pupil_class = "N/A"
+
+    if results is None:
+        from .models import Result
+        results = Result.objects.filter(
+            pupil=pupil,
+            session=result_summary.session,
+            term=result_summary.term
+        ).select_related('subject').order_by('subject__name')
+
+    return {
+        'filename': report_card_filename(result_summary),
+        'logo_path': logo_path,
+        'pupil_name': pupil.full_name,
+        'pupil_username': pupil.username,
+        'pupil_class': pupil_class,
+        'session_name': result_summary.session.name,
+        'term_display': result_summary.get_term_display(),
+        'position': result_summary.position,
+        'total_subjects': result_summary.total_subjects,
+        'average_score': result_summary.average_score,
+        'overall_grade': result_summary.overall_grade,
+        'teacher_comment': result_summary.teacher_comment,
+        'principal_comment': result_summary.principal_comment,
+        'results': [
+            {
+                'subject': result.subject.name,
+                'test_score': result.test_score,
+                'exam_score': result.exam_score,
+                'total': result.total,
+                'grade': result.grade,
+                'position': result.position,
+            }
+            for result in results
+        ],
+    }
+
+
+def _report_card_styles():
     styles = getSampleStyleSheet()
     title_style = ParagraphStyle(
         'CustomTitle',
@@ -30,49 +99,33 @@ def generate_result_pdf(result_summary):
         alignment=TA_CENTER,
         fontName='Helvetica-Bold'
     )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=8,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    normal_style = styles['Normal']
-    
+    return title_style, styles['Normal']
+
+
+def _header_elements(context, title_style, term_label='Term:', term_value=None):
+    """Logo, school name and the pupil information table"""
+    elements = []
+
     # Add school logo if exists
-    try:
-        from media_manager.models import SchoolLogo
-        logo = SchoolLogo.objects.first()
-        if logo and logo.logo:
-            logo_path = os.path.join(settings.MEDIA_ROOT, str(logo.logo))
-            if os.path.exists(logo_path):
-                img = Image(logo_path, width=1*inch, height=1*inch)
-                elements.append(img)
-                elements.append(Spacer(1, 12))
-    except:
-        pass
-    
+    if context['logo_path']:
+        try:
+            img = Image(context['logo_path'], width=1*inch, height=1*inch)
+            elements.append(img)
+            elements.append(Spacer(1, 12))
+        except:
+            pass
+
     # School name (customized) and spacing
     elements.append(Paragraph("University of Nigeria Primary School Nsukka", title_style))
     elements.append(Spacer(1, 12))
-    
+
     # Pupil information
-    pupil = result_summary.pupil
-    try:
-        pupil_class = pupil.pupil_profile.pupil_class.name
-    except:
-        pupil_class = "N/A"
-    
     pupil_info = [
-        ['Pupil Name:', pupil.full_name, 'Class:', pupil_class],
-        ['Pupil ID:', pupil.username, 'Session:', result_summary.session.name],
-        ['Term:', result_summary.get_term_display(), '', ''],
+        ['Pupil Name:', context['pupil_name'], 'Class:', context['pupil_class']],
+        ['Pupil ID:', context['pupil_username'], 'Session:', context['session_name']],
+        [term_label, term_value or context['term_display'], 'Position:', ordinal(context['position'])],
     ]
-    
+
     pupil_table = Table(pupil_info, colWidths=[2*inch, 2.5*inch, 1.5*inch, 2*inch])
     pupil_table.setStyle(TableStyle([
         ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
@@ -82,53 +135,14 @@ def generate_result_pdf(result_summary):
         ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
     ]))
-    
+
     elements.append(pupil_table)
     elements.append(Spacer(1, 20))
-    
-    # Results table
-    from .models import Result
-    results = Result.objects.filter(
-        pupil=pupil,
-        session=result_summary.session,
-        term=result_summary.term
-    ).order_by('subject__name')
-    
-    # Table headers
-    result_data = [
-        ['S/N', 'Subject', 'Test (30)', 'Exam (70)', 'Total (100)', 'Grade', 'Remark']
-    ]
-    
-    # Add results
-    for idx, result in enumerate(results, 1):
-        remark = 'Excellent' if result.grade == 'A' else \
-                'Very Good' if result.grade == 'B' else \
-                'Good' if result.grade == 'C' else \
-                'Pass' if result.grade == 'D' else 'Fail'
-        
-        result_data.append([
-            str(idx),
-            result.subject.name,
-            f"{result.test_score:.2f}",
-            f"{result.exam_score:.2f}",
-            f"{result.total:.2f}",
-            result.grade,
-            remark
-        ])
-    
-    # Add summary row
-    result_data.append(['', '', '', '', '', '', ''])
-    result_data.append([
-        '', 
-        'TOTAL SUBJECTS:', 
-        str(result_summary.total_subjects), 
-        'AVERAGE:', 
-        f"{result_summary.average_score:.2f}",
-        'GRADE:',
-        result_summary.overall_grade
-    ])
-    
-    result_table = Table(result_data, colWidths=[0.5*inch, 2.5*inch, 1*inch, 1*inch, 1*inch, 0.8*inch, 1.2*inch])
+    return elements
+
+
+def _results_table(result_data, col_widths):
+    result_table = Table(result_data, colWidths=col_widths)
     result_table.setStyle(TableStyle([
         # Header row
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4A90E2')),
@@ -137,50 +151,206 @@ def generate_result_pdf(result_summary):
         ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
         ('FONTSIZE', (0, 0), (-1, 0), 11),
         ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        
+
         # Data rows
         ('FONT', (0, 1), (-1, -3), 'Helvetica', 9),
         ('ALIGN', (0, 1), (0, -1), 'CENTER'),
         ('ALIGN', (2, 1), (-1, -1), 'CENTER'),
         ('GRID', (0, 0), (-1, -3), 0.5, colors.grey),
         ('ROWBACKGROUNDS', (0, 1), (-1, -3), [colors.white, colors.HexColor('#F5F5F5')]),
-        
+
         # Summary row
         ('FONT', (1, -1), (-1, -1), 'Helvetica-Bold', 10),
         ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#E8F4F8')),
         ('ALIGN', (1, -1), (-1, -1), 'LEFT'),
     ]))
-    
-    elements.append(result_table)
-    elements.append(Spacer(1, 30))
-    
-    # Comments section
-    if result_summary.teacher_comment:
-        elements.append(Paragraph(f"<b>Class Teacher's Comment:</b> {result_summary.teacher_comment}", normal_style))
-        elements.append(Spacer(1, 12))
-    
-    if result_summary.principal_comment:
-        elements.append(Paragraph(f"<b>Principal's Comment:</b> {result_summary.principal_comment}", normal_style))
-        elements.append(Spacer(1, 12))
-    
-    # Signature section
-    elements.append(Spacer(1, 30))
+    return result_table
+
+
+def _remark(grade):
+    return 'Excellent' if grade == 'A' else \
+            'Very Good' if grade == 'B' else \
+            'Good' if grade == 'C' else \
+            'Pass' if grade == 'D' else 'Fail'
+
+
+def _signature_elements():
+    elements = [Spacer(1, 30)]
     signature_data = [
         ['_____________________', '', '_____________________'],
         ["Class Teacher's Signature", '', "Principal's Signature"],
     ]
-    
+
     signature_table = Table(signature_data, colWidths=[2.5*inch, 2*inch, 2.5*inch])
     signature_table.setStyle(TableStyle([
         ('FONT', (0, 1), (-1, 1), 'Helvetica-Bold', 9),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
         ('VALIGN', (0, 0), (-1, -1), 'TOP'),
     ]))
-    
+
     elements.append(signature_table)
-    
-    # Build PDF
+    return elements
+
+
+def _report_card_elements(context):
+    """Build the reportlab flowables for one report card"""
+    title_style, normal_style = _report_card_styles()
+    elements = _header_elements(context, title_style)
+
+    # Table headers
+    result_data = [
+        ['S/N', 'Subject', 'Test (30)', 'Exam (70)', 'Total (100)', 'Grade', 'Pos.', 'Remark']
+    ]
+
+    # Add results
+    for idx, result in enumerate(context['results'], 1):
+        result_data.append([
+            str(idx),
+            result['subject'],
+            f"{result['test_score']:.2f}",
+            f"{result['exam_score']:.2f}",
+            f"{result['total']:.2f}",
+            result['grade'],
+            ordinal(result['position']),
+            _remark(result['grade'])
+        ])
+
+    # Add summary row
+    result_data.append(['', '', '', '', '', '', '', ''])
+    result_data.append([
+        '',
+        'TOTAL SUBJECTS:',
+        str(context['total_subjects']),
+        'AVERAGE:',
+        f"{context['average_score']:.2f}",
+        'GRADE:',
+        context['overall_grade'],
+        ''
+    ])
+
+    elements.append(_results_table(
+        result_data, [0.5*inch, 2.1*inch, 1*inch, 1*inch, 1*inch, 0.8*inch, 0.6*inch, 1*inch]
+    ))
+    elements.append(Spacer(1, 30))
+
+    # Comments section
+    if context['teacher_comment']:
+        elements.append(Paragraph(f"<b>Class Teacher's Comment:</b> {context['teacher_comment']}", normal_style))
+        elements.append(Spacer(1, 12))
+
+    if context['principal_comment']:
+        elements.append(Paragraph(f"<b>Principal's Comment:</b> {context['principal_comment']}", normal_style))
+        elements.append(Spacer(1, 12))
+
+    elements.extend(_signature_elements())
+    return elements
+
+
+def annual_report_card_context(annual_summary, results=None, logo_path=None):
+    """Plain, picklable context for an annual (three-term) report card"""
+    pupil = annual_summary.pupil
+    try:
+        pupil_class = pupil.pupil_profile.pupil_class.name
+    except:
+        pupil_class = "N/A"
+
+    if results is None:
+        from .models import AnnualResult
+        results = AnnualResult.objects.filter(
+            pupil=pupil, session=annual_summary.session
+        ).select_related('subject').order_by('subject__name')
+
+    return {
+        'filename': f"Annual_Result_{pupil.username}_{annual_summary.session.name.replace('/', '-')}.pdf",
+        'logo_path': logo_path,
+        'pupil_name': pupil.full_name,
+        'pupil_username': pupil.username,
+        'pupil_class': pupil_class,
+        'session_name': annual_summary.session.name,
+        'term_display': 'Annual',
+        'position': annual_summary.position,
+        'total_subjects': annual_summary.total_subjects,
+        'average_score': annual_summary.average_score,
+        'overall_grade': annual_summary.overall_grade,
+        'results': [
+            {
+                'subject': result.subject.name,
+                'first_term': result.first_term,
+                'second_term': result.second_term,
+                'third_term': result.third_term,
+                'annual_average': result.annual_average,
+                'grade': result.grade,
+            }
+            for result in results
+        ],
+    }
+
+
+def _annual_report_card_elements(context):
+    """Reportlab flowables for an annual report card: each term's total and the annual average per subject"""
+    title_style, _ = _report_card_styles()
+    elements = _header_elements(context, title_style, term_label='Report:', term_value='Annual (three terms)')
+
+    def score(value):
+        return '-' if value is None else f"{value:.2f}"
+
+    result_data = [
+        ['S/N', 'Subject', '1st Term', '2nd Term', '3rd Term', 'Average', 'Grade', 'Remark']
+    ]
+    for idx, result in enumerate(context['results'], 1):
+        result_data.append([
+            str(idx),
+            result['subject'],
+            score(result['first_term']),
+            score(result['second_term']),
+            score(result['third_term']),
+            score(result['annual_average']),
+            result['grade'],
+            _remark(result['grade'])
+        ])
+
+    result_data.append(['', '', '', '', '', '', '', ''])
+    result_data.append([
+        '',
+        'TOTAL SUBJECTS:',
+        str(context['total_subjects']),
+        'AVERAGE:',
+        f"{context['average_score']:.2f}",
+        'GRADE:',
+        context['overall_grade'],
+        ''
+    ])
+
+    elements.append(_results_table(
+        result_data, [0.5*inch, 2.1*inch, 0.9*inch, 0.9*inch, 0.9*inch, 0.9*inch, 0.6*inch, 1*inch]
+    ))
+    elements.append(Spacer(1, 30))
+    elements.extend(_signature_elements())
+    return elements
+
+
+def _build_document(fileobj, elements):
+    doc = SimpleDocTemplate(fileobj, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
     doc.build(elements)
-    
-    buffer.seek(0)
-    return buffer
+
+
+def render_report_card(context):
+    """Render one report card context to PDF bytes (no database access)"""
+    buffer = BytesIO()
+    _build_document(buffer, _report_card_elements(context))
+    return buffer.getvalue()
+
+
+def render_annual_report_card(context):
+    """Render an annual report card context to PDF bytes"""
+    buffer = BytesIO()
+    _build_document(buffer, _annual_report_card_elements(context))
+    return buffer.getvalue()
+
+
+def generate_result_pdf(result_summary):
+    """
+    Generate a PDF result sheet for a pupil
+    """
+    context = report_card_context(result_summary, logo_path=get_logo_path())
+    return BytesIO(render_report_card(context))
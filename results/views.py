@@ -1,24 +1,84 @@
+import csv
+import io
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
-from django.http import HttpResponse
-from django.db.models import Q
-from django.utils import timezone
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
-from .models import Result, AcademicSession, ResultSummary
+from rest_framework.parsers import MultiPartParser, FormParser
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Q
+from django.shortcuts import get_object_or_404
+from .models import (
+    Result, AcademicSession, ResultSummary, AnnualResult, AnnualSummary, GradingScale, boundaries_for_class
+)
 from .serializers import (
     ResultSerializer, ResultCreateSerializer, AcademicSessionSerializer,
-    ResultSummarySerializer, BulkResultCreateSerializer
+    ResultSummarySerializer, BulkResultCreateSerializer, ResultImportSerializer,
+    AnnualSummarySerializer, GradingScaleSerializer
 )
 from accounts.permissions import IsAdmin, IsAdminOrTeacher, IsPupil
-from .utils import generate_result_pdf
+from .utils import (
+    report_card_filename, annual_report_card_context,
+    render_annual_report_card, get_logo_path
+)
+from .annual import refresh_annual, recompute_annual
+from .report_cards import (
+    iter_report_card_contexts, render_report_cards, stream_report_cards_zip, stream_merged_report_cards,
+    cached_report_card, open_report_card
+)
+from .services import (
+    bulk_upsert_results, import_results_csv, refresh_summaries, recompute_summaries,
+    refresh_class_positions, refresh_subject_positions
+)
+from .release import broadcast_results_released
+from .invalidation import SESSIONS_TAG, invalidate_results, scoped_results_tags
+from .analytics import cached_statistics
+from .exports import RESULT_EXPORT_COLUMNS, SUMMARY_EXPORT_COLUMNS, csv_export_response, export_filename
 from backend.realtime import broadcast_update
+from backend import topics
+from backend import refdata
+from backend.conditional import ConditionalGetMixin
+from backend.response_cache import CachedResponseMixin
+from backend.pagination import OptInCursorPagination, paginate_action
+from backend.streaming import streaming_response
 
 
-class AcademicSessionViewSet(viewsets.ModelViewSet):
+def _export_queryset(request, queryset, prefix):
+    """Apply the common ?session=&term=&class=&subject= export filters; returns (queryset, filename)"""
+    params = request.query_params
+    session_id = params.get('session')
+    term = params.get('term')
+    if session_id:
+        queryset = queryset.filter(session_id=session_id)
+    if term:
+        queryset = queryset.filter(term=term)
+    if params.get('class'):
+        queryset = queryset.filter(pupil__pupil_profile__pupil_class_id=params['class'])
+    if params.get('subject'):
+        queryset = queryset.filter(subject_id=params['subject'])
+    session = AcademicSession.objects.filter(id=session_id).first() if session_id else None
+    return queryset, export_filename(prefix, session.name if session else None, term)
+
+
+def _results_changed(session_id, term, pupil_ids, subject_ids=()):
+    """
+    Re-rank the class and subject partitions touched by a write and drop
+    cached views of them. A summary recalculation touches no subject, so it
+    passes only the pupils.
+    """
+    refresh_class_positions(session_id, term, pupil_ids=pupil_ids)
+    if subject_ids:
+        refresh_subject_positions(session_id, term, subject_ids=subject_ids)
+    invalidate_results(
+        session_id, term, [refdata.get_subject_class_id(subject_id) for subject_id in subject_ids], pupil_ids=pupil_ids
+    )
+    refresh_annual(session_id, pupil_ids)
+
+
+class AcademicSessionViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for AcademicSession CRUD operations
     """
@@ -30,19 +90,21 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdmin()]
         return [IsAuthenticated()]
-    
-    def list(self, request, *args, **kwargs):
-        """List academic sessions (no cache to reflect immediate unlock changes)"""
-        return super().list(request, *args, **kwargs)
+
+    def get_cache_tags(self):
+        return [SESSIONS_TAG]
     
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Get the active academic session"""
-        active_session = AcademicSession.objects.filter(is_active=True).first()
-        if active_session:
-            serializer = self.get_serializer(active_session)
-            return Response(serializer.data)
-        return Response({'error': 'No active session found'}, status=status.HTTP_404_NOT_FOUND)
+        def build():
+            active_session = refdata.get_active_session()
+            if active_session:
+                serializer = self.get_serializer(active_session)
+                return Response(serializer.data)
+            return Response({'error': 'No active session found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return self.cached_response(request, build)
 
     @action(detail=True, methods=['post'])
     def unlock_results(self, request, pk=None):
@@ -51,16 +113,10 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
         session = self.get_object()
         session.results_unlocked = True
-        session.save(update_fields=['results_unlocked'])
+        session.save(update_fields=['results_unlocked', 'updated_at'])
         
         # Broadcast to all connected students that results are now available
-        broadcast_update('results_released', {
-            'action': 'unlock',
-            'session_id': session.id,
-            'session_name': session.name,
-            'term': session.current_term,
-            'message': f'Results for {session.name} have been released!'
-        })
+        broadcast_results_released(session)
         
         serializer = self.get_serializer(session)
         return Response({'message': 'Results unlocked for this session', 'session': serializer.data})
@@ -72,7 +128,7 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
         session = self.get_object()
         session.results_unlocked = False
-        session.save(update_fields=['results_unlocked'])
+        session.save(update_fields=['results_unlocked', 'updated_at'])
         
         # Broadcast to all connected students that results are now locked
         broadcast_update('results_locked', {
@@ -81,7 +137,7 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
             'session_name': session.name,
             'term': session.current_term,
             'message': f'Results for {session.name} have been locked by admin.'
-        })
+        }, topics=topics.session_audience(session.id))
         
         serializer = self.get_serializer(session)
         return Response({'message': 'Results locked for this session', 'session': serializer.data})
@@ -93,7 +149,7 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
         session = self.get_object()
         session.teacher_upload_enabled = True
-        session.save(update_fields=['teacher_upload_enabled'])
+        session.save(update_fields=['teacher_upload_enabled', 'updated_at'])
         
         # Broadcast to all connected teachers
         broadcast_update('session_update', {
@@ -103,7 +159,7 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
             'current_term': session.current_term,
             'teacher_upload_enabled': True,
             'message': f'Result uploads enabled for {session.name}'
-        })
+        }, topics=topics.staff())
         
         serializer = self.get_serializer(session)
         return Response({'message': 'Teacher uploads enabled', 'session': serializer.data})
@@ -115,7 +171,7 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
         session = self.get_object()
         session.teacher_upload_enabled = False
-        session.save(update_fields=['teacher_upload_enabled'])
+        session.save(update_fields=['teacher_upload_enabled', 'updated_at'])
         
         # Broadcast to all connected teachers
         broadcast_update('session_update', {
@@ -125,7 +181,7 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
             'current_term': session.current_term,
             'teacher_upload_enabled': False,
             'message': f'Result uploads disabled for {session.name}'
-        })
+        }, topics=topics.staff())
         
         serializer = self.get_serializer(session)
         return Response({'message': 'Teacher uploads disabled', 'session': serializer.data})
@@ -159,12 +215,12 @@ class AcademicSessionViewSet(viewsets.ModelViewSet):
                 'current_term': instance.current_term,
                 'teacher_upload_enabled': instance.teacher_upload_enabled,
                 'message': f'Result uploads {"enabled" if instance.teacher_upload_enabled else "disabled"}'
-            })
+            }, topics=topics.staff())
         
         return instance
 
 
-class ResultViewSet(viewsets.ModelViewSet):
+class ResultViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Result CRUD operations
     Admin: Full access
@@ -173,6 +229,10 @@ class ResultViewSet(viewsets.ModelViewSet):
     """
     queryset = Result.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = OptInCursorPagination
+    conditional_dependencies = (
+        'pupil', 'pupil__pupil_profile', 'pupil__pupil_profile__pupil_class', 'subject', 'session'
+    )
     filterset_fields = ['pupil', 'subject', 'session', 'term', 'grade']
     search_fields = ['pupil__full_name', 'subject__name']
     ordering_fields = ['created_at', 'total']
@@ -181,6 +241,9 @@ class ResultViewSet(viewsets.ModelViewSet):
         if self.action in ['create', 'update']:
             return ResultCreateSerializer
         return ResultSerializer
+
+    def get_cache_tags(self):
+        return scoped_results_tags(self.request)
     
     def get_queryset(self):
         user = self.request.user
@@ -197,23 +260,20 @@ class ResultViewSet(viewsets.ModelViewSet):
             return base_queryset.all()
         elif user.role == 'teacher':
             # Teachers can see results for pupils in their assigned classes
-            from classes.models import Class
-            teacher_classes = Class.objects.filter(assigned_teacher=user)
             return base_queryset.filter(
-                pupil__pupil_profile__pupil_class__in=teacher_classes
+                pupil__pupil_profile__pupil_class_id__in=refdata.get_teacher_class_ids(user.id)
             )
         elif user.role == 'pupil':
             # Pupils can only see their own results and only released sessions
             qs = base_queryset.filter(pupil=user)
-            active_session = AcademicSession.objects.filter(is_active=True).first()
-            if active_session and not active_session.results_unlocked and active_session.result_release_date:
-                if timezone.now() < active_session.result_release_date:
-                    qs = qs.exclude(session=active_session)
+            active_session = refdata.get_active_session()
+            if active_session and active_session.results_hidden():
+                qs = qs.exclude(session=active_session)
             return qs
         return Result.objects.none()
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update']:
+        if self.action in ['create', 'update', 'partial_update', 'import_csv']:
             return [IsAdminOrTeacher()]
         elif self.action == 'destroy':
             return [IsAdmin()]
@@ -246,7 +306,7 @@ class ResultViewSet(viewsets.ModelViewSet):
                     }, status=status.HTTP_403_FORBIDDEN)
                 
                 # Check if uploading to active term
-                active_session = AcademicSession.objects.filter(is_active=True).first()
+                active_session = refdata.get_active_session()
                 if active_session and session.id == active_session.id:
                     if term != active_session.current_term:
                         return Response({
@@ -271,11 +331,12 @@ class ResultViewSet(viewsets.ModelViewSet):
                     return Response({'detail': 'Selected subject does not belong to the pupil’s class.'}, status=status.HTTP_400_BAD_REQUEST)
 
             result = serializer.save()
-            broadcast_update('score_update', {'action': 'create', 'result_id': result.id})
+            broadcast_update('score_update', {'action': 'create', 'result_id': result.id}, topics=self._result_audience(result))
             logger.info(f"✅ Result created: Pupil {result.pupil.username}, Subject {result.subject.name}, Term {result.term}")
             
-            # Auto-generate or update result summary for this pupil, session, and term
-            self._update_result_summary(result.pupil, result.session, result.term)
+            # Add this result to the pupil's summary for the session and term
+            self._update_result_summary(result.pupil_id, result.session_id, result.term, result.total, 1, result.subject_id)
+            _results_changed(result.session_id, result.term, [result.pupil_id], [result.subject_id])
             
             headers = self.get_success_headers(serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -306,7 +367,7 @@ class ResultViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_403_FORBIDDEN)
             
             # Check if updating active term results only
-            active_session = AcademicSession.objects.filter(is_active=True).first()
+            active_session = refdata.get_active_session()
             if active_session and session.id == active_session.id:
                 if term != active_session.current_term:
                     return Response({
@@ -328,43 +389,70 @@ class ResultViewSet(viewsets.ModelViewSet):
             if final_subject.assigned_class_id != pupil_class.id:
                 return Response({'detail': 'Selected subject does not belong to the pupil’s class.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        result = serializer.save()
-        broadcast_update('score_update', {'action': 'update', 'result_id': result.id})
-        
-        # Regenerate result summary
-        self._update_result_summary(result.pupil, result.session, result.term)
+        with transaction.atomic():
+            # Lock the row and take the delta from its current total, so concurrent edits of
+            # one result apply one after the other instead of both starting from the same total
+            locked = get_object_or_404(Result.objects.select_for_update(), pk=instance.pk)
+            old_key = (locked.pupil_id, locked.session_id, locked.term)
+            old_total = locked.total
+            old_subject_id = locked.subject_id
+            
+            serializer.instance = locked
+            result = serializer.save()
+            broadcast_update('score_update', {'action': 'update', 'result_id': result.id}, topics=self._result_audience(result))
+            
+            # Apply the score change to the affected summary (or move it between summaries)
+            new_key = (result.pupil_id, result.session_id, result.term)
+            if new_key == old_key:
+                self._update_result_summary(*new_key, result.total - old_total, 0, result.subject_id)
+            else:
+                self._update_result_summary(*old_key, -old_total, -1, old_subject_id)
+                self._update_result_summary(*new_key, result.total, 1, result.subject_id)
+        
+        if new_key != old_key:
+            _results_changed(old_key[1], old_key[2], [old_key[0]], [old_subject_id])
+            _results_changed(result.session_id, result.term, [result.pupil_id], [result.subject_id])
+        else:
+            # A changed subject leaves a gap in the old subject's ranking too
+            subject_ids = list(dict.fromkeys([old_subject_id, result.subject_id]))
+            _results_changed(result.session_id, result.term, [result.pupil_id], subject_ids)
         
         return Response(serializer.data)
     
-        def perform_destroy(self, instance):
-            """Delete result and broadcast update"""
-            result_id = instance.id
+    def perform_destroy(self, instance):
+        """Delete result, remove it from the summary and broadcast update"""
+        result_id = instance.id
+        with transaction.atomic():
+            # Remove the total as it is now, not as it was when the request loaded the row
+            instance = get_object_or_404(Result.objects.select_for_update(), pk=result_id)
             instance.delete()
-            broadcast_update('score_update', {'action': 'delete', 'result_id': result_id})
+            broadcast_update('score_update', {'action': 'delete', 'result_id': result_id}, topics=self._result_audience(instance))
+            self._update_result_summary(instance.pupil_id, instance.session_id, instance.term, -instance.total, -1, instance.subject_id)
+        _results_changed(instance.session_id, instance.term, [instance.pupil_id], [instance.subject_id])
     
-    def _update_result_summary(self, pupil, session, term):
-        """Generate or update result summary for a pupil"""
-        summary, created = ResultSummary.objects.get_or_create(
-            pupil=pupil,
-            session=session,
-            term=term
-        )
-        summary.calculate_summary()
+    def _result_audience(self, result):
+        return topics.pupil_audience(result.pupil_id, refdata.get_subject_class_id(result.subject_id))
+
+    def _update_result_summary(self, pupil_id, session_id, term, total_delta, subject_delta, subject_id):
+        """Apply a result change to the pupil's summary and notify clients"""
+        # The subject belongs to the pupil's class, so its scale is the pupil's scale
+        boundaries = boundaries_for_class(refdata.get_subject_class_id(subject_id))
+        summary = ResultSummary.apply_delta(pupil_id, session_id, term, total_delta, subject_delta, boundaries)
 
         # Broadcast summary update to notify students
         broadcast_update('summary_update', {
             'action': 'calculate',
-            'pupil_id': pupil.id,
-            'session_id': session.id,
+            'pupil_id': pupil_id,
+            'session_id': session_id,
             'term': term,
             'summary_id': summary.id
-        })
+        }, topics=topics.pupil_audience(pupil_id, refdata.get_subject_class_id(subject_id)))
 
         return summary
     
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
-        """Create multiple results at once and auto-generate summaries"""
+        """Create or update multiple results at once and auto-generate summaries"""
         serializer = BulkResultCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
@@ -380,56 +468,133 @@ class ResultViewSet(viewsets.ModelViewSet):
             if not assigned_class or getattr(assigned_class, 'assigned_teacher_id', None) != user.id:
                 raise PermissionDenied('You can only upload scores for subjects in your assigned classes.')
         
-        created_results = []
-        errors = []
-        pupils_to_update = set()
-        
-        for result_data in results_data:
-            try:
-                # Validate each pupil belongs to the subject's class and teacher owns the class
-                pupil_id = result_data.get('pupil_id')
-                from accounts.models import CustomUser
-                pupil = CustomUser.objects.filter(id=pupil_id, role='pupil').select_related('pupil_profile__pupil_class').first()
-                if not pupil:
-                    raise Exception('Invalid pupil_id')
-                pupil_class = getattr(getattr(pupil, 'pupil_profile', None), 'pupil_class', None)
-                if not pupil_class:
-                    raise Exception('Pupil has no assigned class')
-                if subject.assigned_class_id != pupil_class.id:
-                    raise Exception('Subject does not belong to pupil’s class')
-                if getattr(user, 'role', None) == 'teacher' and getattr(pupil_class, 'assigned_teacher_id', None) != user.id:
-                    raise Exception('You can only upload scores for pupils in your assigned classes')
-
-                result, created = Result.objects.update_or_create(
-                    pupil_id=result_data['pupil_id'],
-                    subject=subject,
-                    session=session,
-                    term=term,
-                    defaults={
-                        'test_score': result_data['test_score'],
-                        'exam_score': result_data['exam_score'],
-                        'teacher_comment': result_data.get('teacher_comment', '')
-                    }
-                )
-                created_results.append(result)
-                pupils_to_update.add(result.pupil)
-            except Exception as e:
-                errors.append({
-                    'pupil_id': result_data.get('pupil_id'),
-                    'error': str(e)
-                })
-        
-        # Auto-generate summaries for all affected pupils
-        for pupil in pupils_to_update:
-            self._update_result_summary(pupil, session, term)
+        written, errors, pupil_ids = bulk_upsert_results(subject, session, term, results_data, user=user)
+        
+        # Rebuild summaries for all affected pupils in one aggregate
+        summary_ids = refresh_summaries(session, term, pupil_ids)
+        if pupil_ids:
+            _results_changed(session.id, term, pupil_ids, [subject.id])
+        for pupil_id, summary_id in summary_ids.items():
+            broadcast_update('summary_update', {
+                'action': 'calculate',
+                'pupil_id': pupil_id,
+                'session_id': session.id,
+                'term': term,
+                'summary_id': summary_id
+            }, topics=topics.pupil_audience(pupil_id, subject.assigned_class_id))
         
         return Response({
-            'message': f'{len(created_results)} results created/updated successfully',
-            'created': len(created_results),
+            'message': f'{written} results created/updated successfully',
+            'created': written,
             'errors': errors,
-            'summaries_updated': len(pupils_to_update)
+            'summaries_updated': len(summary_ids)
         }, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def import_csv(self, request):
+        """
+        Import scores from an uploaded CSV file (multipart field ``file``).
+
+        Columns: ``pupil_id`` or ``username``, ``subject_id`` (optional when
+        ``subject`` is posted), ``test_score``, ``exam_score`` and optionally
+        ``teacher_comment``. With ``dry_run`` the file is only validated.
+        """
+        serializer = ResultImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        session = serializer.validated_data['session']
+        term = serializer.validated_data['term']
+        subject = serializer.validated_data.get('subject')
+        dry_run = serializer.validated_data['dry_run']
+
+        user = request.user
+        if getattr(user, 'role', None) == 'teacher':
+            if not session.teacher_upload_enabled:
+                return Response({
+                    'detail': 'Result uploads are currently disabled by admin.',
+                    'error': 'upload_disabled'
+                }, status=status.HTTP_403_FORBIDDEN)
+            active_session = refdata.get_active_session()
+            if active_session and session.id == active_session.id and term != active_session.current_term:
+                return Response({
+                    'detail': f'You can only upload results to the active term ({active_session.get_current_term_display()}). Selected term: {term}',
+                    'error': 'inactive_term',
+                    'active_term': active_session.current_term
+                }, status=status.HTTP_403_FORBIDDEN)
+
+        # Read the upload as a text stream; rows are parsed and written in batches
+        upload = serializer.validated_data['file']
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            report, pupil_ids, subject_ids = import_results_csv(
+                stream, session, term, user=user, subject=subject, dry_run=dry_run
+            )
+        except (ValueError, csv.Error) as e:
+            return Response({'error': 'Invalid CSV file', 'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            stream.detach()
+
+        summary_ids = refresh_summaries(session, term, pupil_ids)
+        if pupil_ids:
+            _results_changed(session.id, term, pupil_ids, subject_ids)
+        class_ids = topics.pupil_class_ids(summary_ids)
+        for pupil_id, summary_id in summary_ids.items():
+            broadcast_update('summary_update', {
+                'action': 'calculate',
+                'pupil_id': pupil_id,
+                'session_id': session.id,
+                'term': term,
+                'summary_id': summary_id
+            }, topics=topics.pupil_audience(pupil_id, class_ids.get(pupil_id)))
+
+        verb = 'would be imported' if dry_run else 'imported'
+        return Response({
+            'message': f"{report['accepted']} of {report['rows']} rows {verb}",
+            'dry_run': dry_run,
+            'rows': report['rows'],
+            'imported': 0 if dry_run else report['accepted'],
+            'valid': report['accepted'],
+            'errors': report['errors'],
+            'summaries_updated': len(summary_ids)
+        }, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'])
+    def export_csv(self, request):
+        """Stream results as CSV, filterable by ?session=&term=&class=&subject="""
+        queryset, filename = _export_queryset(request, self.get_queryset(), 'results')
+        queryset = queryset.order_by(
+            'pupil__pupil_profile__pupil_class__name', 'pupil__full_name', 'subject__name', 'id'
+        )
+        return csv_export_response(request, queryset, RESULT_EXPORT_COLUMNS, filename)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrTeacher])
+    def analytics(self, request):
+        """
+        Mean, median, spread, pass rate and grade histogram per subject and
+        class (?session=&term=&class=, defaulting to the active session and
+        its current term). Teachers must ask for one of their classes.
+        """
+        session_id = request.query_params.get('session')
+        if session_id:
+            session = AcademicSession.objects.filter(id=session_id).first()
+        else:
+            session = refdata.get_active_session()
+        if not session:
+            return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+        term = request.query_params.get('term') or session.current_term
+
+        class_id = request.query_params.get('class')
+        try:
+            class_id = int(class_id) if class_id else None
+        except ValueError:
+            return Response({'error': 'Invalid class'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.role == 'teacher' and class_id not in refdata.get_teacher_class_ids(request.user.id):
+            raise PermissionDenied('You can only view analytics for your assigned classes.')
+
+        response = Response(cached_statistics(session.id, term, class_id))
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
     @action(detail=False, methods=['get'])
     def my_results(self, request):
         """Get results for the logged-in pupil"""
@@ -439,39 +604,51 @@ class ResultViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        session_id = request.query_params.get('session')
-        term = request.query_params.get('term')
-        
-        # Optimized query with select_related
-        results = Result.objects.filter(pupil=request.user).select_related(
-            'subject', 'session'
-        )
-        
-        if session_id:
-            results = results.filter(session_id=session_id)
-        if term:
-            results = results.filter(term=term)
-
-        # Server-side gating: hide active session results if locked and not manually unlocked
-        active_session = AcademicSession.objects.filter(is_active=True).first()
-        if active_session and not active_session.results_unlocked and active_session.result_release_date:
-            if timezone.now() < active_session.result_release_date:
+        def build():
+            session_id = request.query_params.get('session')
+            term = request.query_params.get('term')
+
+            # Optimized query with select_related
+            results = Result.objects.filter(pupil=request.user).select_related(
+                'subject', 'session'
+            )
+
+            if session_id:
+                results = results.filter(session_id=session_id)
+            if term:
+                results = results.filter(term=term)
+
+            # Server-side gating: hide active session results if locked and not manually unlocked
+            active_session = refdata.get_active_session()
+            if active_session and active_session.results_hidden():
                 results = results.exclude(session=active_session)
-        
-        serializer = self.get_serializer(results, many=True)
-        return Response(serializer.data)
 
+            return paginate_action(request, results, lambda rows: self.get_serializer(rows, many=True).data)
+
+        return self.cached_response(request, build)
 
-class ResultSummaryViewSet(viewsets.ModelViewSet):
+
+class ResultSummaryViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for ResultSummary operations
     """
     queryset = ResultSummary.objects.all()
     serializer_class = ResultSummarySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptInCursorPagination
+    conditional_dependencies = ('pupil', 'pupil__pupil_profile', 'pupil__pupil_profile__pupil_class', 'session')
     filterset_fields = ['pupil', 'session', 'term']
     search_fields = ['pupil__full_name', 'pupil__username', 'pupil__email']
     
+    def get_conditional_scope(self):
+        # The nested results are each summary's pupil/session/term rows (position and grade
+        # changes do not always touch the summary), not every result of the pupil
+        summaries = self.get_conditional_queryset().order_by().filter(
+            pupil_id=OuterRef('pupil_id'), session_id=OuterRef('session_id'), term=OuterRef('term')
+        )
+        results = Result.objects.filter(Exists(summaries)).aggregate(count=Count('pk'), latest=Max('updated_at'))
+        return [*super().get_conditional_scope(), results['count'], results['latest']]
+    
     def get_queryset(self):
         user = self.request.user
         # Optimize with select_related to prevent N+1 queries
@@ -486,31 +663,43 @@ class ResultSummaryViewSet(viewsets.ModelViewSet):
             return base_queryset.all()
         elif user.role == 'teacher':
             # Teachers can see summaries for pupils in their assigned classes
-            from classes.models import Class
-            teacher_classes = Class.objects.filter(assigned_teacher=user)
             return base_queryset.filter(
-                pupil__pupil_profile__pupil_class__in=teacher_classes
+                pupil__pupil_profile__pupil_class_id__in=refdata.get_teacher_class_ids(user.id)
             )
         elif user.role == 'pupil':
             qs = base_queryset.filter(pupil=user)
             # Hide active session summaries if locked and not manually unlocked
-            active_session = AcademicSession.objects.filter(is_active=True).first()
-            if active_session and not active_session.results_unlocked and active_session.result_release_date:
-                if timezone.now() < active_session.result_release_date:
-                    qs = qs.exclude(session=active_session)
+            active_session = refdata.get_active_session()
+            if active_session and active_session.results_hidden():
+                qs = qs.exclude(session=active_session)
             return qs
         return ResultSummary.objects.none()
+
+    def get_cache_tags(self):
+        return scoped_results_tags(self.request)
     
     def get_permissions(self):
+        if self.action == 'recompute':
+            return [IsAdmin()]
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminOrTeacher()]
         return [IsAuthenticated()]
     
+    @action(detail=False, methods=['get'])
+    def export_csv(self, request):
+        """Stream result summaries as CSV, filterable by ?session=&term=&class="""
+        if request.query_params.get('subject'):
+            return Response({'error': 'Summaries cannot be filtered by subject'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset, filename = _export_queryset(request, self.get_queryset(), 'summaries')
+        queryset = queryset.order_by('pupil__pupil_profile__pupil_class__name', 'position', 'pupil__full_name', 'id')
+        return csv_export_response(request, queryset, SUMMARY_EXPORT_COLUMNS, filename)
+    
     @action(detail=True, methods=['post'])
     def calculate(self, request, pk=None):
         """Recalculate summary from results"""
         summary = self.get_object()
         summary.calculate_summary()
+        _results_changed(summary.session_id, summary.term, [summary.pupil_id])
         serializer = self.get_serializer(summary)
         return Response(serializer.data)
     
@@ -524,18 +713,72 @@ class ResultSummaryViewSet(viewsets.ModelViewSet):
         if user.role == 'pupil':
             if summary.pupil_id != user.id:
                 return Response({'detail': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
-            session = summary.session
-            if not session.results_unlocked and session.result_release_date and timezone.now() < session.result_release_date:
+            if summary.session.results_hidden():
                 return Response({'detail': 'Results are not yet released'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Generate PDF
-        pdf_buffer = generate_result_pdf(summary)
+        # Serve the cached render for the current content, rendering only if it changed
+        pdf_path, cache_key = cached_report_card(summary)
+        etag = f'"{cache_key}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open_report_card(summary, pdf_path), content_type='application/pdf',
+                                     as_attachment=True, filename=report_card_filename(summary))
+        response['ETag'] = etag
+        # A URL carrying the content hash (?v=<etag>) can never change, so it may be cached for a year
+        if request.query_params.get('v') == cache_key:
+            response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'private, no-cache'
         
-        # Return PDF as response
-        response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-        filename = f"Result_{summary.pupil.username}_{summary.term}_{summary.session.name.replace('/', '-')}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def batch_pdf(self, request):
+        """
+        Download report cards for a whole class (?class=) or class level
+        (?level=) as a ZIP of PDFs (?output=zip, default) or one merged,
+        print-ready PDF (?output=pdf). Session and term default to the
+        active session and its current term. Both are streamed card by card,
+        holding only the cards in flight in the render pool.
+        """
+        if request.user.role not in ['admin', 'teacher']:
+            return Response({'detail': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
         
+        class_id = request.query_params.get('class')
+        level = request.query_params.get('level')
+        if not class_id and not level:
+            return Response({'error': 'class or level is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        session_id = request.query_params.get('session')
+        if session_id:
+            session = AcademicSession.objects.filter(id=session_id).first()
+        else:
+            session = refdata.get_active_session()
+        if not session:
+            return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+        term = request.query_params.get('term') or session.current_term
+        
+        # get_queryset() already limits teachers to their own classes
+        summaries = self.get_queryset().filter(session=session, term=term)
+        if class_id:
+            summaries = summaries.filter(pupil__pupil_profile__pupil_class_id=class_id)
+        if level:
+            summaries = summaries.filter(pupil__pupil_profile__pupil_class__level=level)
+        if not summaries.exists():
+            return Response({'error': 'No result summaries found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        scope = f"{class_id or level}_{term}_{session.name}".replace('/', '-').replace(' ', '-')
+        contexts = iter_report_card_contexts(summaries)
+        
+        rendered = render_report_cards(contexts)
+        if request.query_params.get('output') == 'pdf':
+            response = streaming_response(request, stream_merged_report_cards(rendered), content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="Results_{scope}.pdf"'
+            return response
+        
+        response = streaming_response(request, stream_report_cards_zip(rendered), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="Results_{scope}.zip"'
         return response
     
     @action(detail=False, methods=['post'])
@@ -558,6 +801,7 @@ class ResultSummaryViewSet(viewsets.ModelViewSet):
         )
         
         summary.calculate_summary()
+        _results_changed(summary.session_id, summary.term, [summary.pupil_id])
         serializer = self.get_serializer(summary)
         
         return Response({
@@ -565,3 +809,141 @@ class ResultSummaryViewSet(viewsets.ModelViewSet):
             'summary': serializer.data
         }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'])
+    def recompute(self, request):
+        """
+        Admin-only: Recompute all summaries for a session/term, optionally
+        limited to one class or class level. Defaults to the active session
+        and its current term.
+        """
+        session_id = request.data.get('session')
+        if session_id:
+            session = AcademicSession.objects.filter(id=session_id).first()
+        else:
+            session = refdata.get_active_session()
+        if not session:
+            return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        term = request.data.get('term') or session.current_term
+        if term not in dict(Result.TERM_CHOICES):
+            return Response({'error': f'Invalid term: {term}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        report = recompute_summaries(
+            session, term,
+            class_id=request.data.get('class') or None,
+            level=request.data.get('level') or None,
+        )
+        
+        broadcast_update('summary_update', {
+            'action': 'recompute',
+            'session_id': session.id,
+            'term': term,
+            'class_id': report['class_id'],
+            'level': report['level']
+        }, topics=(
+            topics.class_audience(report['class_id']) if report['class_id']
+            else topics.level_audience(report['level']) if report['level']
+            else topics.session_audience(session.id)
+        ))
+        
+        return Response({'message': f"{report['pupils']} summaries recomputed", **report})
+
+
+class AnnualSummaryViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only annual (three-term) summaries with each pupil's annual
+    subject results. Rows are maintained from Result writes.
+    """
+    serializer_class = AnnualSummarySerializer
+    permission_classes = [IsAuthenticated]
+    conditional_dependencies = ('pupil', 'pupil__pupil_profile', 'pupil__pupil_profile__pupil_class', 'session')
+    filterset_fields = ['pupil', 'session']
+    search_fields = ['pupil__full_name', 'pupil__username']
+
+    def get_conditional_scope(self):
+        # The nested results are each summary's own session (see AnnualSummarySerializer),
+        # not every annual result of the pupil
+        summaries = self.get_conditional_queryset().order_by().filter(
+            pupil_id=OuterRef('pupil_id'), session_id=OuterRef('session_id')
+        )
+        results = AnnualResult.objects.filter(Exists(summaries)).aggregate(
+            count=Count('pk'), latest=Max('updated_at'), subjects=Max('subject__updated_at')
+        )
+        return [*super().get_conditional_scope(), results['count'], results['latest'], results['subjects']]
+
+    def get_queryset(self):
+        user = self.request.user
+        base_queryset = AnnualSummary.objects.select_related(
+            'pupil',
+            'session',
+            'pupil__pupil_profile',
+            'pupil__pupil_profile__pupil_class'
+        ).prefetch_related(
+            Prefetch('pupil__annual_results', queryset=AnnualResult.objects.select_related('subject'))
+        )
+
+        if user.role == 'admin':
+            return base_queryset.all()
+        elif user.role == 'teacher':
+            return base_queryset.filter(
+                pupil__pupil_profile__pupil_class_id__in=refdata.get_teacher_class_ids(user.id)
+            )
+        elif user.role == 'pupil':
+            qs = base_queryset.filter(pupil=user)
+            active_session = refdata.get_active_session()
+            if active_session and active_session.results_hidden():
+                qs = qs.exclude(session=active_session)
+            return qs
+        return AnnualSummary.objects.none()
+
+    def get_permissions(self):
+        if self.action == 'recompute':
+            return [IsAdmin()]
+        return [IsAuthenticated()]
+
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """Download the annual report card"""
+        summary = self.get_object()
+        context = annual_report_card_context(summary, logo_path=get_logo_path())
+        response = HttpResponse(render_annual_report_card(context), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{context["filename"]}"'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @action(detail=False, methods=['post'])
+    def recompute(self, request):
+        """
+        Admin-only: Rebuild annual results for a session (default: active),
+        optionally limited to one class or class level.
+        """
+        session_id = request.data.get('session')
+        if session_id:
+            session = AcademicSession.objects.filter(id=session_id).first()
+        else:
+            session = refdata.get_active_session()
+        if not session:
+            return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        report = recompute_annual(
+            session,
+            class_id=request.data.get('class') or None,
+            level=request.data.get('level') or None,
+        )
+        return Response({'message': f"{report['pupils']} annual summaries recomputed", **report})
+
+
+class GradingScaleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """
+    Grade cut-offs per class level (or the default scale). Any change
+    regrades the stored results and summaries it affects (see
+    results/signals.py).
+    """
+    queryset = GradingScale.objects.all()
+    serializer_class = GradingScaleSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve']:
+            return [IsAuthenticated()]
+        return [IsAdmin()]